@@ -1,15 +1,18 @@
 import asyncio
 import customtkinter as ctk
 from customtkinter import CTkScrollableFrame, CTkTextbox
+import itertools
 import logging
 import os
+import threading
+import time
 from datetime import datetime
-from modules.audio_capture import AudioCapture
-from modules.transcription_processor import TranscriptionProcessor
-from modules.deepgram_client import DeepgramClient
-import openai
-from openai import OpenAI
-import re
+from modules.metrics import REGISTRY
+from modules.search_index import SearchIndex, format_result
+from modules.transcript_writer import TranscriptWriter, recover_orphans
+from modules.update_queue import UpdateQueue
+from modules.postprocess import PostProcessor
+from modules.rolling_summary import RollingSummarizer
 from tkinter import messagebox
 from dotenv import load_dotenv
 
@@ -17,8 +20,14 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 
 load_dotenv() 
 
+FRAME_MS = 33  # ~30 fps: the fastest rate at which transcript updates are drawn
+MAX_VIEW_LINES = 500
+PAGE_LINES = 200
+STATS_REFRESH_MS = 1000
+SEARCH_LIMIT = 50
+
 class TranscriptionApp:
-    def __init__(self):
+    def __init__(self, loop):
         self.root = ctk.CTk()
         self.root.title("Real-time Audio Transcription")
         self.root.geometry("800x600")
@@ -28,6 +37,8 @@ class TranscriptionApp:
         # Set a consistent background color
         self.root.configure(fg_color="#2b2b2b")  # Dark gray background
 
+        self.prewarm = None
+
         # Directly use the API keys instead of os.getenv
         self.deepgram_api_key = os.getenv('DEEPGRAM_API_KEY')
         self.openai_api_key = os.getenv('OPENAI_API_KEY')
@@ -37,14 +48,29 @@ class TranscriptionApp:
             self.root.quit()
             return
 
-        self.openai_client = OpenAI(api_key=self.openai_api_key)
+        self.postprocessor = PostProcessor(self.openai_api_key, cache_dir=os.path.join(os.path.dirname(os.path.abspath(__file__)), "output", ".cache"))
+        self.postprocessing = False
+        self.rolling_summary = None
 
         self.create_widgets()
 
         self.is_transcribing = False
         self.transcription_task = None
+        self.pipeline = None
         self.output_file = None
-        self.word_count = 0
+        self.transcript_path = None
+        self.sidecar_path = None
+        self.archive = None
+        self.archive_dir = None
+        self.updates = UpdateQueue(metrics=REGISTRY.scope())
+        self.frame_job = None
+        self.frame_due = None
+        self.stats_job = None
+        self.frame_delay = REGISTRY.scope().histogram("gui_frame_delay_seconds", "How late Tk ran each scheduled frame")
+        self.frame_seconds = REGISTRY.scope().histogram("gui_frame_seconds", "Time spent drawing one frame")
+        self.session_active = False
+        self.view_limit = MAX_VIEW_LINES
+        self.lines_hidden = 0
 
         # Set the output directory
         self.output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "output")
@@ -52,13 +78,33 @@ class TranscriptionApp:
         # Ensure output directory exists
         os.makedirs(self.output_dir, exist_ok=True)
 
-        # Set up asyncio event loop
-        self.loop = asyncio.get_event_loop()
+        # Finish whatever a crashed session left behind
+        for recovered_file in recover_orphans(self.output_dir):
+            logging.warning(f"Recovered transcript from an interrupted session: {recovered_file}")
+
+        # Search index over output/; catching up on files written elsewhere happens off the Tk thread
+        self.search_index = SearchIndex(self.output_dir)
+        self.search_window = None
+        threading.Thread(target=self.search_index.sync, name="search-sync", daemon=True).start()
+
+        # The asyncio loop runs on its own thread; Tk keeps the main thread and its own event loop
+        self.loop = loop
 
         self.timestamp = None
 
         self.capture_mode = "computer audio"  # Default mode
 
+        # numpy, soundcard and websockets load here, off the Tk thread, while the window opens;
+        # by the time Start is pressed the recorder is running and a Deepgram connection is open
+        threading.Thread(target=self.start_prewarm, name="prewarm-start", daemon=True).start()
+
+    def start_prewarm(self):
+        from modules.prewarm import Prewarmer
+        prewarm = Prewarmer(self.deepgram_api_key, encoding=os.getenv('DEEPGRAM_ENCODING', "linear16"),
+                            metrics=REGISTRY.scope(pipeline="live"))
+        self.prewarm = prewarm
+        prewarm.start(self.loop, self.capture_mode)
+
     def create_widgets(self):
         # Main frame
         main_frame = ctk.CTkFrame(self.root, fg_color="transparent")
@@ -75,6 +121,16 @@ class TranscriptionApp:
         self.title_entry.pack(side="left")
         self.title_entry.insert(0, "Untitled")
 
+        # Search across every saved transcript, cleaned copy and summary
+        search_frame = ctk.CTkFrame(main_frame, fg_color="transparent")
+        search_frame.pack(fill="x", pady=(0, 20))
+        ctk.CTkLabel(search_frame, text="Search Transcripts:", text_color="white").pack(side="left", padx=(0, 5))
+        self.search_entry = ctk.CTkEntry(search_frame, width=300, fg_color="#3b3b3b", text_color="white", border_color="#1f6aa5",
+                                         placeholder_text='words, "a phrase", title:standup, after:00:10:00')
+        self.search_entry.pack(side="left")
+        self.search_entry.bind("<Return>", self.search_transcripts)
+        ctk.CTkButton(search_frame, text="Search", width=80, command=self.search_transcripts, fg_color="#1f6aa5", hover_color="#2980b9").pack(side="left", padx=(5, 0))
+
         # Capture mode buttons (replaced with segmented button)
         capture_frame = ctk.CTkFrame(main_frame, fg_color="transparent")
         capture_frame.pack(fill="x", pady=(0, 20))
@@ -112,9 +168,22 @@ class TranscriptionApp:
         self.clear_button = ctk.CTkButton(button_frame, text="Clear", command=self.clear_transcription, fg_color="#e74c3c", hover_color="#c0392b")
         self.clear_button.pack(side="left", expand=True, padx=(5, 0))
 
+        # Older lines are dropped from the widget and paged back in from the transcript file
+        self.load_earlier_button = ctk.CTkButton(main_frame, text="Load earlier lines", command=self.load_earlier_lines, state="disabled", height=24, fg_color="#3b3b3b", hover_color="#1f6aa5")
+        self.load_earlier_button.pack(fill="x", pady=(0, 5))
+
         # Transcription area
         self.transcription_area = ctk.CTkTextbox(main_frame, wrap="word", height=300, fg_color="#3b3b3b", text_color="white", border_color="#1f6aa5")
         self.transcription_area.pack(fill="both", expand=True)
+        self.transcription_area.bind("<Double-Button-1>", self.play_line)
+
+        # Live partial line: interim words that may still change, kept out of the committed text
+        self.partial_label = ctk.CTkLabel(main_frame, text="", text_color="gray", anchor="w", justify="left", wraplength=740)
+        self.partial_label.pack(fill="x", pady=(5, 0))
+
+        # Rolling "summary so far", refreshed every few committed sentences
+        self.summary_label = ctk.CTkLabel(main_frame, text="", text_color="white", anchor="w", justify="left", wraplength=740)
+        self.summary_label.pack(fill="x", pady=(10, 0))
 
         # Word count label
         self.word_count_label = ctk.CTkLabel(main_frame, text="Words: 0", text_color="white")
@@ -130,16 +199,26 @@ class TranscriptionApp:
         self.theme_switch.pack(pady=(10, 0))
         self.theme_switch.select()  # Start in dark mode
 
+        # Optional live pipeline metrics; only refreshed while visible
+        self.stats_switch = ctk.CTkSwitch(main_frame, text="Show Stats", command=self.toggle_stats)
+        self.stats_switch.pack(pady=(10, 0))
+        self.stats_area = ctk.CTkTextbox(main_frame, height=150, font=("Courier", 11), fg_color="#3b3b3b", text_color="white")
+
         # Status bar
         self.status_bar = ctk.CTkLabel(self.root, text="Ready", anchor="w", text_color="white")
         self.status_bar.pack(side="bottom", fill="x", padx=10, pady=5)
 
     def set_capture_mode(self, value):
         self.capture_mode = value.lower()
+        if self.prewarm is not None:
+            self.prewarm.prepare(self.capture_mode)
 
     def clear_transcription(self):
         self.transcription_area.delete("0.0", "end")
-        self.word_count = 0
+        self.partial_label.configure(text="")
+        self.summary_label.configure(text="")
+        self.reset_view()
+        self.updates.reset_word_count()
         self.word_count_label.configure(text="Words: 0")
         self.mic_status_icon.configure(text="⚪")
         self.mic_status_text.configure(text="Ready", text_color="white")
@@ -153,155 +232,278 @@ class TranscriptionApp:
             ctk.set_appearance_mode("dark")
             self.theme_switch.select()
 
+    def toggle_stats(self):
+        if self.stats_switch.get():
+            self.stats_area.pack(fill="x", pady=(10, 0))
+            self.refresh_stats()
+        else:
+            self.stats_area.pack_forget()
+            if self.stats_job is not None:
+                self.root.after_cancel(self.stats_job)
+                self.stats_job = None
+
+    def refresh_stats(self):
+        self.stats_area.configure(state="normal")
+        self.stats_area.delete("0.0", "end")
+        self.stats_area.insert("end", "\n".join(REGISTRY.summary_lines()) or "No metrics yet")
+        self.stats_area.configure(state="disabled")
+        self.stats_job = self.root.after(STATS_REFRESH_MS, self.refresh_stats)
+
     def start_transcription(self):
+        if self.session_active:
+            return  # The previous session is still flushing; Start comes back once it is saved
         self.is_transcribing = True
         self.start_button.configure(state="disabled")
         self.stop_button.configure(state="normal")
         self.transcription_area.delete("0.0", "end")
+        self.summary_label.configure(text="")
+        self.reset_view()
+        self.updates.reset()
+        self.word_count_label.configure(text="Words: 0")
         self.mic_status_icon.configure(text="🔴")
         self.mic_status_text.configure(text="Recording", text_color="#FF4136")
+        self.progress_bar.configure(mode="indeterminate")
         self.progress_bar.start()
         self.status_bar.configure(text="Transcribing...")
 
+        # Already imported by the pre-warm thread unless Start beat it
+        from modules.audio_archive import AudioArchive
+        from modules.pipeline import TranscriptionPipeline
+
         self.timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        self.temp_output_file = os.path.join(self.output_dir, f"temp_{self.timestamp}.txt")
+        self.writer = TranscriptWriter(self.output_dir, self.timestamp, on_flush=self.search_index.update_file)
+        self.temp_output_file = self.writer.temp_path
+        self.transcript_path = self.temp_output_file
+        self.sidecar_path = self.writer.temp_jsonl_path
+        archive_format = os.getenv('ARCHIVE_AUDIO')
+        self.archive = AudioArchive(self.output_dir, self.timestamp, archive_format) if archive_format else None
+        self.archive_dir = self.archive.temp_dir if self.archive else None
         logging.info(f"Starting transcription. Temp file: {self.temp_output_file}")
         
         self.start_time = datetime.now()
         self.update_duration()
         
+        # Opt-in: every update is another OpenAI request while the session runs
+        summary_every = int(os.getenv('SUMMARY_EVERY') or 0)
+        self.rolling_summary = RollingSummarizer(self.postprocessor, every=summary_every,
+                                                 on_update=lambda summary: self.updates.post("summary", summary)) if summary_every else None
+        self.pipeline = TranscriptionPipeline(
+            self.deepgram_api_key,
+            self.capture_mode,
+            sinks=[self.writer, self.updates] + ([self.rolling_summary] if self.rolling_summary else []),
+            on_partial=self.updates.set_partial,
+            name="live",  # Shared with the pre-warmed connection, so its metrics line up
+            encoding=os.getenv('DEEPGRAM_ENCODING', "linear16"),
+            archive=self.archive,
+            prewarm=self.prewarm,
+        )
         # Run the asyncio coroutine
-        self.loop.create_task(self.run_transcription())
+        self.session_active = True
+        self.transcription_task = asyncio.run_coroutine_threadsafe(self.run_transcription(), self.loop)
+        self.schedule_frames()
 
     def stop_transcription(self):
         self.is_transcribing = False
-        self.start_button.configure(state="normal")
+        # Start stays disabled until save_transcription has finalized this session's files
         self.stop_button.configure(state="disabled")
         self.mic_status_icon.configure(text="⚪")
-        self.mic_status_text.configure(text="Ready", text_color="white")
+        self.mic_status_text.configure(text="Saving", text_color="white")
         self.progress_bar.stop()
-        self.status_bar.configure(text="Ready")
+        self.status_bar.configure(text="Saving transcription...")
+        self.partial_label.configure(text="")
         
         # Cancel the duration update
         if hasattr(self, 'duration_update_job'):
             self.root.after_cancel(self.duration_update_job)
-        
-        if hasattr(self, 'temp_output_file') and os.path.exists(self.temp_output_file):
-            logging.info(f"Stopping transcription. Temp file exists: {self.temp_output_file}")
-            title = self.title_entry.get().strip() or "Untitled"
-            safe_title = re.sub(r'[^\w\-_\. ]', '_', title)  # Replace invalid filename characters
-            final_output_file = os.path.join(self.output_dir, f"{safe_title}.txt")
-            
-            # Ensure filename is unique
-            counter = 1
-            while os.path.exists(final_output_file):
-                final_output_file = os.path.join(self.output_dir, f"{safe_title}_{counter}.txt")
-                counter += 1
-            
-            try:
-                os.rename(self.temp_output_file, final_output_file)
-                self.output_file = final_output_file
-                
-                if self.output_file:
-                    # Process the transcription without showing a message
-                    self.process_transcription_with_openai()
-            except Exception as e:
-                logging.error(f"Error renaming file: {e}")
-                messagebox.showerror("Error", f"An error occurred while saving the file: {e}")
+
+        # The pipeline flushes its last results before run_transcription posts "finished"
+        self.loop.call_soon_threadsafe(self.pipeline.stop)
+
+    def finish_transcription(self):
+        if self.is_transcribing:
+            # The pipeline ended on its own (e.g. an error), so reset the controls too
+            self.stop_transcription()
+        try:
+            self.save_transcription()
+        finally:
+            self.start_button.configure(state="normal")
+            self.mic_status_text.configure(text="Ready", text_color="white")
+            if not self.postprocessing:
+                self.status_bar.configure(text="Ready")
+
+    def save_transcription(self):
+        logging.info(f"Stopping transcription. Finalizing temp file: {self.temp_output_file}")
+        try:
+            self.output_file = self.writer.finalize(self.title_entry.get())
+            self.transcript_path = self.output_file
+            if self.output_file:
+                self.search_index.rename(self.temp_output_file, self.output_file)
+            else:
+                self.search_index.remove(self.temp_output_file)
+            base_path = os.path.splitext(self.output_file)[0] if self.output_file else None
+            self.sidecar_path = base_path + ".jsonl" if base_path else None
+            if self.archive:
+                self.archive_dir = self.archive.finalize(base_path, self.title_entry.get())
+        except Exception as e:
+            logging.error(f"Error renaming file: {e}")
+            messagebox.showerror("Error", f"An error occurred while saving the file: {e}")
+            return
+
+        if self.output_file:
+            # Process the transcription without showing a message
+            self.process_transcription_with_openai()
         else:
-            logging.warning(f"No temporary file found: {getattr(self, 'temp_output_file', 'Not set')}")
+            logging.warning(f"No transcription data in: {self.temp_output_file}")
             messagebox.showwarning("Warning", "No transcription data was saved.")
 
     def process_transcription_with_openai(self):
-        with open(self.output_file, "r") as f:
-            transcription = f.read()
+        # Runs on the asyncio thread; the GUI only hears about progress through the update queue
+        self.postprocessing = True
+        self.progress_bar.configure(mode="determinate")
+        self.progress_bar.set(0)
+        self.status_bar.configure(text="Cleaning up transcription...")
+        # Bound now: a new session started meanwhile replaces self.rolling_summary
+        asyncio.run_coroutine_threadsafe(self.run_postprocessing(self.output_file, self.rolling_summary), self.loop)
 
+    async def run_postprocessing(self, output_file, rolling_summary):
         try:
-            # Clean up transcription
-            cleanup_response = self.openai_client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "You are an expert in cleaning up speech transcriptions. Your task is to improve the readability and clarity of the conversation while maintaining its original meaning. Only provide the cleaned transcription and nothing else."},
-                    {"role": "user", "content": f"Please clean up this transcription by doing the following:\n"
-                                            f"1. Remove filler words, stutters, and false starts.\n"
-                                            f"2. Correct any obvious word errors or misheard words.\n"
-                                            f"3. Remove unnecessary repetitions.\n"
-                                            f"4. Improve sentence structure for clarity, but maintain the conversational tone.\n"
-                                            f"5. Do not add any new information or change the meaning of the conversation.\n"
-                                            f"6. Leave the timestamps and dont remove them.\n"
-                                            f"Here's the transcription:\n{transcription}"}
-                ]
-            )
-            cleaned_transcription = cleanup_response.choices[0].message.content
-
-            # Summarize transcription
-            summary_response = self.openai_client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant that summarizes transcriptions."},
-                    {"role": "user", "content": f"Please provide a brief summary of this transcription: {cleaned_transcription}"}
-                ]
-            )
-            summary = summary_response.choices[0].message.content
-
-            # Save cleaned transcription and summary
-            base_name = os.path.splitext(os.path.basename(self.output_file))[0]
-            cleaned_file = os.path.join(self.output_dir, f"{base_name}_cleaned.txt")
-            summary_file = os.path.join(self.output_dir, f"{base_name}_summary.txt")
-
-            # Ensure filenames are unique
-            counter = 1
-            while os.path.exists(cleaned_file) or os.path.exists(summary_file):
-                cleaned_file = os.path.join(self.output_dir, f"{base_name}_cleaned_{counter}.txt")
-                summary_file = os.path.join(self.output_dir, f"{base_name}_summary_{counter}.txt")
-                counter += 1
-
-            with open(cleaned_file, "w") as f:
-                f.write(cleaned_transcription)
-
-            with open(summary_file, "w") as f:
-                f.write(summary)
-
-            logging.info(f"Processing complete. Files saved: {self.output_file}, {cleaned_file}, {summary_file}")
-
+            summary = None
+            if rolling_summary is not None:
+                # The rolling summary already covers the session; only the last few lines still need folding in
+                summary = await rolling_summary.finalize()
+                if rolling_summary.lines_behind:
+                    # It misses the end of the session, so summarize the whole transcript instead
+                    summary = None
+            written = await self.postprocessor.process_file(
+                output_file, on_progress=lambda stage, done, total: self.updates.post("progress", (stage, done, total)),
+                summary=summary)
+            await asyncio.to_thread(self.search_index.update_files, written)
         except Exception as e:
             logging.error(f"Error processing transcription with OpenAI: {e}")
             # We're not showing an error message to the user, but we're logging it
+        finally:
+            self.updates.post("postprocessed")
 
     async def run_transcription(self):
-        audio_capture = AudioCapture()
-        audio_capture.set_capture_mode(self.capture_mode)
-        processor = TranscriptionProcessor()
-        client = DeepgramClient(self.deepgram_api_key)
-
         try:
-            async with client.connect() as websocket:
-                send_task = asyncio.create_task(audio_capture.capture_and_send_audio(websocket))
-                receive_task = asyncio.create_task(self.receive_transcription(websocket, processor))
-                await asyncio.gather(send_task, receive_task)
+            await self.pipeline.run()
         except Exception as e:
             logging.error(f"An error occurred: {e}")
-            self.root.after(0, lambda: messagebox.showerror("Error", f"An error occurred: {e}"))
-
-    async def receive_transcription(self, websocket, processor):
-        try:
-            async for message in websocket:
+            self.updates.post("error", e)
+        finally:
+            self.updates.post("finished")
+
+    def render_frame(self):
+        # Runs on the Tk thread once per frame while a session is active, never busy-polling when idle
+        started = time.monotonic()
+        self.frame_delay.observe(max(0.0, started - self.frame_due))
+        lines, partial, events = self.updates.drain()
+        if lines:
+            self.transcription_area.insert("end", "\n".join(lines) + "\n")
+            self.trim_view()
+            self.transcription_area.see("end")
+            self.word_count_label.configure(text=f"Words: {self.updates.word_count}")
+        if partial is not None:
+            self.partial_label.configure(text=partial)
+
+        for event, payload in events:
+            if event == "error":
+                messagebox.showerror("Error", f"An error occurred: {payload}")
+            elif event == "finished":
+                self.session_active = False
+                self.finish_transcription()
+            elif event == "summary":
+                self.summary_label.configure(text=f"Summary so far: {payload}")
+            elif event == "progress" and not self.is_transcribing:
+                # A previous session can still be post-processing while the next one records
+                stage, done, total = payload
+                self.progress_bar.set(done / total)
+                self.status_bar.configure(text=f"Post-processing: {stage} {done}/{total}")
+            elif event == "postprocessed":
+                self.postprocessing = False
                 if not self.is_transcribing:
-                    break
-                transcript = processor.process_message(message)
-                if transcript:
-                    self.root.after(0, self.update_transcription_area, transcript)
-        except Exception as e:
-            logging.error(f"Error in receive_transcription: {e}")
-
-    def update_transcription_area(self, transcript):
-        self.transcription_area.insert("end", transcript + "\n")
-        self.transcription_area.see("end")
-        with open(self.temp_output_file, "a") as f:
-            f.write(transcript + "\n")
-        
-        self.word_count += len(transcript.split())
-        self.word_count_label.configure(text=f"Words: {self.word_count}")
+                    self.progress_bar.configure(mode="indeterminate")
+                    self.progress_bar.set(0)
+                    self.status_bar.configure(text="Ready")
+
+        self.frame_job = None
+        self.frame_seconds.observe(time.monotonic() - started)
+        if self.session_active or self.postprocessing:
+            self.schedule_frames()
+
+    def schedule_frames(self):
+        if self.frame_job is None:
+            self.frame_due = time.monotonic() + FRAME_MS / 1000
+            self.frame_job = self.root.after(FRAME_MS, self.render_frame)
+
+    def reset_view(self):
+        self.view_limit = MAX_VIEW_LINES
+        self.lines_hidden = 0
+        self.load_earlier_button.configure(state="disabled")
+
+    def trim_view(self):
+        # The text after the last newline is an empty line, so the widget holds one line fewer
+        line_count = int(self.transcription_area.index("end-1c").split(".")[0]) - 1
+        excess = line_count - self.view_limit
+        if excess > 0:
+            self.transcription_area.delete("1.0", f"{excess + 1}.0")
+            self.lines_hidden += excess
+            self.load_earlier_button.configure(state="normal")
+
+    def load_earlier_lines(self):
+        if not self.lines_hidden or not self.transcript_path:
+            return
+        start = max(0, self.lines_hidden - PAGE_LINES)
+        try:
+            with open(self.transcript_path, "r", encoding="utf-8") as f:
+                earlier = list(itertools.islice(f, start, self.lines_hidden))
+        except OSError as e:
+            logging.error(f"Could not page in earlier lines: {e}")
+            return
+        self.transcription_area.insert("1.0", "".join(earlier))
+        # Let the view grow by what the user asked for so the next frame does not trim it again
+        self.view_limit += self.lines_hidden - start
+        self.lines_hidden = start
+        if not self.lines_hidden:
+            self.load_earlier_button.configure(state="disabled")
+
+    def search_transcripts(self, event=None):
+        query = self.search_entry.get().strip()
+        if not query:
+            return
+        try:
+            results = self.search_index.search(query, limit=SEARCH_LIMIT)
+        except ValueError as e:
+            self.status_bar.configure(text=str(e))
+            return
+        if self.search_window is None or not self.search_window.winfo_exists():
+            self.search_window = ctk.CTkToplevel(self.root)
+            self.search_window.title("Search Results")
+            self.search_window.geometry("700x400")
+            self.search_results = ctk.CTkTextbox(self.search_window, wrap="word", fg_color="#3b3b3b", text_color="white")
+            self.search_results.pack(fill="both", expand=True, padx=10, pady=10)
+        self.search_results.configure(state="normal")
+        self.search_results.delete("0.0", "end")
+        self.search_results.insert("end", "\n\n".join(format_result(result) for result in results) or f"No matches for {query}")
+        self.search_results.configure(state="disabled")
+        self.search_window.lift()
+        self.status_bar.configure(text=f"{len(results)} search results")
+
+    def play_line(self, event):
+        # Double-click a line to hear the audio behind it
+        if not self.archive_dir or not self.sidecar_path:
+            return
+        from modules.audio_archive import play_clip, sentence_clip
+        line_number = int(self.transcription_area.index(f"@{event.x},{event.y}").split(".")[0])
+        line_index = self.lines_hidden + line_number - 1
+        try:
+            clip, sample_rate, _ = sentence_clip(self.transcript_path, line_index, archive_dir=self.archive_dir, sidecar_path=self.sidecar_path)
+        except (OSError, IndexError, KeyError, ValueError) as e:
+            logging.warning(f"No audio for line {line_index + 1}: {e}")
+            return
+        if len(clip):
+            self.status_bar.configure(text=f"Playing line {line_index + 1}")
+            threading.Thread(target=play_clip, args=(clip, sample_rate), name="clip-playback", daemon=True).start()
 
     def update_duration(self):
         if self.is_transcribing:
@@ -311,17 +513,15 @@ class TranscriptionApp:
             self.duration_update_job = self.root.after(1000, self.update_duration)
 
 def main():
-    app = TranscriptionApp()
-    
-    # Set up asyncio with customtkinter
-    async def async_mainloop():
-        while True:
-            app.root.update()
-            await asyncio.sleep(0.05)
-
-    loop = asyncio.get_event_loop()
-    loop.create_task(async_mainloop())
-    loop.run_forever()
+    # asyncio gets its own thread so neither loop has to poll the other
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="asyncio", daemon=True).start()
+
+    app = TranscriptionApp(loop)
+    app.root.mainloop()
+    if app.prewarm is not None:
+        app.prewarm.close()
+    loop.call_soon_threadsafe(loop.stop)
 
 if __name__ == "__main__":
     main()
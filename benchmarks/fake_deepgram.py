@@ -0,0 +1,198 @@
+import argparse
+import asyncio
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import websockets
+
+WORDS = "so the quarterly numbers look good but we still need to ship the release before friday".split()
+
+def make_words(start, end, words_per_second, first_index, sentence_length=8):
+    count = max(1, int((end - start) * words_per_second))
+    step = (end - start) / count
+    words = []
+    for i in range(count):
+        index = first_index + i
+        word = WORDS[index % len(WORDS)]
+        punctuated = word.capitalize() if index % sentence_length == 0 else word
+        if index % sentence_length == sentence_length - 1:
+            punctuated += "."
+        words.append({
+            "word": word,
+            "punctuated_word": punctuated,
+            "start": start + i * step,
+            "end": start + (i + 0.8) * step,
+            "confidence": 0.95,
+        })
+    return words
+
+def results_message(start, end, words, channel, channels, is_final, speech_final=False):
+    return {
+        "type": "Results",
+        "channel_index": [channel, channels],
+        "start": start,
+        "duration": end - start,
+        "is_final": is_final,
+        "speech_final": speech_final,
+        "channel": {"alternatives": [{
+            "transcript": " ".join(word["punctuated_word"] for word in words),
+            "confidence": 0.95,
+            "words": words,
+        }]},
+    }
+
+class FakeDeepgramServer:
+    def __init__(self, delay=0.05, interim_every=0.5, final_every=2.0, words_per_second=2.5):
+        self.delay = delay
+        self.interim_every = interim_every
+        self.final_every = final_every
+        self.words_per_second = words_per_second
+        self.connections = 0
+        self.bytes_received = 0
+
+    async def handle(self, websocket, path=None):
+        query = parse_qs(urlparse(path or websocket.path).query)
+        sample_rate = int(query.get("sample_rate", ["16000"])[0])
+        channels = int(query.get("channels", ["1"])[0])
+        bytes_per_second = sample_rate * channels * 2
+        # FLAC/Opus streams come without format hints and cannot be timed by their size;
+        # capture is paced in real time, so wall time since the first byte stands in
+        containerized = "encoding" not in query
+        first_audio_at = None
+        self.connections += 1
+
+        outbox = asyncio.Queue()
+        sender = asyncio.create_task(self._send_delayed(websocket, outbox))
+        received = 0
+        final_until = 0.0
+        last_interim = 0.0
+        word_index = 0
+
+        def emit(end, is_final, speech_final=False):
+            nonlocal final_until, word_index
+            due = time.monotonic() + self.delay
+            words_before = word_index
+            for channel in range(channels):
+                words = make_words(final_until, end, self.words_per_second, words_before)
+                outbox.put_nowait((due, results_message(final_until, end, words, channel, channels, is_final, speech_final)))
+                if is_final:
+                    word_index = words_before + len(words)
+            if is_final:
+                final_until = end
+
+        try:
+            async for message in websocket:
+                if isinstance(message, bytes):
+                    received += len(message)
+                    self.bytes_received += len(message)
+                    if first_audio_at is None:
+                        first_audio_at = time.monotonic()
+                    audio_seconds = self._audio_seconds(containerized, first_audio_at, received / bytes_per_second)
+                    if audio_seconds - final_until >= self.final_every:
+                        emit(audio_seconds, is_final=True)
+                        last_interim = audio_seconds
+                    elif audio_seconds - last_interim >= self.interim_every:
+                        emit(audio_seconds, is_final=False)
+                        last_interim = audio_seconds
+                elif json.loads(message).get("type") == "CloseStream":
+                    audio_seconds = self._audio_seconds(containerized, first_audio_at, received / bytes_per_second)
+                    if audio_seconds > final_until:
+                        emit(audio_seconds, is_final=True, speech_final=True)
+                    break
+        finally:
+            outbox.put_nowait((0, None))
+            await sender
+            await websocket.close()
+
+    def _audio_seconds(self, containerized, first_audio_at, pcm_seconds):
+        if containerized:
+            return time.monotonic() - first_audio_at if first_audio_at else 0.0
+        return pcm_seconds
+
+    async def _send_delayed(self, websocket, outbox):
+        # One queue per connection keeps messages in order while each waits out the delay
+        while True:
+            due, message = await outbox.get()
+            if message is None:
+                return
+            wait = due - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                await websocket.send(json.dumps(message))
+            except websockets.ConnectionClosed:
+                return
+
+    async def serve(self, host="127.0.0.1", port=8766):
+        async with websockets.serve(self.handle, host, port, max_size=None):
+            logging.info(f"Fake Deepgram streaming server on ws://{host}:{port}/v1/listen")
+            await asyncio.Future()
+
+class PrerecordedHandler(BaseHTTPRequestHandler):
+    # Stand-in for the prerecorded endpoint used by modules.batch
+    words_per_second = 2.5
+
+    def do_POST(self):
+        body = self._read_body()
+        channels, sample_rate = 1, 16000
+        if body[:4] == b"RIFF":
+            channels = int.from_bytes(body[22:24], "little")
+            sample_rate = int.from_bytes(body[24:28], "little")
+            body = body[44:]
+        duration = len(body) / (sample_rate * channels * 2)
+        # Like Deepgram, channels are mixed into one result unless multichannel=true is asked for
+        multichannel = parse_qs(urlparse(self.path).query).get("multichannel") == ["true"]
+        result = {"results": {"channels": [
+            {"alternatives": [{"transcript": "", "words": make_words(0.0, duration, self.words_per_second, 0)}]}
+            for _ in range(channels if multichannel else 1)
+        ]}}
+        payload = json.dumps(result).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _read_body(self):
+        if self.headers.get("Transfer-Encoding", "").lower() != "chunked":
+            return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        chunks = []
+        while True:
+            size = int(self.rfile.readline().split(b";")[0], 16)
+            if size == 0:
+                self.rfile.readline()
+                return b"".join(chunks)
+            chunks.append(self.rfile.read(size))
+            self.rfile.readline()
+
+    def log_message(self, format, *args):
+        pass
+
+def start_prerecorded_server(host="127.0.0.1", port=8767):
+    server = ThreadingHTTPServer((host, port), PrerecordedHandler)
+    threading.Thread(target=server.serve_forever, name="fake-prerecorded", daemon=True).start()
+    logging.info(f"Fake Deepgram prerecorded server on http://{host}:{port}/v1/listen")
+    return server
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Local stand-in for the Deepgram streaming and prerecorded APIs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766, help="Streaming websocket port")
+    parser.add_argument("--http-port", type=int, default=8767, help="Prerecorded HTTP port (0 to disable)")
+    parser.add_argument("--delay", type=float, default=0.05, help="Seconds between hearing audio and answering")
+    parser.add_argument("--interim-every", type=float, default=0.5, help="Seconds of audio between interim results")
+    parser.add_argument("--final-every", type=float, default=2.0, help="Seconds of audio between final results")
+    args = parser.parse_args(argv)
+    logging.getLogger("websockets").setLevel(logging.WARNING)
+
+    if args.http_port:
+        start_prerecorded_server(args.host, args.http_port)
+    server = FakeDeepgramServer(delay=args.delay, interim_every=args.interim_every, final_every=args.final_every)
+    asyncio.run(server.serve(args.host, args.port))
+
+if __name__ == "__main__":
+    main()
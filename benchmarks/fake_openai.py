@@ -0,0 +1,87 @@
+import argparse
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Stand-in for the chat completions endpoint used by modules.postprocess. Answers are
+# deterministic so map-reduce results can be checked: cleanup hands the transcription back,
+# a summary counts the lines it was given and a reduce counts the summaries it merged.
+
+TRANSCRIPTION_MARKER = "Here's the transcription:\n"
+
+def fake_answer(user_prompt):
+    if TRANSCRIPTION_MARKER in user_prompt:
+        return user_prompt.split(TRANSCRIPTION_MARKER, 1)[1]
+    if user_prompt.startswith("These are summaries"):
+        parts = user_prompt.count("Summary of") + user_prompt.count("Combined")
+        return f"Combined {parts} summaries."
+    lines = len([line for line in user_prompt.splitlines() if line.startswith("[")])
+    return f"Summary of {lines} lines."
+
+class FakeCompletionServer(ThreadingHTTPServer):
+    def __init__(self, address, delay=0.0, fail_first=0):
+        super().__init__(address, CompletionHandler)
+        self.delay = delay
+        self.fail_first = fail_first  # Answer this many requests with 429 before serving any
+        self.requests = []  # (monotonic arrival time, messages)
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+class CompletionHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        server = self.server
+        with server._lock:
+            server.requests.append((time.monotonic(), body["messages"]))
+            rejected = len(server.requests) <= server.fail_first
+        if rejected:
+            self._send(429, {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}})
+            return
+        if server.delay:
+            time.sleep(server.delay)
+        content = fake_answer(body["messages"][-1]["content"])
+        self._send(200, {
+            "id": f"chatcmpl-fake-{len(server.requests)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        })
+
+    def _send(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_completion_server(host="127.0.0.1", port=8768, delay=0.0, fail_first=0):
+    server = FakeCompletionServer((host, port), delay=delay, fail_first=fail_first)
+    threading.Thread(target=server.serve_forever, name="fake-completions", daemon=True).start()
+    logging.info(f"Fake OpenAI completion server on {server.base_url}")
+    return server
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Local stand-in for the OpenAI chat completions API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8768)
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds to wait before answering")
+    args = parser.parse_args(argv)
+    server = FakeCompletionServer((args.host, args.port), delay=args.delay)
+    logging.info(f"Fake OpenAI completion server on {server.base_url}")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import argparse
+import asyncio
+import logging
+import socket
+import subprocess
+import sys
+import time
+import numpy as np
+from benchmarks.synthetic_audio import SyntheticMicrophone, WavMicrophone
+from modules.audio_capture import DEFAULT_DEVICE_RATE
+from modules.encoding import ENCODINGS
+from modules.pipeline import TranscriptionPipeline
+
+def percentiles(values, points=(50, 90, 95, 99)):
+    if not values:
+        values = [float("nan")]
+    result = {f"p{point}": float(np.percentile(values, point)) for point in points}
+    result["max"] = float(np.max(values))
+    return result
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+async def wait_for_port(port, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.05)
+    raise TimeoutError(f"Fake Deepgram server did not start on port {port}")
+
+async def monitor_loop_lag(lags, interval=0.01):
+    # How late the loop wakes us up is how late every websocket read and send is too
+    while True:
+        started = time.monotonic()
+        await asyncio.sleep(interval)
+        lags.append(time.monotonic() - started - interval)
+
+async def run_streams(streams, duration, base_url, wav=None, use_vad=True, encoding="linear16"):
+    latencies = []
+    pipelines = []
+    for index in range(streams):
+        source = WavMicrophone(wav) if wav else SyntheticMicrophone(seed=index)
+
+        def sink(sentence, line, source=source):
+            # Capture-to-display: from when the last word was recorded to when a sink sees the sentence
+            recorder = source.recorders[0]
+            latencies.append(time.monotonic() - (recorder.started_at + sentence["end"]))
+
+        pipeline = TranscriptionPipeline("benchmark", "microphone", sinks=[sink], use_vad=use_vad,
+                                         name=f"stream-{index}", base_url=base_url, encoding=encoding)
+        pipeline.build()
+        capture = pipeline.audio_capture
+        # Synthetic sources play at whatever rate they are opened at; a WAV only at its own
+        capture.device_rate = source.file_rate if wav else DEFAULT_DEVICE_RATE
+        capture.sources = [("mic", lambda source=source, rate=capture.device_rate: source.recorder(samplerate=rate))]
+        pipelines.append(pipeline)
+
+    lags = []
+    lag_task = asyncio.create_task(monitor_loop_lag(lags))
+    cpu_started, wall_started = time.process_time(), time.monotonic()
+    asyncio.get_running_loop().call_later(duration, lambda: [pipeline.stop() for pipeline in pipelines])
+    results = await asyncio.gather(*(pipeline.run() for pipeline in pipelines), return_exceptions=True)
+    cpu_seconds, wall_seconds = time.process_time() - cpu_started, time.monotonic() - wall_started
+    lag_task.cancel()
+
+    errors = [result for result in results if isinstance(result, BaseException)]
+    cpu_per_stream = cpu_seconds / wall_seconds / streams
+    return {
+        "streams": streams,
+        "errors": len(errors),
+        "sentences": len(latencies),
+        "latency_ms": {key: value * 1000 for key, value in percentiles(latencies).items()},
+        "loop_lag_ms": {key: value * 1000 for key, value in percentiles(lags).items()},
+        "cpu_per_stream_pct": 100 * cpu_per_stream,
+        # CPU bound estimate: how many streams one core could carry at this cost
+        "sessions_per_core": 1 / cpu_per_stream if cpu_per_stream else float("inf"),
+        "overruns": sum(pipeline.audio_capture.stats()["overruns"] for pipeline in pipelines),
+        "bytes_sent": sum(pipeline.client.bytes_sent for pipeline in pipelines),
+        "bytes_suppressed": sum(pipeline.client.bytes_suppressed for pipeline in pipelines),
+        "wire_bytes": sum(pipeline.session.bytes_on_wire for pipeline in pipelines if pipeline.session),
+    }
+
+def print_report(report):
+    latency, lag = report["latency_ms"], report["loop_lag_ms"]
+    print(f"\n== {report['streams']} stream(s): {report['sentences']} sentences, {report['errors']} errors")
+    print(f"capture->display latency ms: p50 {latency['p50']:.1f}  p90 {latency['p90']:.1f}  "
+          f"p95 {latency['p95']:.1f}  p99 {latency['p99']:.1f}  max {latency['max']:.1f}")
+    print(f"event loop lag ms:           p50 {lag['p50']:.2f}  p99 {lag['p99']:.2f}  max {lag['max']:.2f}")
+    print(f"cpu per stream: {report['cpu_per_stream_pct']:.2f}% of a core  "
+          f"(~{report['sessions_per_core']:.0f} sessions per core)")
+    print(f"overruns: {report['overruns']}  bytes sent: {report['bytes_sent']}  suppressed: {report['bytes_suppressed']}  "
+          f"on the wire: {report['wire_bytes']}")
+
+async def main_async(args):
+    port = free_port()
+    server = subprocess.Popen([
+        sys.executable, "-m", "benchmarks.fake_deepgram", "--port", str(port), "--http-port", "0",
+        "--delay", str(args.delay), "--final-every", str(args.final_every),
+    ])
+    try:
+        await wait_for_port(port)
+        base_url = f"ws://127.0.0.1:{port}/v1/listen"
+        reports = []
+        for streams in args.streams:
+            report = await run_streams(streams, args.duration, base_url, wav=args.wav, use_vad=not args.no_vad, encoding=args.encoding)
+            print_report(report)
+            reports.append(report)
+    finally:
+        server.terminate()
+        server.wait()
+
+    failed = False
+    for report in reports:
+        if report["errors"]:
+            failed = True
+        if args.max_p95_ms and report["latency_ms"]["p95"] > args.max_p95_ms:
+            print(f"FAIL: p95 latency {report['latency_ms']['p95']:.1f} ms > {args.max_p95_ms} ms with {report['streams']} streams")
+            failed = True
+        if args.max_loop_lag_ms and report["loop_lag_ms"]["p99"] > args.max_loop_lag_ms:
+            print(f"FAIL: p99 loop lag {report['loop_lag_ms']['p99']:.1f} ms > {args.max_loop_lag_ms} ms with {report['streams']} streams")
+            failed = True
+    return 1 if failed else 0
+
+def main(argv=None):
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Latency and throughput benchmark against a local fake Deepgram")
+    parser.add_argument("--streams", type=lambda value: [int(n) for n in value.split(",")], default=[1, 4, 16],
+                        help="Comma-separated concurrent stream counts to run, one after another")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds of audio per run")
+    parser.add_argument("--wav", help="16-bit WAV to stream instead of synthetic audio")
+    parser.add_argument("--encoding", choices=list(ENCODINGS), default="linear16", help="Upstream audio encoding")
+    parser.add_argument("--delay", type=float, default=0.05, help="Fake upstream response delay in seconds")
+    parser.add_argument("--final-every", type=float, default=2.0, help="Seconds of audio between fake final results")
+    parser.add_argument("--no-vad", action="store_true")
+    parser.add_argument("--max-p95-ms", type=float, help="Exit non-zero if p95 latency exceeds this")
+    parser.add_argument("--max-loop-lag-ms", type=float, help="Exit non-zero if p99 event loop lag exceeds this")
+    args = parser.parse_args(argv)
+    return asyncio.run(main_async(args))
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+import time
+import wave
+import numpy as np
+
+# Stand-ins for soundcard devices: same recorder()/record(numframes) shape, paced in real time
+# so AudioCapture's capture threads block exactly like they would on a sound card.
+
+class _PacedRecorder:
+    def __init__(self, source, samplerate):
+        self.source = source
+        self.samplerate = samplerate
+        self.started_at = None
+        self.frames = 0
+
+    def __enter__(self):
+        self.started_at = time.monotonic()
+        self.source.recorders.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def record(self, numframes):
+        due = self.started_at + (self.frames + numframes) / self.samplerate
+        delay = due - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        data = self.source.generate(self.frames, numframes, self.samplerate)
+        self.frames += numframes
+        return data
+
+class SyntheticMicrophone:
+    def __init__(self, speech_seconds=1.5, pause_seconds=0.7, channels=2, seed=0):
+        self.speech_seconds = speech_seconds
+        self.pause_seconds = pause_seconds
+        self.channels = channels
+        self.recorders = []
+        self._rng = np.random.default_rng(seed)
+
+    def recorder(self, samplerate=16000, **kwargs):
+        return _PacedRecorder(self, samplerate)
+
+    def generate(self, offset, numframes, samplerate):
+        # Bursts of voiced-sounding tones separated by near-silence, so the VAD has work to do
+        t = (offset + np.arange(numframes)) / samplerate
+        period = self.speech_seconds + self.pause_seconds
+        speaking = (t % period) < self.speech_seconds
+        envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 4 * t)
+        voice = 0.3 * envelope * (np.sin(2 * np.pi * 180 * t) + 0.5 * np.sin(2 * np.pi * 720 * t))
+        noise = self._rng.normal(0, 0.001, numframes)
+        mono = np.where(speaking, voice, 0.0) + noise
+        return np.repeat(mono[:, None], self.channels, axis=1).astype(np.float32)
+
+class WavMicrophone:
+    def __init__(self, path):
+        with wave.open(path, "rb") as wav:
+            if wav.getsampwidth() != 2:
+                raise ValueError(f"{path}: only 16-bit PCM WAV files are supported")
+            self.file_rate = wav.getframerate()
+            self.channels = wav.getnchannels()
+            raw = wav.readframes(wav.getnframes())
+        self.samples = (np.frombuffer(raw, dtype=np.int16).reshape(-1, self.channels) / 32768).astype(np.float32)
+        self.recorders = []
+
+    def recorder(self, samplerate=16000, **kwargs):
+        if samplerate != self.file_rate:
+            raise ValueError(f"WAV is {self.file_rate} Hz but the recorder was opened at {samplerate} Hz")
+        return _PacedRecorder(self, samplerate)
+
+    def generate(self, offset, numframes, samplerate):
+        # Loop the file for as long as the benchmark runs
+        index = (offset + np.arange(numframes)) % len(self.samples)
+        return self.samples[index]
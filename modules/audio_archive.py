@@ -0,0 +1,257 @@
+import argparse
+import bisect
+import json
+import logging
+import os
+import queue
+import shutil
+import sys
+import threading
+import wave
+import numpy as np
+from modules.transcript_writer import safe_filename, unique_path
+from modules.transcription_processor import parse_timestamp
+
+try:
+    import soundfile
+except ImportError:
+    soundfile = None
+
+ARCHIVE_FORMATS = ("wav", "flac")
+MANIFEST_NAME = "index.json"
+_CLOSE = object()
+
+# Layout of a <title>_audio/ directory next to <title>.txt and <title>.jsonl:
+#   index.json      sample rate, channels, labels, frames per part, format
+#   part_0000.wav   fixed-length parts; frame N of the session is in part N // part_frames
+# Sidecar sentences carry start/end on the same clock, so line i of the transcript maps to
+# line i of the .jsonl, and from there straight to a part and an offset.
+
+class AudioArchive:
+    def __init__(self, output_dir, timestamp, audio_format="wav", part_seconds=600):
+        if audio_format not in ARCHIVE_FORMATS:
+            raise ValueError(f"Invalid archive format: {audio_format}")
+        if audio_format == "flac" and soundfile is None:
+            raise RuntimeError("FLAC archives need the soundfile package (pip install soundfile)")
+        self.output_dir = output_dir
+        self.audio_format = audio_format
+        self.part_seconds = part_seconds
+        self.temp_dir = os.path.join(output_dir, f"temp_{timestamp}_audio")
+        self.path = None
+        self.frames_written = 0
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+
+    def start(self, sample_rate, channels, channel_labels=None):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.part_frames = int(self.part_seconds * sample_rate)
+        os.makedirs(self.temp_dir, exist_ok=True)
+        write_manifest(self.temp_dir, {
+            "sample_rate": sample_rate,
+            "channels": channels,
+            "channel_labels": list(channel_labels or []),
+            "part_frames": self.part_frames,
+            "format": self.audio_format,
+        })
+        self._thread = threading.Thread(target=self._run, name="audio-archive", daemon=True)
+        self._thread.start()
+
+    def write(self, block):
+        # Called from the send loop with a view into a reused buffer: copy and hand off, nothing else
+        self._queue.put(block.tobytes())
+
+    def _run(self):
+        frame_bytes = 2 * self.channels
+        part, part_index, part_filled = None, -1, 0
+        try:
+            while True:
+                batch = [self._queue.get()]
+                while True:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                closing = batch[-1] is _CLOSE
+                data = b"".join(item for item in batch if item is not _CLOSE)
+                while data:
+                    if part is None or part_filled == self.part_frames:
+                        if part is not None:
+                            part.close()
+                        part_index += 1
+                        part, part_filled = self._open_part(part_index), 0
+                    take = min(len(data) // frame_bytes, self.part_frames - part_filled)
+                    self._write_part(part, data[:take * frame_bytes])
+                    data = data[take * frame_bytes:]
+                    part_filled += take
+                    self.frames_written += take
+                if closing:
+                    return
+        finally:
+            if part is not None:
+                part.close()
+
+    def _open_part(self, index):
+        path = os.path.join(self.temp_dir, part_name(index, self.audio_format))
+        if self.audio_format == "flac":
+            return soundfile.SoundFile(path, "w", samplerate=self.sample_rate, channels=self.channels, format="FLAC", subtype="PCM_16")
+        part = wave.open(path, "wb")
+        part.setnchannels(self.channels)
+        part.setsampwidth(2)
+        part.setframerate(self.sample_rate)
+        return part
+
+    def _write_part(self, part, data):
+        if self.audio_format == "flac":
+            part.buffer_write(data, dtype="int16")
+        else:
+            # wave patches the header on every write, so a crash still leaves playable parts
+            part.writeframes(data)
+
+    def close(self):
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(_CLOSE)
+            self._thread.join()
+
+    def finalize(self, base_path=None, title="Untitled"):
+        # base_path: the transcript's path without extension, so audio and text share a name
+        self.close()
+        if not os.path.isdir(self.temp_dir):
+            return None
+        if not self.frames_written:
+            shutil.rmtree(self.temp_dir, ignore_errors=True)
+            return None
+        if base_path is None:
+            base_path = unique_path(self.output_dir, safe_filename(title))
+        self.path = base_path + "_audio"
+        os.replace(self.temp_dir, self.path)
+        logging.info(f"Saved audio archive {self.path} ({self.frames_written / self.sample_rate:.0f}s)")
+        return self.path
+
+def part_name(index, audio_format):
+    return f"part_{index:04d}.{audio_format}"
+
+def write_manifest(archive_dir, manifest):
+    temp_path = os.path.join(archive_dir, MANIFEST_NAME + ".tmp")
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(temp_path, os.path.join(archive_dir, MANIFEST_NAME))
+
+def archive_dir_for(transcript_path):
+    return os.path.splitext(transcript_path)[0] + "_audio"
+
+def read_clip(archive_dir, start, end):
+    # Returns (frames x channels int16, sample_rate, manifest) for [start, end) seconds
+    with open(os.path.join(archive_dir, MANIFEST_NAME), encoding="utf-8") as f:
+        manifest = json.load(f)
+    sample_rate, channels, part_frames = manifest["sample_rate"], manifest["channels"], manifest["part_frames"]
+    position, last = max(0, int(start * sample_rate)), int(end * sample_rate)
+    pieces = []
+    while position < last:
+        index, offset = divmod(position, part_frames)
+        path = os.path.join(archive_dir, part_name(index, manifest["format"]))
+        if not os.path.exists(path):
+            break
+        wanted = min(last - position, part_frames - offset)
+        frames = _read_frames(path, manifest["format"], offset, wanted, channels)
+        if not len(frames):
+            break
+        pieces.append(frames)
+        position += len(frames)
+        if len(frames) < wanted:
+            break  # The recording ended inside this clip
+    clip = np.concatenate(pieces) if pieces else np.zeros((0, channels), dtype=np.int16)
+    return clip, sample_rate, manifest
+
+def _read_frames(path, audio_format, offset, count, channels):
+    if audio_format == "flac":
+        if soundfile is None:
+            raise RuntimeError("Reading FLAC archives needs the soundfile package (pip install soundfile)")
+        with soundfile.SoundFile(path) as part:
+            part.seek(offset)
+            return part.read(count, dtype="int16", always_2d=True)
+    with wave.open(path, "rb") as part:
+        if offset >= part.getnframes():
+            return np.zeros((0, channels), dtype=np.int16)
+        part.setpos(offset)
+        return np.frombuffer(part.readframes(count), dtype=np.int16).reshape(-1, channels)
+
+def write_clip(path, clip, sample_rate):
+    with wave.open(path, "wb") as out:
+        out.setnchannels(clip.shape[1])
+        out.setsampwidth(2)
+        out.setframerate(sample_rate)
+        out.writeframes(np.ascontiguousarray(clip).tobytes())
+
+def load_sentences(sidecar_path):
+    with open(sidecar_path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def sentence_clip(transcript_path, line_index, pad=0.25, archive_dir=None, sidecar_path=None):
+    # line_index is zero-based and counts lines of the .txt, which are the .jsonl records in order
+    sidecar_path = sidecar_path or os.path.splitext(transcript_path)[0] + ".jsonl"
+    sentences = load_sentences(sidecar_path)
+    if not 0 <= line_index < len(sentences):
+        raise IndexError(f"{transcript_path} has no line {line_index + 1}")
+    sentence = sentences[line_index]
+    clip, sample_rate, _ = read_clip(archive_dir or archive_dir_for(transcript_path),
+                                     sentence["start"] - pad, sentence["end"] + pad)
+    if clip.shape[1] > 1:
+        clip = clip[:, sentence["channel"]:sentence["channel"] + 1]  # Only the speaker who said it
+    return clip, sample_rate, sentence
+
+def sentence_at(sentences, seconds):
+    starts = [sentence["start"] for sentence in sentences]
+    index = bisect.bisect_right(starts, seconds) - 1
+    return max(0, index)
+
+def play_clip(clip, sample_rate):
+    import soundcard as sc
+    sc.default_speaker().play(clip.astype(np.float32) / 32768, samplerate=sample_rate)
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Pull the audio behind a transcript line out of its archive")
+    parser.add_argument("transcript", help="Transcript .txt in the output directory")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--line", type=int, help="1-based transcript line number")
+    target.add_argument("--at", type=parse_timestamp, help="Time in the session, e.g. 00:12:30; picks the line spoken then")
+    target.add_argument("--start", type=parse_timestamp, help="Start of a raw time range (needs --end)")
+    parser.add_argument("--end", type=parse_timestamp)
+    parser.add_argument("--pad", type=float, default=0.25, help="Seconds of context around a line")
+    parser.add_argument("--out", help="Output WAV (default: next to the archive)")
+    parser.add_argument("--play", action="store_true", help="Play the clip on the default speaker instead of saving it")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.start is not None:
+            if args.end is None or args.end <= args.start:
+                parser.error("--start needs a later --end")
+            clip, sample_rate, _ = read_clip(archive_dir_for(args.transcript), args.start, args.end)
+            name = f"clip_{args.start:.0f}-{args.end:.0f}s.wav"
+        else:
+            if args.at is not None:
+                sentences = load_sentences(os.path.splitext(args.transcript)[0] + ".jsonl")
+                line_index = sentence_at(sentences, args.at)
+            else:
+                line_index = args.line - 1
+            clip, sample_rate, sentence = sentence_clip(args.transcript, line_index, pad=args.pad)
+            logging.info(f"Line {line_index + 1}: {sentence['line']}")
+            name = f"clip_line{line_index + 1}.wav"
+    except (OSError, IndexError, KeyError, ValueError) as e:
+        print(f"Could not read the clip: {e}", file=sys.stderr)
+        return 1
+
+    if not len(clip):
+        print("No audio archived for that stretch of the session.", file=sys.stderr)
+        return 1
+    if args.play:
+        play_clip(clip, sample_rate)
+        return 0
+    out = args.out or os.path.join(archive_dir_for(args.transcript), name)
+    write_clip(out, clip, sample_rate)
+    logging.info(f"Saved {len(clip) / sample_rate:.1f}s clip to {out}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
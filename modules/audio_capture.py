@@ -1,72 +1,582 @@
 import asyncio
-import soundcard as sc
+import math
+import threading
+import time
+from collections import deque
 import numpy as np
+from modules.metrics import REGISTRY
+from modules.ring_buffer import RingBuffer
+
+# Capture mode -> the sources it records, in channel order
+CAPTURE_SOURCES = {
+    "microphone": ("mic",),
+    "computer audio": ("speaker",),
+    "both": ("mic", "speaker"),
+}
+
+# Used when a device will not say what rate it runs at; the usual mixer rate on all three platforms
+DEFAULT_DEVICE_RATE = 48000
+
+def find_device(name):
+    # soundcard talks to the sound server as soon as it is imported, so that waits until a device is needed
+    import soundcard as sc
+    if name == "mic":
+        return sc.get_microphone(id=sc.default_microphone().name)
+    return sc.get_microphone(id=sc.default_speaker().name, include_loopback=True)
+
+def native_rate(device, default=DEFAULT_DEVICE_RATE):
+    # The rate the sound server mixes this device at, so opening it there skips the OS resampler.
+    # soundcard has no public call for it, so ask each backend the way its own recorder does.
+    backend = type(device).__module__.rsplit(".", 1)[-1]
+    try:
+        if backend == "pulseaudio":
+            from soundcard.pulseaudio import _ffi, _pulse
+            rates = []
+
+            @_ffi.callback("pa_source_info_cb_t")
+            def callback(context, info, eol, userdata):
+                if not eol:
+                    rates.append(info.sample_spec.rate)
+
+            # Loopbacks are monitor sources, so this covers both kinds of device
+            _pulse._pa_context_get_source_info_by_name(_pulse.context, device.id.encode(), callback, _ffi.NULL)
+            return int(rates[0])
+        if backend == "mediafoundation":
+            from soundcard.mediafoundation import _com, _ffi, _ole32
+            client = device._audio_client()
+            mix_format = _ffi.new("WAVEFORMATEXTENSIBLE**")
+            try:
+                _com.check_error(client[0][0].lpVtbl.GetMixFormat(client[0], mix_format))
+                rate = int(mix_format[0][0].Format.nSamplesPerSec)
+                _ole32.CoTaskMemFree(mix_format[0])
+                return rate
+            finally:
+                _com.release(client)
+        if backend == "coreaudio":
+            from soundcard.coreaudio import _CoreAudio, _cac
+            rate, = _CoreAudio.get_property(device.id, _cac.kAudioDevicePropertyNominalSampleRate, "Float64")
+            return int(rate)
+    except Exception as e:
+        print(f"Could not read the sample rate of {device}: {e}")
+    return default
+
+class VoiceActivityDetector:
+    def __init__(self, sample_rate=16000, frame_size=1024, threshold_db=-45.0, zcr_threshold=0.25, hangover_ms=600, preroll_ms=300):
+        self.sample_rate = sample_rate
+        self.frame_size = frame_size
+        self.threshold_db = threshold_db
+        self.zcr_threshold = zcr_threshold
+        frame_ms = 1000 * frame_size / sample_rate
+        self.hangover_frames = math.ceil(hangover_ms / frame_ms)
+        self._preroll = deque(maxlen=max(1, math.ceil(preroll_ms / frame_ms)))
+        self._hangover = 0
+        self.speech_frames = 0
+        self.silent_frames = 0
+
+    def classify(self, windows):
+        # windows: (n_windows, frame_size, channels) int16
+        samples = windows.astype(np.float32)
+        samples *= 1.0 / 32768
+        rms = np.sqrt(np.mean(np.square(samples), axis=1))
+        level_db = 20 * np.log10(rms + 1e-10)
+        signs = np.signbit(samples)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (self.frame_size - 1)
+        # Loud windows are speech; quieter ones still count when they have the
+        # high zero-crossing rate of fricatives ("s", "f") at word edges.
+        speech = (level_db >= self.threshold_db) | ((level_db >= self.threshold_db - 10) & (zcr >= self.zcr_threshold))
+        return speech.any(axis=1)
+
+    @property
+    def in_speech(self):
+        return self._hangover > 0
+
+    def process(self, block):
+        # -> ([(frames suppressed just before it, segment)], frames suppressed after the last segment),
+        # so the caller can place every gap at its position in the sent stream
+        n_windows = len(block) // self.frame_size
+        windows = block[:n_windows * self.frame_size].reshape(n_windows, self.frame_size, -1)
+        channels = windows.shape[2]
+        speech = self.classify(windows)
+
+        segments = []
+        suppressed = 0
+        run_start = None
+        for i, is_speech in enumerate(speech):
+            if is_speech:
+                self._hangover = self.hangover_frames + 1
+            if self._hangover > 0:
+                self._hangover -= 1
+                self.speech_frames += 1
+                if run_start is None:
+                    if self._preroll:
+                        # Send the audio just before speech onset so the first syllable is not clipped
+                        segments.append((suppressed, np.concatenate(self._preroll)))
+                        suppressed = 0
+                        self._preroll.clear()
+                    run_start = i
+                continue
+
+            self.silent_frames += 1
+            if run_start is not None:
+                segments.append((suppressed, windows[run_start:i].reshape(-1, channels)))
+                suppressed = 0
+                run_start = None
+            if len(self._preroll) == self._preroll.maxlen:
+                suppressed += self.frame_size
+            # The block is a view into a reused buffer, so keep a copy
+            self._preroll.append(windows[i].copy())
+
+        if run_start is not None:
+            segments.append((suppressed, windows[run_start:].reshape(-1, channels)))
+            suppressed = 0
+        return segments, suppressed
+
+class Resampler:
+    # Polyphase windowed-sinc resampling, designed the way scipy's resample_poly does it: a
+    # Kaiser-windowed low-pass at the lower of the two Nyquist rates, evaluated only at the
+    # output instants. Without it, everything between 8 kHz and the device's Nyquist rate
+    # (keyboard clicks, sibilance, the top of music) folds back into the speech band.
+    def __init__(self, in_rate, out_rate, half_taps=10, beta=5.0):
+        self.in_rate = in_rate
+        self.out_rate = out_rate
+        self.step = in_rate / out_rate
+        divisor = math.gcd(in_rate, out_rate)
+        self.up = out_rate // divisor
+        self.down = in_rate // divisor
+        span = max(self.up, self.down)
+        length = 2 * half_taps * span + 1
+        self.delay = half_taps * span  # Filter centre, so output k lines up with input time k * step
+        taps = np.sinc((np.arange(length) - self.delay) / span) * np.kaiser(length, beta)
+        taps *= self.up / taps.sum()
+        # phases[p, i] is the tap applied to the input sample i back from the one an output with phase p lands on
+        self.taps_per_phase = math.ceil(length / self.up)
+        self._phases = np.zeros(self.up * self.taps_per_phase)
+        self._phases[:length] = taps
+        self._phases = self._phases.reshape(self.taps_per_phase, self.up).T.copy()
+        self._history = np.zeros(self.taps_per_phase)  # Input before the block, zeros before the first
+        self._consumed = 0  # Input samples seen
+        self._produced = 0  # Output samples returned
+
+    def input_frames(self, output_frames):
+        return round(output_frames * self.step)
+
+    def process(self, block):
+        # block: (frames, channels) float at the device rate -> mono float at the stream rate
+        mono = block.mean(axis=1)
+        if self.up == self.down:
+            return mono.astype(np.float32, copy=False)
+        samples = np.concatenate((self._history, mono))
+        start = self._consumed - len(self._history)  # Input index of samples[0]
+        self._consumed += len(mono)
+        # Output k needs input up to (k * down + delay) // up; emit every one whose input has arrived
+        count = max(0, ((self._consumed - 1) * self.up - self.delay) // self.down + 1 - self._produced)
+        instants = (self._produced + np.arange(count)) * self.down + self.delay
+        newest, phase = np.divmod(instants, self.up)
+        window = samples[(newest - start)[:, None] - np.arange(self.taps_per_phase)]
+        out = np.einsum("ij,ij->i", window, self._phases[phase])
+        self._produced += count
+        self._history = samples[-self.taps_per_phase:]
+        return out.astype(np.float32, copy=False)
+
+class EchoCanceller:
+    # Speaker playback that leaks into the microphone, removed using the loopback channel as
+    # the reference. A GCC-PHAT cross-correlation finds the bulk delay between the two, and a
+    # partitioned-block frequency-domain NLMS filter models the room from that point on.
+    def __init__(self, sample_rate=16000, block_size=256, filter_ms=128, max_delay_ms=500, step=0.5,
+                 estimate_seconds=1.0, min_confidence=8.0, double_talk=2.0, floor_db=-60.0, regularization=0.1,
+                 divergence_blocks=8):
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        self.partitions = max(1, math.ceil(filter_ms * sample_rate / 1000 / block_size))
+        self.max_delay = int(max_delay_ms * sample_rate / 1000)
+        self.step = step
+        self.estimate_frames = int(estimate_seconds * sample_rate)
+        self.min_confidence = min_confidence
+        self.double_talk = double_talk
+        self.regularization = regularization
+        self.divergence_blocks = divergence_blocks
+        self.floor = block_size * (32768 * 10 ** (floor_db / 20)) ** 2
+        self.delay = 0
+        self.delay_changes = 0
+        self.blocks_held = 0
+        self.resets = 0
+        self.path_gain = None  # Echo amplitude relative to the reference, once measured
+        self._gain_windows = deque(maxlen=4)
+        self._window_energy = [0.0, 0.0, 0]  # mic, reference, frames
+        self._diverging = 0
+        self._lead = 0
+        self._candidate = None
+        self._reference = np.zeros(self.max_delay + (self.partitions + 1) * block_size)
+        self._near_history = np.zeros(0)
+        self._far_history = np.zeros(0)
+        self._since_estimate = 0
+        self._near_energy = 0.0
+        self._error_energy = 0.0
+        self._reset_filter()
+
+    def _reset_filter(self):
+        bins = self.block_size + 1
+        self._weights = np.zeros((self.partitions, bins), dtype=np.complex128)
+        self._spectra = np.zeros((self.partitions, bins), dtype=np.complex128)
+        self._power = np.full(bins, self.floor)
+
+    def process(self, mic, reference):
+        # mic, reference: int16 columns of one send; the mic column is overwritten in place
+        near = mic.astype(np.float64)
+        far = reference.astype(np.float64)
+        self._track_delay(near, far)
+        self._track_path_gain(near, far)
+        size = self.block_size
+        out = np.empty_like(near)
+        for start in range(0, len(near) - size + 1, size):
+            self._reference[:-size] = self._reference[size:]
+            self._reference[-size:] = far[start:start + size]
+            out[start:start + size] = self._filter(near[start:start + size])
+        np.rint(out, out=out)
+        np.clip(out, -32768, 32767, out=out)
+        mic[:] = out
+
+    def _filter(self, near):
+        size = self.block_size
+        end = len(self._reference) - self._lead
+        window = self._reference[end - 2 * size:end]
+        spectrum = np.fft.rfft(window)
+        self._spectra[1:] = self._spectra[:-1]
+        self._spectra[0] = spectrum
+        echo = np.fft.irfft((self._weights * self._spectra).sum(axis=0))[size:]
+        error = near - echo
+        near_energy = near @ near
+        error_energy = error @ error
+        # A filter that adds more than it removes has gone wrong; never pass that on, and
+        # start over when it keeps happening
+        output = error
+        if error_energy > near_energy:
+            output = near
+        if error_energy > near_energy + self.floor:
+            # Above the noise floor, so not just unexcited bins stirring up hiss between sounds
+            self._diverging += 1
+            if self._diverging >= self.divergence_blocks:
+                self.resets += 1
+                self._diverging = 0
+                self._reset_filter()
+                return output
+        else:
+            self._diverging = 0
+
+        far_energy = window[size:] @ window[size:]
+        if far_energy < self.floor or self.path_gain is None:
+            return output  # Nothing playing, or no idea yet how loud its echo is
+        span = self._reference[end - (self.partitions + 1) * size:end]
+        if near_energy > self.double_talk ** 2 * self.path_gain ** 2 * (span @ span) / (self.partitions + 1):
+            # Far more in the mic than the echo path could deliver from the reference, so
+            # someone is talking; adapting now would teach the filter to cancel them
+            self.blocks_held += 1
+            return output
+        # Decayed sums, so the figure tracks the last couple of seconds rather than the whole session
+        self._near_energy = 0.99 * self._near_energy + near_energy
+        self._error_energy = 0.99 * self._error_energy + output @ output
+        self._power *= 0.9
+        self._power += 0.1 * (spectrum.real ** 2 + spectrum.imag ** 2)
+        # Bins the reference barely excites (tones, music) would otherwise get a huge step
+        # from noise alone; the total power keeps their normalisation sane
+        norm = self.partitions * (self._power + self.regularization * self._power.mean())
+        error_spectrum = np.fft.rfft(np.concatenate((np.zeros(size), error)))
+        gradient = np.fft.irfft(self._spectra.conj() * (error_spectrum / norm), axis=1)
+        gradient[:, size:] = 0  # Keep each partition a linear (not circular) convolution
+        # Quieter double-talk slips past the detector; it shows up as error the echo estimate
+        # cannot explain, so the step shrinks with the echo's share of the error
+        share = min(1.0, max(0.2, (echo @ echo) / (error_energy + 1e-9)))
+        self._weights += self.step * share * np.fft.rfft(gradient, axis=1)
+        return output
+
+    def _track_path_gain(self, near, far):
+        # Mic over reference energy per second of playback. Someone talking only raises it,
+        # so the lowest of the last few seconds is the echo path on its own
+        window = self._window_energy
+        window[0] += near @ near
+        window[1] += far @ far
+        window[2] += len(near)
+        if window[2] < self.sample_rate:
+            return
+        if window[1] >= self.floor * window[2] / self.block_size:
+            self._gain_windows.append(window[0] / window[1])
+            self.path_gain = math.sqrt(min(self._gain_windows))
+        self._window_energy = [0.0, 0.0, 0]
+
+    def _track_delay(self, near, far):
+        keep = self.estimate_frames + self.max_delay
+        self._near_history = np.concatenate((self._near_history, near))[-keep:]
+        self._far_history = np.concatenate((self._far_history, far))[-keep:]
+        self._since_estimate += len(near)
+        if self._since_estimate < self.estimate_frames or len(self._far_history) < keep:
+            return
+        self._since_estimate = 0
+        if self._far_history @ self._far_history < self.floor * keep / self.block_size:
+            return
+        n = 1 << (2 * keep - 1).bit_length()
+        cross = np.fft.rfft(self._near_history, n) * np.fft.rfft(self._far_history, n).conj()
+        cross /= np.abs(cross) + 1e-12  # PHAT weighting: a sharp peak whatever the spectrum of the audio
+        correlation = np.fft.irfft(cross, n)[:self.max_delay + 1]
+        peak = int(np.argmax(correlation))
+        if correlation[peak] < self.min_confidence * np.abs(correlation).mean():
+            return  # No clear echo, e.g. headphones
+        if abs(peak - self.delay) <= self.block_size // 2:
+            self._candidate = None
+        elif not self.delay_changes or (self._candidate is not None and abs(peak - self._candidate) <= self.block_size // 4):
+            # The first clear estimate, or a change seen twice in a row: move the filter so
+            # the echo starts a block into its span
+            self.delay = peak
+            self._lead = max(0, peak - self.block_size)
+            self.delay_changes += 1
+            self._candidate = None
+            self._reset_filter()
+        else:
+            self._candidate = peak
+
+    @property
+    def echo_return_loss_enhancement(self):
+        # dB removed from the mic over the recent blocks the filter learned from
+        if not self._error_energy:
+            return 0.0
+        return 10 * math.log10(self._near_energy / self._error_energy)
 
 class AudioCapture:
-    def __init__(self, sample_rate=16000, chunk_size=1024):
+    def __init__(self, sample_rate=16000, chunk_size=1024, buffer_seconds=10, max_chunks_per_send=8, max_drift_ms=200, vad=None, metrics=None, device_rate=None, echo_canceller=None):
         self.sample_rate = sample_rate
+        # None opens each device at its native rate so the OS does not resample for us; a number forces one
+        self.device_rate = device_rate
+        self.source_rates = {}  # source name -> rate its device was opened at
         self.chunk_size = chunk_size
+        if vad is not None and vad.frame_size != chunk_size:
+            raise ValueError(f"VAD frame size {vad.frame_size} must match chunk size {chunk_size}")
+        self.vad = vad
+        if echo_canceller is not None and chunk_size % echo_canceller.block_size:
+            raise ValueError(f"Echo canceller block size {echo_canceller.block_size} must divide chunk size {chunk_size}")
+        self.echo_canceller = echo_canceller
+        self.buffer_frames = sample_rate * buffer_seconds
+        self.max_chunks_per_send = max_chunks_per_send
+        self.max_drift_frames = sample_rate * max_drift_ms // 1000
+        self.sources = []
+        self.archive = None
+        self.channels = 1
+        self.channel_labels = []
+        self.rings = {}
+        self.chunks_sent = 0
+        self.backlog_peak = 0
+        self.drift_corrections = 0
+        self._first_frame_time = {}
+        self._threads = []
+        self._stop_event = threading.Event()
+        self._capture_error = None
+        self._loop = None
+        self._data_ready = None
+        self.metrics = metrics or REGISTRY.scope()
+        self._chunk_wait = self.metrics.histogram("audio_chunk_wait_seconds", "Age of the oldest frame in each send, i.e. time spent in the ring buffer")
+        self._send_seconds = self.metrics.histogram("audio_send_seconds", "Time spent awaiting each websocket send")
+        self._chunks_counter = self.metrics.counter("audio_chunks_sent_total", "Audio messages sent upstream")
+        self._last_chunk = self.metrics.gauge("audio_last_chunk_timestamp_seconds", "Unix time of the last audio message sent")
 
     def set_capture_mode(self, mode):
         mode = mode.lower()
-        if mode == "microphone":
-            self.capture_function = lambda: sc.get_microphone(id=sc.default_microphone().name).recorder(samplerate=self.sample_rate)
-        elif mode == "computer audio":
-            self.capture_function = lambda: sc.get_microphone(id=sc.default_speaker().name, include_loopback=True).recorder(samplerate=self.sample_rate)
-        elif mode == "both":
-            self.capture_function = self.capture_both
-        else:
+        if mode not in CAPTURE_SOURCES:
             raise ValueError(f"Invalid capture mode: {mode}")
+        openers = {"mic": self.open_microphone, "speaker": self.open_loopback}
+        self.sources = [(name, openers[name]) for name in CAPTURE_SOURCES[mode]]
+        self.mode = mode
+        self.channels = len(self.sources)
+        # Labels are only needed to tell channels apart in a multichannel stream
+        self.channel_labels = ["Mic", "Speaker"] if self.channels > 1 else []
+
+    def open_microphone(self):
+        return self._open_device("mic")
+
+    def open_loopback(self):
+        return self._open_device("speaker")
+
+    def _open_device(self, name):
+        device = find_device(name)
+        rate = self.device_rate or native_rate(device)
+        self.source_rates[name] = rate
+        return device.recorder(samplerate=rate)
+
+    def start(self, loop=None):
+        self._loop = loop or asyncio.get_running_loop()
+        self._data_ready = asyncio.Event()
+        self._stop_event.clear()
+        self._capture_error = None
+        self.rings = {name: RingBuffer(self.buffer_frames) for name, _ in self.sources}
+        self._first_frame_time = {}
+        self._threads = []
+        for name, ring in self.rings.items():
+            # Sampled only when metrics are read, so queue depths cost nothing on the hot path
+            self.metrics.gauge("audio_ring_backlog_frames", "Captured frames waiting to be sent", fn=ring.available, source=name)
+            self.metrics.counter("audio_ring_overruns_total", "Writes that overwrote unsent audio", fn=lambda ring=ring: ring.overruns, source=name)
+            self.metrics.counter("audio_frames_dropped_total", "Frames lost to ring buffer overruns", fn=lambda ring=ring: ring.frames_dropped, source=name)
+        self.metrics.counter("audio_drift_corrections_total", "Times a channel was trimmed to undo clock drift", fn=lambda: self.drift_corrections)
+        if self._echo_columns() is not None:
+            echo = self.echo_canceller
+            self.metrics.gauge("audio_echo_delay_seconds", "Delay from loopback to its echo in the mic", fn=lambda: echo.delay / echo.sample_rate)
+            self.metrics.gauge("audio_echo_return_loss_enhancement_db", "Echo removed from the mic channel", fn=lambda: echo.echo_return_loss_enhancement)
+            self.metrics.counter("audio_echo_filter_resets_total", "Times the echo filter diverged and was started over", fn=lambda: echo.resets)
+        for name, open_recorder in self.sources:
+            thread = threading.Thread(target=self._capture_loop, args=(name, open_recorder), name=f"capture-{name}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    @property
+    def echo_channel(self):
+        # The mic's channel when it records next to the loopback, i.e. where speaker echo can show up
+        names = [name for name, _ in self.sources]
+        return names.index("mic") if "mic" in names and "speaker" in names else None
+
+    def _echo_columns(self):
+        # (mic, loopback) channel indexes when both are captured and cancellation is on
+        names = [name for name, _ in self.sources]
+        if self.echo_canceller is None or "mic" not in names or "speaker" not in names:
+            return None
+        return names.index("mic"), names.index("speaker")
+
+    async def stop(self, timeout=1.0):
+        self._stop_event.set()
+        # A recorder can sit in record() for a whole block; wait for it off the event loop
+        await asyncio.gather(*(asyncio.to_thread(thread.join, timeout) for thread in self._threads))
+        self._threads = []
 
-    def capture_both(self):
-        mic = sc.get_microphone(id=sc.default_microphone().name).recorder(samplerate=self.sample_rate)
-        speaker = sc.get_microphone(id=sc.default_speaker().name, include_loopback=True).recorder(samplerate=self.sample_rate)
-        return mic, speaker
+    def _capture_loop(self, name, open_recorder):
+        ring = self.rings[name]
+        last_capture = self.metrics.gauge("audio_last_capture_timestamp_seconds", "Unix time the last block arrived from the device", source=name)
+        try:
+            with open_recorder() as recorder:
+                rate = self.source_rates.get(name, self.device_rate or DEFAULT_DEVICE_RATE)
+                resampler = Resampler(rate, self.sample_rate)
+                numframes = resampler.input_frames(self.chunk_size)
+                while not self._stop_event.is_set():
+                    data = recorder.record(numframes=numframes)
+                    # A warm recorder says what rate each block is at, as it follows the default device
+                    rate = getattr(recorder, "samplerate", rate)
+                    if rate != resampler.in_rate:
+                        resampler = Resampler(rate, self.sample_rate)
+                    if name not in self._first_frame_time:
+                        # A pre-warmed recorder may hand over a longer first block (its pre-roll)
+                        self._first_frame_time[name] = time.monotonic() - len(data) / rate
+                    mono = resampler.process(data)
+                    np.multiply(mono, 32767, out=mono)
+                    np.clip(mono, -32768, 32767, out=mono)
+                    ring.write(mono)
+                    last_capture.set(time.time())
+                    self._notify()
+        except Exception as e:
+            print(f"Error in capture thread {name}: {e}")
+            self._capture_error = e
+            self._notify()
+
+    def _notify(self):
+        try:
+            self._loop.call_soon_threadsafe(self._data_ready.set)
+        except RuntimeError:
+            pass  # Event loop already closed
 
-    async def capture_and_send_audio(self, websocket):
-        buffer_mic = b""
-        buffer_speaker = b""
+    async def capture_and_send_audio(self, websocket, client):
+        self.start()
+        if self.archive is not None:
+            self.archive.start(self.sample_rate, self.channels, self.channel_labels)
+        max_frames = self.chunk_size * self.max_chunks_per_send
+        # Reused for every send; each ring reads straight into its own column
+        interleaved = np.empty((max_frames, self.channels), dtype=np.int16)
+        rings = [self.rings[name] for name, _ in self.sources]
+        aligned = self.channels == 1
+        echo_columns = self._echo_columns()
+        frame_bytes = 2 * self.channels
         try:
-            if self.capture_function == self.capture_both:
-                mic, speaker = self.capture_function()
-                with mic, speaker:
-                    while True:
-                        mic_data = mic.record(numframes=self.chunk_size)
-                        speaker_data = speaker.record(numframes=self.chunk_size)
-                        
-                        # Process microphone data
-                        mic_data = mic_data.mean(axis=1)  # Convert stereo to mono
-                        mic_data = (mic_data * 32767).astype(np.int16).tobytes()
-                        buffer_mic += mic_data
-                        
-                        # Process speaker data
-                        speaker_data = speaker_data.mean(axis=1)  # Convert stereo to mono
-                        speaker_data = (speaker_data * 32767).astype(np.int16).tobytes()
-                        buffer_speaker += speaker_data
-                        
-                        if len(buffer_mic) >= self.chunk_size * 2:
-                            await websocket.send(b"mic:" + buffer_mic)
-                            buffer_mic = b""
-                        
-                        if len(buffer_speaker) >= self.chunk_size * 2:
-                            await websocket.send(b"speaker:" + buffer_speaker)
-                            buffer_speaker = b""
-                        
-                        await asyncio.sleep(0.01)
-            else:
-                buffer = b""
-                with self.capture_function() as mic:
-                    while True:
-                        data = mic.record(numframes=self.chunk_size)
-                        data = data.mean(axis=1)  # Convert stereo to mono
-                        data = (data * 32767).astype(np.int16).tobytes()
-                        
-                        buffer += data
-                        if len(buffer) >= self.chunk_size * 2:
-                            await websocket.send(buffer)
-                            buffer = b""
-                        
-                        await asyncio.sleep(0.01)
+            while True:
+                await self._data_ready.wait()
+                self._data_ready.clear()
+                if self._capture_error is not None:
+                    raise self._capture_error
+
+                if not aligned:
+                    aligned = self._align_start()
+                    if not aligned:
+                        continue
+                elif self.channels > 1:
+                    self._correct_drift(rings)
+
+                backlog = min(ring.available() for ring in rings)
+                self.backlog_peak = max(self.backlog_peak, backlog)
+                # A slow send lets audio pile up in the ring; drain it in larger
+                # messages so we catch up instead of falling further behind.
+                while backlog >= self.chunk_size:
+                    n = min(backlog, max_frames) // self.chunk_size * self.chunk_size
+                    self._chunk_wait.observe(backlog / self.sample_rate)
+                    for channel, ring in enumerate(rings):
+                        ring.read(n, out=interleaved[:, channel:channel + 1])
+                    block = interleaved[:n]
+                    if echo_columns is not None:
+                        # Before the archive and the VAD, so neither hears the speaker twice
+                        mic, speaker = echo_columns
+                        self.echo_canceller.process(block[:, mic], block[:, speaker])
+                    if self.archive is not None:
+                        # Everything captured, silence included, so archive offsets match transcript times
+                        self.archive.write(block)
+
+                    if self.vad is None:
+                        segments, suppressed = [(0, block)], 0
+                    else:
+                        segments, suppressed = self.vad.process(block)
+
+                    for gap, segment in segments:
+                        if gap:
+                            # Recorded at the point in the stream it was cut from, i.e. after what was sent before it
+                            client.record_suppressed(gap * frame_bytes)
+                        started = time.monotonic()
+                        await client.send_audio(websocket, segment.tobytes())
+                        self._send_seconds.observe(time.monotonic() - started)
+                        self.chunks_sent += 1
+                        self._chunks_counter.inc()
+                        self._last_chunk.set(time.time())
+                    if suppressed:
+                        # Deepgram closes idle streams; the session sends KeepAlive while the VAD holds audio back
+                        client.record_suppressed(suppressed * frame_bytes)
+                    backlog = min(ring.available() for ring in rings)
         except Exception as e:
             print(f"Error in capture_and_send_audio: {e}")
-            raise
\ No newline at end of file
+            raise
+        finally:
+            await self.stop()
+
+    def _align_start(self):
+        if len(self._first_frame_time) < self.channels:
+            return False
+        # Recorders open at slightly different times; drop the head of whichever
+        # stream started first so sample N of every channel covers the same instant.
+        latest = max(self._first_frame_time.values())
+        for name, started in self._first_frame_time.items():
+            self.rings[name].discard(int((latest - started) * self.sample_rate))
+        return True
+
+    def _correct_drift(self, rings):
+        # Device clocks drift apart over long sessions; trim the stream that runs ahead
+        available = [ring.available() for ring in rings]
+        lag = min(available)
+        for ring, frames in zip(rings, available):
+            if frames - lag > self.max_drift_frames:
+                ring.discard(frames - lag)
+                self.drift_corrections += 1
+
+    @property
+    def capture_started_at(self):
+        # Monotonic time of stream offset zero: the latest-starting channel once they are aligned
+        return max(self._first_frame_time.values()) if len(self._first_frame_time) == len(self.sources) else None
+
+    def stats(self):
+        return {
+            "chunks_sent": self.chunks_sent,
+            "backlog_peak_frames": self.backlog_peak,
+            "overruns": sum(ring.overruns for ring in self.rings.values()),
+            "frames_dropped": sum(ring.frames_dropped for ring in self.rings.values()),
+            "drift_corrections": self.drift_corrections,
+            "vad_speech_frames": self.vad.speech_frames if self.vad else 0,
+            "vad_silent_frames": self.vad.silent_frames if self.vad else 0,
+            "echo_delay_ms": round(1000 * self.echo_canceller.delay / self.echo_canceller.sample_rate) if self.echo_canceller else 0,
+            "echo_return_loss_enhancement_db": round(self.echo_canceller.echo_return_loss_enhancement, 1) if self.echo_canceller else 0.0,
+        }
@@ -0,0 +1,264 @@
+import argparse
+import logging
+import os
+import struct
+import sys
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+from modules.transcription_processor import TranscriptionProcessor
+
+DEEPGRAM_PRERECORDED_URL = "https://api.deepgram.com/v1/listen"
+
+def wav_header(frames, sample_rate, channels, sample_width):
+    data_bytes = frames * channels * sample_width
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + data_bytes, b"WAVE",
+        b"fmt ", 16, 1, channels, sample_rate,
+        sample_rate * channels * sample_width, channels * sample_width, sample_width * 8,
+        b"data", data_bytes,
+    )
+
+def batch_message(words, channel_index, channels, speech_final=False):
+    # A final result shaped like a streaming one, so batch and live share the TranscriptionProcessor
+    return {
+        "channel": {"alternatives": [{"transcript": "", "words": words}]},
+        "channel_index": [channel_index, channels],
+        "is_final": True,
+        "speech_final": speech_final,
+    }
+
+class WavChunker:
+    def __init__(self, path, chunk_seconds=300, search_seconds=30, overlap_seconds=2, window_ms=100):
+        self.path = path
+        self.chunk_seconds = chunk_seconds
+        self.search_seconds = search_seconds
+        self.overlap_seconds = overlap_seconds
+        self.window_ms = window_ms
+        with wave.open(path, "rb") as wav:
+            self.sample_rate = wav.getframerate()
+            self.channels = wav.getnchannels()
+            self.sample_width = wav.getsampwidth()
+            self.frames = wav.getnframes()
+        if self.sample_width != 2:
+            raise ValueError(f"{path}: only 16-bit PCM WAV files are supported")
+        self.window_frames = self.sample_rate * window_ms // 1000
+
+    def window_energy(self, windows_per_read=600):
+        # One sequential pass, one small read at a time; only a float per window is kept
+        energies = []
+        with wave.open(self.path, "rb") as wav:
+            while True:
+                raw = wav.readframes(self.window_frames * windows_per_read)
+                if not raw:
+                    break
+                samples = np.frombuffer(raw, dtype=np.int16)
+                usable = len(samples) // (self.window_frames * self.channels) * self.window_frames * self.channels
+                windows = samples[:usable].reshape(-1, self.window_frames * self.channels).astype(np.float32)
+                energies.append(np.einsum("ij,ij->i", windows, windows) / windows.shape[1])
+        return np.concatenate(energies) if energies else np.zeros(0, dtype=np.float32)
+
+    def chunks(self):
+        energy = self.window_energy()
+        windows_per_second = 1000 / self.window_ms
+        target = int(self.chunk_seconds * windows_per_second)
+        # Keep the search window inside the chunk so every cut moves forward
+        search = max(1, min(int(self.search_seconds * windows_per_second), target // 2))
+
+        cuts = [0]
+        while len(energy) - cuts[-1] > target + search:
+            # Cut at the quietest window near the target length so no word is split
+            low = cuts[-1] + target - search
+            cuts.append(low + int(np.argmin(energy[low:low + 2 * search])))
+        boundaries = [cut * self.window_frames for cut in cuts] + [self.frames]
+
+        overlap = int(self.overlap_seconds * self.sample_rate)
+        return [
+            {
+                "index": index,
+                "start": start,
+                "end": end,
+                "upload_start": max(0, start - overlap),
+                "upload_end": min(self.frames, end + overlap),
+            }
+            for index, (start, end) in enumerate(zip(boundaries, boundaries[1:]))
+        ]
+
+    def body(self, chunk, block_frames=65536):
+        with wave.open(self.path, "rb") as wav:
+            frames = chunk["upload_end"] - chunk["upload_start"]
+            yield wav_header(frames, self.sample_rate, self.channels, self.sample_width)
+            wav.setpos(chunk["upload_start"])
+            while frames > 0:
+                raw = wav.readframes(min(block_frames, frames))
+                if not raw:
+                    break
+                frames -= len(raw) // (self.channels * self.sample_width)
+                yield raw
+
+class BatchTranscriber:
+    def __init__(self, api_key, parallelism=4, base_url=DEEPGRAM_PRERECORDED_URL, chunk_seconds=300, overlap_seconds=2, retries=3, timeout=600,
+                 multichannel=False):
+        self.api_key = api_key
+        # Off: Deepgram mixes the channels into one transcript. On: every channel is transcribed, and billed, on its own
+        self.multichannel = multichannel
+        self.parallelism = parallelism
+        self.base_url = base_url
+        self.chunk_seconds = chunk_seconds
+        self.overlap_seconds = overlap_seconds
+        self.retries = retries
+        self.timeout = timeout
+        self.http = requests.Session()
+        # One keep-alive connection per worker instead of a fresh TLS handshake per chunk
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=parallelism)
+        self.http.mount("https://", adapter)
+        self.http.mount("http://", adapter)
+        self.http.headers.update({"Authorization": f"Token {api_key}", "Content-Type": "audio/wav"})
+        self.failures = {}
+
+    def upload(self, chunker, chunk):
+        params = {"model": "nova-2", "punctuate": "true"}
+        if self.channels(chunker) > 1:
+            params["multichannel"] = "true"
+        for attempt in range(1, self.retries + 1):
+            try:
+                response = self.http.post(self.base_url, params=params, data=chunker.body(chunk), timeout=self.timeout)
+                if response.status_code == 429 or response.status_code >= 500:
+                    raise requests.HTTPError(f"status {response.status_code}", response=response)
+                response.raise_for_status()
+                return response.json()
+            except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as e:
+                retryable = e.response is None or e.response.status_code == 429 or e.response.status_code >= 500
+                if attempt == self.retries or not retryable:
+                    raise
+                logging.warning(f"{chunker.path} chunk {chunk['index']} failed ({e}), retrying")
+                time.sleep(2 ** attempt)
+
+    def channels(self, chunker):
+        # Channels in Deepgram's results for this file
+        return chunker.channels if self.multichannel else 1
+
+    def stitch(self, chunker, chunks, results):
+        channels = self.channels(chunker)
+        labels = [f"Ch{channel + 1}" for channel in range(channels)] if channels > 1 else []
+        processor = TranscriptionProcessor(labels)
+        sentences = []
+        for chunk in chunks:
+            offset = chunk["upload_start"] / chunker.sample_rate
+            own_start = chunk["start"] / chunker.sample_rate
+            own_end = chunk["end"] / chunker.sample_rate
+            timeline = []
+            for channel_index, channel in enumerate(results[chunk["index"]]["results"]["channels"]):
+                for word in channel["alternatives"][0].get("words", []):
+                    word["start"] += offset
+                    word["end"] += offset
+                    # Overlap is only context; each word belongs to the chunk its midpoint falls in
+                    if own_start <= (word["start"] + word["end"]) / 2 < own_end:
+                        timeline.append((word["start"], channel_index, word))
+            # Replay the channels word by word in time order, as the live stream would deliver
+            # them, so the processor's time-window checks (repeats, cross-channel echo) see
+            # each channel's neighbours rather than five minutes of one channel at a time
+            timeline.sort(key=lambda item: item[0])
+            for _, channel_index, word in timeline:
+                sentences.extend(processor.process(batch_message([word], channel_index, channels)))
+            for channel_index in range(channels):
+                # Chunks end on silence: commit whatever each channel still has pending
+                sentences.extend(processor.process(batch_message([], channel_index, channels, speech_final=True)))
+        sentences.sort(key=lambda sentence: sentence["start"])
+        return [processor.format_sentence(sentence) for sentence in sentences]
+
+    def transcribe(self, paths, out_dir):
+        # One unreadable file or failed chunk skips that file only; see self.failures
+        os.makedirs(out_dir, exist_ok=True)
+        self.failures = {}
+        plans = {}
+        with ThreadPoolExecutor(max_workers=self.parallelism) as executor:
+            for path in paths:
+                try:
+                    chunker = WavChunker(path, chunk_seconds=self.chunk_seconds, overlap_seconds=self.overlap_seconds)
+                    plans[path] = (chunker, chunker.chunks(), {})
+                except (OSError, EOFError, ValueError, wave.Error) as e:
+                    self._fail(path, e)
+            # Chunks from every file share one queue so the pool stays full until the last upload
+            futures = {
+                executor.submit(self.upload, chunker, chunk): (path, chunk["index"])
+                for path, (chunker, chunks, _) in plans.items()
+                for chunk in chunks
+            }
+            written = []
+            for future in as_completed(futures):
+                path, index = futures[future]
+                if path in self.failures:
+                    continue
+                chunker, chunks, results = plans[path]
+                try:
+                    results[index] = future.result()
+                    logging.info(f"{os.path.basename(path)}: chunk {index + 1}/{len(chunks)} done")
+                    if len(results) == len(chunks):
+                        written.append(self.write(path, self.stitch(chunker, chunks, results), out_dir))
+                except Exception as e:
+                    self._fail(path, e)
+                    # Nobody will use the rest of this file's chunks; do not upload them
+                    for other, (other_path, _) in futures.items():
+                        if other_path == path:
+                            other.cancel()
+        if self.failures:
+            logging.error(f"{len(self.failures)} of {len(paths)} files failed: {', '.join(map(os.path.basename, self.failures))}")
+        return written
+
+    def _fail(self, path, error):
+        logging.error(f"Skipping {path}: {error}")
+        self.failures[path] = error
+
+    def write(self, path, lines, out_dir):
+        base_name = os.path.splitext(os.path.basename(path))[0]
+        output_file = os.path.join(out_dir, f"{base_name}.txt")
+        counter = 1
+        while os.path.exists(output_file):
+            output_file = os.path.join(out_dir, f"{base_name}_{counter}.txt")
+            counter += 1
+        with open(output_file, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        logging.info(f"Saved {output_file}")
+        return output_file
+
+def collect_wav_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, name) for name in sorted(os.listdir(path)) if name.lower().endswith(".wav"))
+        else:
+            files.append(path)
+    return files
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Transcribe recorded WAV files in parallel chunks")
+    parser.add_argument("paths", nargs="+", help="WAV files or directories of WAV files")
+    parser.add_argument("--out", default="output", help="Output directory for transcripts")
+    parser.add_argument("--parallel", type=int, default=4, help="Chunks uploaded at the same time")
+    parser.add_argument("--chunk-seconds", type=float, default=300, help="Target chunk length; cuts land on nearby silence")
+    parser.add_argument("--overlap-seconds", type=float, default=2)
+    parser.add_argument("--base-url", default=DEEPGRAM_PRERECORDED_URL, help="Transcription endpoint, e.g. a local stub server")
+    parser.add_argument("--multichannel", action="store_true",
+                        help="Transcribe each channel of a multi-channel file separately (billed per channel); default mixes them")
+    args = parser.parse_args(argv)
+
+    api_key = os.getenv('DEEPGRAM_API_KEY')
+    if not api_key:
+        print("DEEPGRAM_API_KEY is not set.", file=sys.stderr)
+        return 1
+    transcriber = BatchTranscriber(api_key, parallelism=args.parallel, base_url=args.base_url,
+                                   chunk_seconds=args.chunk_seconds, overlap_seconds=args.overlap_seconds,
+                                   multichannel=args.multichannel)
+    transcriber.transcribe(collect_wav_files(args.paths), args.out)
+    return 1 if transcriber.failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import sys
+from datetime import datetime
+from dotenv import load_dotenv
+from modules.audio_archive import ARCHIVE_FORMATS, AudioArchive
+from modules.encoding import ENCODINGS
+from modules.metrics import REGISTRY, dump_metrics, serve_metrics, write_metrics
+from modules.pipeline import TranscriptionPipeline, run_pipelines
+from modules.postprocess import PostProcessor
+from modules.rolling_summary import RollingSummarizer
+from modules.search_index import SearchIndex
+from modules.transcript_writer import FSYNC_POLICIES, TranscriptWriter, recover_orphans
+
+MODES = ["microphone", "computer audio", "both"]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Headless real-time transcription")
+    parser.add_argument("--mode", action="append", choices=MODES,
+                        help="Capture mode; repeat to run several pipelines at once (default: computer audio)")
+    parser.add_argument("--out", default="output", help="Output directory for transcripts")
+    parser.add_argument("--title", default="Untitled", help="Transcript title used for file names")
+    parser.add_argument("--duration", type=float, help="Stop after this many seconds (default: run until Ctrl+C)")
+    parser.add_argument("--no-vad", action="store_true", help="Stream silence instead of gating it")
+    parser.add_argument("--no-aec", action="store_true", help='Leave speaker echo in the mic channel in "both" mode')
+    parser.add_argument("--quiet", action="store_true", help="Do not echo transcript lines to stdout")
+    parser.add_argument("--flush-interval", type=float, default=1.0, help="Seconds between transcript file flushes")
+    parser.add_argument("--fsync", choices=FSYNC_POLICIES, default="interval", help="When flushed data is forced to disk")
+    parser.add_argument("--summary-every", type=int, metavar="N",
+                        help="Keep a rolling summary updated every N sentences (needs OPENAI_API_KEY)")
+    parser.add_argument("--encoding", choices=list(ENCODINGS), default="linear16",
+                        help="Upstream audio encoding; flac and opus cut bandwidth (need the soundfile package)")
+    parser.add_argument("--device-rate", type=int, help="Open devices at this rate instead of their native one before resampling to 16 kHz")
+    parser.add_argument("--archive", choices=ARCHIVE_FORMATS, help="Also keep the captured audio, indexed to the transcript lines")
+    parser.add_argument("--metrics-port", type=int, help="Serve Prometheus metrics on http://127.0.0.1:PORT/metrics")
+    parser.add_argument("--metrics-file", help="Also write metrics in Prometheus text format to this file")
+    parser.add_argument("--metrics-interval", type=float, default=15, help="Seconds between metrics file writes")
+    return parser.parse_args(argv)
+
+def print_sink(sentence, line):
+    print(line, flush=True)
+
+async def run(args, api_key, openai_api_key=None):
+    modes = args.mode or ["computer audio"]
+    os.makedirs(args.out, exist_ok=True)
+    recover_orphans(args.out)
+    search_index = SearchIndex(args.out)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+
+    postprocessor = PostProcessor(openai_api_key) if args.summary_every else None
+    pipelines, writers, summarizers, archives = [], [], [], []
+    for index, mode in enumerate(modes):
+        writer = TranscriptWriter(args.out, f"{timestamp}_{index}", flush_interval=args.flush_interval, fsync=args.fsync,
+                                  on_flush=search_index.update_file)
+        archive = AudioArchive(args.out, f"{timestamp}_{index}", args.archive) if args.archive else None
+        sinks = [writer] if args.quiet else [writer, print_sink]
+        summarizer = None
+        if postprocessor:
+            summarizer = RollingSummarizer(postprocessor, every=args.summary_every,
+                                           on_update=lambda summary, mode=mode: logging.info(f"[{mode}] Summary so far: {summary}"))
+            sinks.append(summarizer)
+        pipelines.append(TranscriptionPipeline(api_key, mode, sinks=sinks, use_vad=not args.no_vad, use_aec=not args.no_aec, name=f"{index}_{mode}",
+                                               encoding=args.encoding, device_rate=args.device_rate, archive=archive))
+        writers.append(writer)
+        archives.append(archive)
+        summarizers.append(summarizer)
+
+    loop = asyncio.get_running_loop()
+    stop_all = lambda: [pipeline.stop() for pipeline in pipelines]
+    try:
+        loop.add_signal_handler(signal.SIGINT, stop_all)
+    except NotImplementedError:
+        pass  # Windows: Ctrl+C raises KeyboardInterrupt instead
+    if args.duration:
+        loop.call_later(args.duration, stop_all)
+
+    metrics_server = await serve_metrics(REGISTRY, port=args.metrics_port) if args.metrics_port else None
+    metrics_task = asyncio.create_task(dump_metrics(REGISTRY, args.metrics_file, args.metrics_interval)) if args.metrics_file else None
+    try:
+        results = await run_pipelines(pipelines)
+    finally:
+        if metrics_task:
+            metrics_task.cancel()
+            write_metrics(REGISTRY, args.metrics_file)
+        if metrics_server:
+            metrics_server.close()
+        for mode, writer, summarizer, archive in zip(modes, writers, summarizers, archives):
+            title = f"{args.title} {mode}" if len(modes) > 1 else args.title
+            output_file = writer.finalize(title)
+            logging.info(f"Saved {output_file}" if output_file else f"No transcript for {mode}")
+            if output_file:
+                search_index.rename(writer.temp_path, output_file)
+            else:
+                search_index.remove(writer.temp_path)
+            if archive:
+                archive.finalize(os.path.splitext(output_file)[0] if output_file else None, title)
+            if output_file and summarizer:
+                summary = await summarizer.finalize()
+                if not summary:
+                    logging.warning(f"No summary for {mode}")
+                else:
+                    if summarizer.lines_behind:
+                        # Keep what there is, but do not let it pass for a summary of the whole session
+                        summary += f"\n\n(Incomplete: the last {summarizer.lines_behind} lines could not be summarized.)"
+                    summary_file = os.path.splitext(output_file)[0] + "_summary.txt"
+                    with open(summary_file, "w", encoding="utf-8") as f:
+                        f.write(summary)
+                    search_index.update_file(summary_file)
+    failed = [result for result in results if isinstance(result, BaseException)]
+    for error in failed:
+        logging.error(f"Pipeline failed: {error}")
+    return 1 if failed else 0
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    load_dotenv()
+    args = parse_args(argv)
+    api_key = os.getenv('DEEPGRAM_API_KEY')
+    if not api_key:
+        print("DEEPGRAM_API_KEY is not set.", file=sys.stderr)
+        return 1
+    openai_api_key = os.getenv('OPENAI_API_KEY')
+    if args.summary_every and not openai_api_key:
+        print("--summary-every needs OPENAI_API_KEY, which is not set.", file=sys.stderr)
+        return 1
+    return asyncio.run(run(args, api_key, openai_api_key))
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,330 @@
+import asyncio
+import bisect
+import json
+import logging
+import random
+import time
+from collections import deque
 import websockets
+from modules.encoding import ENCODINGS, StreamEncoder
+from modules.metrics import REGISTRY
+
+DEEPGRAM_LISTEN_URL = "wss://api.deepgram.com/v1/listen"
+KEEPALIVE_MESSAGE = json.dumps({"type": "KeepAlive"})
+CLOSE_STREAM_MESSAGE = json.dumps({"type": "CloseStream"})
+TIMESTAMP_TOLERANCE = 0.01
+
+def rejected_status(error):
+    # HTTP status of a refused handshake: InvalidStatusCode before websockets 14, InvalidStatus after
+    status = getattr(error, "status_code", None)
+    response = getattr(error, "response", None)
+    if status is None and response is not None:
+        status = getattr(response, "status_code", None)
+    return status
+
+def is_permanent_rejection(error):
+    # A bad key, missing permission or malformed URL will not fix itself; 429 is just "later"
+    status = rejected_status(error)
+    return status is not None and 400 <= status < 500 and status != 429
 
 class DeepgramClient:
-    def __init__(self, api_key, sample_rate=16000, channels=1):
+    def __init__(self, api_key, sample_rate=16000, channels=1, base_url=DEEPGRAM_LISTEN_URL, metrics=None, encoding="linear16"):
+        if encoding not in ENCODINGS:
+            raise ValueError(f"Unsupported upstream encoding: {encoding}")
         self.api_key = api_key
         self.sample_rate = sample_rate
         self.channels = channels
-        self.uri = f"wss://api.deepgram.com/v1/listen?encoding=linear16&sample_rate={sample_rate}&channels={channels}&model=nova-2&interim_results=true&punctuate=true"
+        self.encoding = encoding
+        if encoding == "linear16":
+            self.uri = f"{base_url}?encoding=linear16&sample_rate={sample_rate}&channels={channels}&model=nova-2&interim_results=true&punctuate=true"
+        else:
+            # FLAC and Ogg Opus describe themselves in their headers; Deepgram wants no format hints
+            self.uri = f"{base_url}?model=nova-2&interim_results=true&punctuate=true"
+        if channels > 1:
+            # Transcribe every channel independently instead of mixing them down
+            self.uri += "&multichannel=true"
+        self.bytes_per_second = sample_rate * channels * 2
+        self.bytes_sent = 0
+        self.bytes_suppressed = 0
+        self.keepalives_sent = 0
+        # Stream positions (seconds of audio actually sent) where silence was cut out,
+        # and the total silence removed up to each of them
+        self._gap_positions = []
+        self._gap_totals = []
+        self.metrics = metrics or REGISTRY.scope()
+        self._bytes_counter = self.metrics.counter("deepgram_bytes_sent_total", "Audio bytes sent upstream")
+        self._suppressed_counter = self.metrics.counter("deepgram_bytes_suppressed_total", "Audio bytes the VAD kept from being sent")
+        self._keepalive_counter = self.metrics.counter("deepgram_keepalives_sent_total", "KeepAlive messages sent during silence")
 
     def connect(self):
-        return websockets.connect(self.uri, extra_headers={"Authorization": f"Token {self.api_key}"})
\ No newline at end of file
+        return websockets.connect(self.uri, extra_headers={"Authorization": f"Token {self.api_key}"})
+
+    def encoder(self):
+        # A fresh container per connection: a reconnect replays into a new stream with its own header
+        if self.encoding == "linear16":
+            return None
+        return StreamEncoder(self.encoding, self.sample_rate, self.channels)
+
+    def session(self, **kwargs):
+        return DeepgramSession(self, **kwargs)
+
+    async def send_audio(self, websocket, data):
+        await websocket.send(data)
+        self.bytes_sent += len(data)
+        self._bytes_counter.inc(len(data))
+
+    async def send_keepalive(self, websocket):
+        await websocket.send(KEEPALIVE_MESSAGE)
+        self.keepalives_sent += 1
+        self._keepalive_counter.inc()
+
+    def record_suppressed(self, nbytes):
+        self.bytes_suppressed += nbytes
+        self._suppressed_counter.inc(nbytes)
+        position = self.bytes_sent / self.bytes_per_second
+        total = self.bytes_suppressed / self.bytes_per_second
+        if self._gap_positions and self._gap_positions[-1] == position:
+            self._gap_totals[-1] = total
+        else:
+            self._gap_positions.append(position)
+            self._gap_totals.append(total)
+
+    def capture_time(self, stream_seconds):
+        # Deepgram only hears the audio we send; map its clock back onto the capture clock
+        index = bisect.bisect_right(self._gap_positions, stream_seconds)
+        return stream_seconds + (self._gap_totals[index - 1] if index else 0.0)
+
+    def stats(self):
+        total = self.bytes_sent + self.bytes_suppressed
+        return {
+            "bytes_sent": self.bytes_sent,
+            "bytes_suppressed": self.bytes_suppressed,
+            "keepalives_sent": self.keepalives_sent,
+            "suppressed_ratio": self.bytes_suppressed / total if total else 0.0,
+        }
+
+class DeepgramSession:
+    def __init__(self, client, replay_seconds=15, keepalive_seconds=5, min_backoff=0.5, max_backoff=30, max_attempts=None):
+        self.client = client
+        self.keepalive_seconds = keepalive_seconds
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+        self.replay_limit = int(replay_seconds * client.bytes_per_second)
+        self.reconnects = 0
+        self.bytes_replayed = 0
+        self.bytes_on_wire = 0
+        self._replay = deque()  # (stream offset in bytes, audio bytes)
+        self._replay_bytes = 0
+        self._stream_bytes = 0
+        self._connection_offset = 0.0
+        self._committed_end = {}
+        self._websocket = None
+        self._encoder = None
+        self._reconnect_lock = asyncio.Lock()
+        self._keepalive_task = None
+        self._last_send = time.monotonic()
+        self._closed = False
+        self.error = None  # Why the session gave up reconnecting, raised from send() and iteration
+        metrics = client.metrics
+        self._reconnect_counter = metrics.counter("deepgram_reconnects_total", "Upstream connections re-established after a drop")
+        self._replayed_counter = metrics.counter("deepgram_bytes_replayed_total", "Audio bytes re-sent after reconnecting")
+        self._messages = {kind: metrics.counter("deepgram_messages_total", "Results received", kind=kind) for kind in ("interim", "final")}
+        self._result_lag = {
+            kind: metrics.histogram("deepgram_result_lag_seconds", "Audio sent but not yet covered by a result when it arrives, i.e. upstream processing lag", kind=kind)
+            for kind in ("interim", "final")
+        }
+        self._last_message = metrics.gauge("deepgram_last_message_timestamp_seconds", "Unix time of the last message from upstream")
+        self._wire_counter = metrics.counter("deepgram_wire_bytes_total", "Audio bytes on the wire after upstream encoding")
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def open(self):
+        self._websocket = await self.client.connect()
+        self._encoder = self.client.encoder()
+        self._keepalive_task = asyncio.create_task(self._keepalive_loop())
+        return self
+
+    @property
+    def is_open(self):
+        return not self._closed and self._websocket is not None and self._websocket.open
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self, drain_timeout=5):
+        if self._closed:
+            return
+        self._closed = True
+        if self._keepalive_task:
+            self._keepalive_task.cancel()
+        if self._websocket is not None:
+            try:
+                if self._encoder is not None:
+                    await self._send_encoded(self._websocket, self._encoder.close())
+                # Deepgram flushes the remaining final results and then closes the socket itself
+                await self._websocket.send(CLOSE_STREAM_MESSAGE)
+                await asyncio.wait_for(self._websocket.wait_closed(), drain_timeout)
+            except (websockets.ConnectionClosed, asyncio.TimeoutError):
+                pass
+            await self._websocket.close()
+
+    async def send(self, data):
+        if self.error is not None:
+            raise self.error
+        websocket = self._websocket
+        if isinstance(data, bytes):
+            self._remember(data)
+            if self._encoder is not None:
+                data = self._encoder.encode(data)
+                if not data:
+                    return  # The encoder is still filling a frame
+            self._count_wire(len(data))
+        try:
+            await websocket.send(data)
+            self._last_send = time.monotonic()
+        except websockets.ConnectionClosed:
+            if self._closed:
+                raise
+            # The replay after reconnecting already includes this chunk
+            await self._reconnect(websocket)
+
+    def _remember(self, data):
+        self._replay.append((self._stream_bytes, data))
+        self._replay_bytes += len(data)
+        self._stream_bytes += len(data)
+        while self._replay_bytes > self.replay_limit and len(self._replay) > 1:
+            _, dropped = self._replay.popleft()
+            self._replay_bytes -= len(dropped)
+
+    async def _reconnect(self, failed_websocket):
+        async with self._reconnect_lock:
+            if self.error is not None:
+                raise self.error  # The other task already gave up
+            if self._websocket is not failed_websocket:
+                return  # The other task already reconnected
+            attempt = 0
+            while not self._closed:
+                attempt += 1
+                # Full jitter keeps many clients from reconnecting in lockstep after an outage
+                delay = random.uniform(0, min(self.max_backoff, self.min_backoff * 2 ** attempt))
+                logging.warning(f"Deepgram connection lost, reconnecting in {delay:.1f}s (attempt {attempt})")
+                await asyncio.sleep(delay)
+                try:
+                    websocket = await self.client.connect()
+                    encoder = self.client.encoder()
+                    replay = list(self._replay)
+                    replayed_to = replay[0][0] if replay else self._stream_bytes
+                    # Timestamps on the new connection start at zero from the first replayed byte
+                    connection_offset = replayed_to / self.client.bytes_per_second
+                    while replay:
+                        for offset, data in replay:
+                            await self._send_encoded(websocket, encoder.encode(data) if encoder else data)
+                            self.bytes_replayed += len(data)
+                            self._replayed_counter.inc(len(data))
+                            replayed_to = offset + len(data)
+                        # Audio captured while we were replaying failed on the old socket; send it too
+                        replay = [(offset, data) for offset, data in self._replay if offset >= replayed_to]
+                except (OSError, asyncio.TimeoutError, websockets.WebSocketException) as e:
+                    if is_permanent_rejection(e):
+                        logging.error(f"Deepgram refused the connection ({e}), not retrying")
+                        self._fail(e)
+                        raise
+                    logging.error(f"Reconnect attempt {attempt} failed: {e}")
+                    if self.max_attempts and attempt >= self.max_attempts:
+                        self._fail(e)
+                        raise
+                    continue
+                self._connection_offset = connection_offset
+                self._websocket, self._encoder = websocket, encoder
+                self._last_send = time.monotonic()
+                self.reconnects += 1
+                self._reconnect_counter.inc()
+                return
+
+    def _fail(self, error):
+        self.error = error
+        if self._keepalive_task:
+            self._keepalive_task.cancel()
+
+    def _count_wire(self, nbytes):
+        self.bytes_on_wire += nbytes
+        self._wire_counter.inc(nbytes)
+
+    async def _send_encoded(self, websocket, data):
+        if data:
+            await websocket.send(data)
+            self._count_wire(len(data))
+
+    async def _keepalive_loop(self):
+        while not self._closed:
+            await asyncio.sleep(self.keepalive_seconds / 2)
+            if time.monotonic() - self._last_send >= self.keepalive_seconds:
+                await self.client.send_keepalive(self)
+
+    async def __aiter__(self):
+        while not self._closed:
+            if self.error is not None:
+                raise self.error
+            websocket = self._websocket
+            try:
+                async for message in websocket:
+                    self._last_message.set(time.time())
+                    data = self._correct(json.loads(message))
+                    if data is not None:
+                        yield data
+            except websockets.ConnectionClosed:
+                pass
+            if self._closed:
+                return
+            await self._reconnect(websocket)
+
+    def _correct(self, data):
+        if data.get("type", "Results") != "Results" or "channel" not in data:
+            return data
+        offset = self._connection_offset
+        alternative = data["channel"]["alternatives"][0]
+        words = alternative.get("words", [])
+        if offset:
+            data["start"] = data.get("start", 0.0) + offset
+            for word in words:
+                word["start"] += offset
+                word["end"] += offset
+
+        start = data.get("start", 0.0)
+        end = start + data.get("duration", 0.0)
+        channel = data.get("channel_index", [0])[0]
+        kind = "final" if data.get("is_final") else "interim"
+        self._messages[kind].inc()
+        self._result_lag[kind].observe(max(0.0, self._stream_bytes / self.client.bytes_per_second - end))
+        committed = self._committed_end.get(channel, 0.0)
+        if end <= committed + TIMESTAMP_TOLERANCE:
+            return None  # Replayed audio that was already finalized before the drop
+        if start < committed - TIMESTAMP_TOLERANCE and words:
+            words = [word for word in words if word["start"] >= committed - TIMESTAMP_TOLERANCE]
+            if not words:
+                return None
+            alternative["words"] = words
+            alternative["transcript"] = " ".join(word.get("punctuated_word", word["word"]) for word in words)
+            data["start"] = committed
+            data["duration"] = end - committed
+        if data.get("is_final"):
+            self._committed_end[channel] = end
+
+        if self.client.bytes_suppressed:
+            capture_time = self.client.capture_time
+            data["start"] = capture_time(data.get("start", 0.0))
+            data["duration"] = capture_time(end) - data["start"]
+            for word in words:
+                word["start"] = capture_time(word["start"])
+                word["end"] = capture_time(word["end"])
+        return data
+
+    def stats(self):
+        return {
+            "reconnects": self.reconnects,
+            "bytes_replayed": self.bytes_replayed,
+            "bytes_on_wire": self.bytes_on_wire,
+            "replay_buffer_bytes": self._replay_bytes,
+        }
@@ -0,0 +1,82 @@
+import logging
+
+try:
+    import soundfile
+except ImportError:
+    soundfile = None
+
+# Upstream encodings: name -> (libsndfile format, subtype); linear16 is sent as raw PCM
+ENCODINGS = {
+    "linear16": None,
+    "flac": ("FLAC", "PCM_16"),
+    "opus": ("OGG", "OPUS"),
+}
+SFC_SET_OGG_PAGE_LATENCY_MS = 0x1302
+
+class _EncodedStream:
+    # Write-only file object for libsndfile that hands out bytes as soon as they are written.
+    # On close the encoder seeks back to patch its header; those bytes are already on the
+    # wire, so the rewrite is dropped and the stream simply carries no total length.
+    def __init__(self):
+        self._pending = bytearray()
+        self._base = 0
+        self._position = 0
+        self._size = 0
+
+    def write(self, data):
+        data = bytes(data)
+        offset = self._position - self._base
+        if offset >= 0:
+            if offset > len(self._pending):
+                self._pending.extend(bytes(offset - len(self._pending)))
+            self._pending[offset:offset + len(data)] = data
+        self._position += len(data)
+        self._size = max(self._size, self._position)
+        return len(data)
+
+    def seek(self, offset, whence=0):
+        self._position = (offset, self._position + offset, self._size + offset)[whence]
+        return self._position
+
+    def tell(self):
+        return self._position
+
+    def read(self, size=-1):
+        return b""
+
+    def take(self):
+        data = bytes(self._pending)
+        self._base += len(data)
+        self._pending.clear()
+        return data
+
+class StreamEncoder:
+    def __init__(self, encoding, sample_rate, channels, page_latency_ms=100):
+        if soundfile is None:
+            raise RuntimeError(f"The {encoding} upstream encoding needs the soundfile package (pip install soundfile)")
+        audio_format, subtype = ENCODINGS[encoding]
+        self.encoding = encoding
+        self.channels = channels
+        self._stream = _EncodedStream()
+        self._file = soundfile.SoundFile(self._stream, mode="w", samplerate=sample_rate, channels=channels,
+                                         format=audio_format, subtype=subtype)
+        if audio_format == "OGG":
+            self._set_page_latency(page_latency_ms)
+
+    def _set_page_latency(self, milliseconds):
+        # libsndfile holds Ogg pages back for about a second by default, which would
+        # delay every transcript by as much; soundfile has no public wrapper for this
+        try:
+            value = soundfile._ffi.new("double*", float(milliseconds))
+            soundfile._snd.sf_command(self._file._file, SFC_SET_OGG_PAGE_LATENCY_MS, value, soundfile._ffi.sizeof("double"))
+        except AttributeError as e:
+            logging.warning(f"Could not lower Ogg page latency, transcripts may lag: {e}")
+
+    def encode(self, pcm):
+        # pcm: interleaved linear16 bytes; returns whatever encoded bytes are ready, possibly none
+        self._file.buffer_write(pcm, dtype="int16")
+        return self._stream.take()
+
+    def close(self):
+        self._file.close()
+        return self._stream.take()
@@ -0,0 +1,243 @@
+import argparse
+import asyncio
+import ipaddress
+import json
+import logging
+import os
+from collections import deque
+import websockets
+from dotenv import load_dotenv
+from modules.deepgram_client import DEEPGRAM_LISTEN_URL, DeepgramClient
+from modules.encoding import ENCODINGS
+from modules.metrics import REGISTRY, serve_metrics
+from modules.transcription_processor import TranscriptionProcessor
+
+# Protocol for recorders talking to the gateway:
+#   -> optional first text message: {"sample_rate": 16000, "channels": 1, "channel_labels": [...], "echo_channel": 0}
+#      (echo_channel: the mic channel of a mic + loopback recording, whose copies of loopback lines are dropped)
+#   -> binary linear16 PCM frames and finally {"type": "CloseStream"}; {"type": "KeepAlive"} is accepted and ignored
+#   <- {"type": "sentence", ...} for every committed sentence and {"type": "partial", "text": ...}
+
+class SessionPool:
+    def __init__(self, api_key, size=2, base_url=DEEPGRAM_LISTEN_URL, formats=((16000, 1),), encoding="linear16", metrics=None):
+        self.api_key = api_key
+        self.encoding = encoding
+        self.metrics = metrics
+        self.size = size
+        self.base_url = base_url
+        self.formats = list(formats)
+        self.hits = 0
+        self.misses = 0
+        self._warm = {}
+        self._filling = set()
+
+    async def start(self):
+        for audio_format in self.formats:
+            self._schedule_fill(audio_format)
+
+    def prepare(self, sample_rate, channels):
+        # Start keeping a connection ready for one more format; call on the event loop
+        audio_format = (sample_rate, channels)
+        if audio_format not in self.formats:
+            self.formats.append(audio_format)
+        self._schedule_fill(audio_format)
+
+    async def acquire(self, sample_rate, channels):
+        audio_format = (sample_rate, channels)
+        warm = self._warm.setdefault(audio_format, deque())
+        while warm:
+            session = warm.popleft()
+            if session.is_open:
+                self.hits += 1
+                self._schedule_fill(audio_format)
+                return session
+            await session.close()
+        # Nothing warm for this format: pay for the handshake now, and keep one ready next
+        # time only for formats we were configured with, so callers cannot grow the pool
+        self.misses += 1
+        if audio_format in self.formats:
+            self._schedule_fill(audio_format)
+        return await self._open(audio_format)
+
+    async def _open(self, audio_format):
+        sample_rate, channels = audio_format
+        # Gap tracking and byte counters are per stream, so every session gets its own client
+        client = DeepgramClient(self.api_key, sample_rate=sample_rate, channels=channels, base_url=self.base_url,
+                                metrics=self.metrics, encoding=self.encoding)
+        return await client.session().open()
+
+    def _schedule_fill(self, audio_format):
+        if audio_format not in self._filling:
+            self._filling.add(audio_format)
+            asyncio.create_task(self._fill(audio_format))
+
+    async def _fill(self, audio_format):
+        warm = self._warm.setdefault(audio_format, deque())
+        try:
+            for session in [session for session in warm if not session.is_open]:
+                # Dropped while idle; replace it rather than hand it out
+                warm.remove(session)
+                await session.close()
+            while len(warm) < self.size:
+                warm.append(await self._open(audio_format))
+        except Exception as e:
+            logging.error(f"Could not open warm upstream connection for {audio_format}: {e}")
+        finally:
+            self._filling.discard(audio_format)
+
+    async def close(self):
+        for warm in self._warm.values():
+            while warm:
+                await warm.popleft().close()
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "warm": sum(len(warm) for warm in self._warm.values()),
+        }
+
+class TranscriptionGateway:
+    def __init__(self, pool, max_sessions=8, token=None):
+        self.pool = pool
+        self.max_sessions = max_sessions
+        self.token = token
+        self.active_sessions = 0
+        self.rejected = 0
+        self._slots = asyncio.Semaphore(max_sessions)
+        metrics = REGISTRY.scope()
+        metrics.gauge("gateway_active_sessions", "Recorder streams being transcribed", fn=lambda: self.active_sessions)
+        metrics.counter("gateway_rejected_total", "Recorders refused because the node was full", fn=lambda: self.rejected)
+        metrics.counter("gateway_pool_hits_total", "Sessions served from a warm upstream connection", fn=lambda: self.pool.hits)
+        metrics.counter("gateway_pool_misses_total", "Sessions that had to open a fresh upstream connection", fn=lambda: self.pool.misses)
+
+    async def handle(self, websocket, path=None):
+        if self.token and websocket.request_headers.get("Authorization") != f"Token {self.token}":
+            await websocket.close(1008, "invalid token")
+            return
+        if self._slots.locked():
+            # Refuse instead of queueing: a waiting recorder would only buffer audio it cannot send
+            self.rejected += 1
+            await websocket.close(1013, "transcription node at capacity")
+            return
+
+        async with self._slots:
+            self.active_sessions += 1
+            try:
+                await self._stream(websocket)
+            except websockets.ConnectionClosed:
+                pass
+            except Exception as e:
+                logging.error(f"Gateway session failed: {e}")
+                await websocket.close(1011, "upstream error")
+            finally:
+                self.active_sessions -= 1
+
+    async def _stream(self, websocket):
+        first = await websocket.recv()
+        config, first_audio = {}, None
+        if isinstance(first, str):
+            config = json.loads(first)
+        else:
+            first_audio = first
+
+        audio_format = (config.get("sample_rate", 16000), config.get("channels", 1))
+        if audio_format not in self.pool.formats:
+            await websocket.close(1003, f"unsupported audio format; this node accepts {format_list(self.pool.formats)}")
+            return
+        processor = TranscriptionProcessor(config.get("channel_labels"), echo_channel=config.get("echo_channel"))
+        session = await self.pool.acquire(*audio_format)
+        relay = None
+        try:
+            relay = asyncio.create_task(self._relay(session, processor, websocket))
+            if first_audio is not None:
+                await session.client.send_audio(session, first_audio)
+            await self._forward(websocket, session)
+            # Recorder finished: flush the last finals back before hanging up
+            await session.close()
+            await relay
+        finally:
+            await session.close()
+            if relay is not None and not relay.done():
+                relay.cancel()
+
+    async def _forward(self, websocket, session):
+        async for message in websocket:
+            if isinstance(message, bytes):
+                await session.client.send_audio(session, message)
+                continue
+            # KeepAlive needs no forwarding: the upstream session sends its own whenever the line is quiet
+            if json.loads(message).get("type") == "CloseStream":
+                return
+
+    async def _relay(self, session, processor, websocket):
+        async for data in session:
+            await self._send_sentences(websocket, processor, processor.process(data))
+            await websocket.send(json.dumps({"type": "partial", "text": processor.partial_text()}))
+        await self._send_sentences(websocket, processor, processor.flush())
+
+    async def _send_sentences(self, websocket, processor, sentences):
+        for sentence in sentences:
+            payload = {key: value for key, value in sentence.items() if key != "words"}
+            payload.update(type="sentence", line=processor.format_sentence(sentence))
+            await websocket.send(json.dumps(payload))
+
+    async def serve(self, host="127.0.0.1", port=8765, metrics_port=None):
+        if not self.token and not is_loopback(host):
+            # Anyone who can reach the port would be spending this node's Deepgram key
+            raise ValueError(f"Refusing to listen on {host} without a token; set GATEWAY_TOKEN or --token")
+        await self.pool.start()
+        if metrics_port:
+            await serve_metrics(REGISTRY, host, metrics_port)
+        async with websockets.serve(self.handle, host, port):
+            logging.info(f"Transcription gateway listening on ws://{host}:{port} (max {self.max_sessions} sessions)")
+            try:
+                await asyncio.Future()
+            finally:
+                await self.pool.close()
+
+def is_loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+def parse_format(value):
+    # "16000x2" -> (16000, 2)
+    try:
+        sample_rate, channels = (int(part) for part in value.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Expected RATExCHANNELS, e.g. 16000x1, not {value}")
+    return sample_rate, channels
+
+def format_list(formats):
+    return ", ".join(f"{sample_rate}x{channels}" for sample_rate, channels in formats)
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Fan many recorders into pooled Deepgram connections")
+    parser.add_argument("--host", default="127.0.0.1", help="Listen address; anything but loopback needs --token")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-sessions", type=int, default=8, help="Concurrent client streams this node accepts")
+    parser.add_argument("--pool-size", type=int, default=2, help="Warm upstream connections kept ready per audio format")
+    parser.add_argument("--format", dest="formats", type=parse_format, action="append",
+                        help="Audio format recorders may send, as RATExCHANNELS; repeat for several (default: 16000x1)")
+    parser.add_argument("--upstream", default=DEEPGRAM_LISTEN_URL, help="Upstream listen URL, e.g. a local fake server")
+    parser.add_argument("--upstream-encoding", choices=list(ENCODINGS), default="linear16",
+                        help="Compress audio on the gateway-to-Deepgram link (flac/opus need soundfile)")
+    parser.add_argument("--token", default=os.getenv('GATEWAY_TOKEN'), help="Shared token recorders must present")
+    parser.add_argument("--metrics-port", type=int, help="Serve Prometheus metrics on this port at /metrics")
+    args = parser.parse_args(argv)
+    if not args.token and not is_loopback(args.host):
+        parser.error(f"--host {args.host} is reachable from the network; set GATEWAY_TOKEN or pass --token")
+
+    pool = SessionPool(os.getenv('DEEPGRAM_API_KEY', ""), size=args.pool_size, base_url=args.upstream,
+                       formats=args.formats or [(16000, 1)], encoding=args.upstream_encoding)
+    gateway = TranscriptionGateway(pool, max_sessions=args.max_sessions, token=args.token)
+    asyncio.run(gateway.serve(args.host, args.port, args.metrics_port))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+import asyncio
+import bisect
+import logging
+import math
+import os
+import threading
+import time
+
+# Seconds; spans a fast websocket send up to a badly delayed transcript
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Hot-path updates take no lock: every metric has a single writer (one capture
+# thread, the asyncio thread or the Tk thread), and a rare torn read only
+# skews one scrape.
+
+class Counter:
+    def __init__(self, fn=None):
+        self.value = 0
+        self.fn = fn
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def get(self):
+        return self.fn() if self.fn else self.value
+
+class Gauge(Counter):
+    def set(self, value):
+        self.value = value
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation; good enough for a stats panel
+        if not self.count:
+            return float("nan")
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + (math.inf,), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return math.inf
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._families = {}  # name -> [kind, help, {label items: metric}]
+
+    def scope(self, **labels):
+        return MetricsScope(self, labels)
+
+    def get(self, kind, name, help, labels, factory):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            family = self._families.setdefault(name, [kind, help, {}])
+            metric = family[2].get(key)
+            if metric is None:
+                metric = family[2][key] = factory()
+            return metric
+
+    def render(self):
+        # Prometheus text exposition format, version 0.0.4
+        lines = []
+        with self._lock:
+            families = [(name, kind, help, list(series.items())) for name, (kind, help, series) in sorted(self._families.items())]
+        for name, kind, help, series in families:
+            if help:
+                lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, metric in series:
+                if kind != "histogram":
+                    lines.append(f"{name}{format_labels(key)} {format_value(metric.get())}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (math.inf,), metric.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{format_labels(key + (('le', format_value(bound)),))} {cumulative}")
+                lines.append(f"{name}_sum{format_labels(key)} {format_value(metric.sum)}")
+                lines.append(f"{name}_count{format_labels(key)} {metric.count}")
+        return "\n".join(lines) + "\n"
+
+    def summary_lines(self):
+        # Compact human-readable view for the GUI stats panel
+        lines = []
+        with self._lock:
+            families = [(name, kind, list(series.items())) for name, (kind, _, series) in sorted(self._families.items())]
+        for name, kind, series in families:
+            for key, metric in series:
+                label = f"{name}{format_labels(key)}"
+                if kind == "histogram":
+                    if metric.count:
+                        lines.append(f"{label}: p50 <={metric.quantile(0.5):g}  p95 <={metric.quantile(0.95):g}  n {metric.count}")
+                elif name.endswith("_timestamp_seconds"):
+                    value = metric.get()
+                    lines.append(f"{label}: {time.time() - value:.1f}s ago" if value else f"{label}: never")
+                else:
+                    lines.append(f"{label}: {metric.get():g}")
+        return lines
+
+class MetricsScope:
+    def __init__(self, registry, labels):
+        self.registry = registry
+        self.labels = labels
+
+    def scope(self, **labels):
+        return MetricsScope(self.registry, {**self.labels, **labels})
+
+    def counter(self, name, help="", fn=None, **labels):
+        metric = self.registry.get("counter", name, help, {**self.labels, **labels}, Counter)
+        if fn is not None:
+            metric.fn = fn  # A new session re-points the series at its own objects
+        return metric
+
+    def gauge(self, name, help="", fn=None, **labels):
+        metric = self.registry.get("gauge", name, help, {**self.labels, **labels}, Gauge)
+        if fn is not None:
+            metric.fn = fn
+        return metric
+
+    def histogram(self, name, help="", buckets=LATENCY_BUCKETS, **labels):
+        return self.registry.get("histogram", name, help, {**self.labels, **labels}, lambda: Histogram(buckets))
+
+def format_labels(items):
+    if not items:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in items)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(items, escaped)) + "}"
+
+def format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(value) if isinstance(value, float) else str(value)
+
+REGISTRY = MetricsRegistry()
+
+def write_metrics(registry, path):
+    # Write-then-rename so a node_exporter textfile collector never reads half a file
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(registry.render())
+    os.replace(temp_path, path)
+
+async def dump_metrics(registry, path, interval=15):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            write_metrics(registry, path)
+        except OSError as e:
+            logging.error(f"Could not write metrics to {path}: {e}")
+
+async def serve_metrics(registry, host="127.0.0.1", port=9108):
+    async def handle(reader, writer):
+        try:
+            request = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass  # Headers carry nothing we need
+            parts = request.split()
+            if len(parts) >= 2 and parts[1].split(b"?")[0] == b"/metrics":
+                status, body = "200 OK", registry.render().encode("utf-8")
+            else:
+                status, body = "404 Not Found", b"Try /metrics\n"
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                         f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("ascii") + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    logging.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return server
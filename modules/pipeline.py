@@ -0,0 +1,121 @@
+import asyncio
+import contextlib
+import logging
+import time
+from modules.audio_capture import AudioCapture, EchoCanceller, VoiceActivityDetector
+from modules.deepgram_client import DEEPGRAM_LISTEN_URL, DeepgramClient
+from modules.metrics import REGISTRY
+from modules.transcription_processor import TranscriptionProcessor
+
+class TranscriptionPipeline:
+    def __init__(self, api_key, mode="computer audio", sinks=None, on_partial=None, use_vad=True, name=None, base_url=DEEPGRAM_LISTEN_URL, metrics=None, encoding="linear16", device_rate=None, archive=None, prewarm=None, use_aec=True):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.mode = mode
+        self.sinks = list(sinks or [])
+        self.on_partial = on_partial
+        self.use_vad = use_vad
+        self.use_aec = use_aec
+        self.encoding = encoding
+        self.device_rate = device_rate
+        self.archive = archive
+        self.prewarm = prewarm
+        self.name = name or mode
+        self.metrics = (metrics or REGISTRY).scope(pipeline=self.name)
+        self._latency = self.metrics.histogram("transcript_latency_seconds", "From capturing a sentence's last word to handing the sentence to the sinks")
+        self._sink_seconds = self.metrics.histogram("pipeline_sink_seconds", "Time all sinks take to accept one sentence")
+        self.audio_capture = None
+        self.processor = None
+        self.client = None
+        self.session = None
+        self._send_task = None
+        self._stopping = False
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+
+    def build(self):
+        # The echo canceller only runs when a mode records both the mic and the loopback
+        self.audio_capture = AudioCapture(vad=VoiceActivityDetector() if self.use_vad else None, metrics=self.metrics, device_rate=self.device_rate,
+                                          echo_canceller=EchoCanceller() if self.use_aec else None)
+        self.audio_capture.set_capture_mode(self.mode)
+        if self.prewarm is not None and self.prewarm.device_rate == self.device_rate:
+            # Recorders that are already open and running; anything not warm yet opens the usual way
+            warm = self.prewarm.recorders_for(self.mode)
+            self.audio_capture.sources = [(name, warm.get(name, open_recorder)) for name, open_recorder in self.audio_capture.sources]
+        self.audio_capture.archive = self.archive
+        self.processor = TranscriptionProcessor(self.audio_capture.channel_labels, metrics=self.metrics, echo_channel=self.audio_capture.echo_channel)
+        self.client = DeepgramClient(self.api_key, channels=self.audio_capture.channels, base_url=self.base_url, metrics=self.metrics, encoding=self.encoding)
+
+    async def run(self):
+        # Callers may build() first to swap in their own recorders, e.g. the benchmark's synthetic ones
+        if self.audio_capture is None:
+            self.build()
+        try:
+            async with self._session() as session:
+                self.session = session
+                self._send_task = asyncio.create_task(self.audio_capture.capture_and_send_audio(session, self.client))
+                receive_task = asyncio.create_task(self._receive(session))
+                if self._stopping:
+                    self._send_task.cancel()
+                await asyncio.wait({self._send_task, receive_task}, return_when=asyncio.FIRST_COMPLETED)
+
+                if receive_task.done():
+                    # Upstream went away for good; stop capturing and surface why
+                    self._send_task.cancel()
+                    await asyncio.gather(self._send_task, return_exceptions=True)
+                    receive_task.result()
+                    return
+                if not self._send_task.cancelled() and self._send_task.exception() is not None:
+                    receive_task.cancel()
+                    raise self._send_task.exception()
+
+                # Capture was stopped: closing the stream flushes the last finals to the receiver
+                await session.close()
+                await receive_task
+        finally:
+            logging.info(f"[{self.name}] Audio capture stats: {self.audio_capture.stats()}")
+            logging.info(f"[{self.name}] Deepgram stream stats: {self.client.stats()}")
+            if self.session is not None:
+                logging.info(f"[{self.name}] Deepgram session stats: {self.session.stats()}")
+
+    @contextlib.asynccontextmanager
+    async def _session(self):
+        if self.prewarm is not None and self.prewarm.pool.encoding == self.encoding:
+            # A connection that finished its TLS handshake before Start was pressed
+            session = await self.prewarm.pool.acquire(self.client.sample_rate, self.client.channels)
+            self.client = session.client
+        else:
+            session = await self.client.session().open()
+        try:
+            yield session
+        finally:
+            await session.close()
+
+    async def _receive(self, session):
+        async for message in session:
+            self._emit(self.processor.process(message))
+            if self.on_partial:
+                self.on_partial(self.processor.partial_text())
+        # Mic sentences still waiting for the loopback channel to catch up
+        self._emit(self.processor.flush())
+
+    def _emit(self, sentences):
+        for sentence in sentences:
+            line = self.processor.format_sentence(sentence)
+            started = time.monotonic()
+            capture_started = self.audio_capture.capture_started_at
+            if capture_started is not None:
+                self._latency.observe(max(0.0, started - (capture_started + sentence["end"])))
+            for sink in self.sinks:
+                sink(sentence, line)
+            self._sink_seconds.observe(time.monotonic() - started)
+
+    def stop(self):
+        self._stopping = True
+        if self._send_task is not None:
+            self._send_task.cancel()
+
+async def run_pipelines(pipelines):
+    # Every pipeline shares the running event loop; capture itself happens on worker threads
+    return await asyncio.gather(*(pipeline.run() for pipeline in pipelines), return_exceptions=True)
@@ -0,0 +1,204 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import time
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+CLEANUP_SYSTEM_PROMPT = "You are an expert in cleaning up speech transcriptions. Your task is to improve the readability and clarity of the conversation while maintaining its original meaning. Only provide the cleaned transcription and nothing else."
+CLEANUP_USER_PROMPT = (
+    "Please clean up this transcription by doing the following:\n"
+    "1. Remove filler words, stutters, and false starts.\n"
+    "2. Correct any obvious word errors or misheard words.\n"
+    "3. Remove unnecessary repetitions.\n"
+    "4. Improve sentence structure for clarity, but maintain the conversational tone.\n"
+    "5. Do not add any new information or change the meaning of the conversation.\n"
+    "6. Leave the timestamps and dont remove them.\n"
+    "Here's the transcription:\n{transcription}"
+)
+SUMMARY_SYSTEM_PROMPT = "You are a helpful assistant that summarizes transcriptions."
+SUMMARY_USER_PROMPT = "Please provide a brief summary of this transcription: {transcription}"
+REDUCE_USER_PROMPT = "These are summaries of consecutive parts of one transcription. Combine them into one brief summary of the whole conversation:\n{summaries}"
+
+def retryable_errors():
+    import openai
+    return (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError, openai.InternalServerError)
+
+def count_tokens(text, model="gpt-4o-mini"):
+    if tiktoken is None:
+        return len(text) // 4 + 1  # Close enough for English when tiktoken is not installed
+    try:
+        encoding = tiktoken.encoding_for_model(model)
+    except KeyError:
+        encoding = tiktoken.get_encoding("o200k_base")
+    return len(encoding.encode(text))
+
+def chunk_transcript(text, max_tokens, model="gpt-4o-mini"):
+    # Cut only between lines so every chunk starts on a [HH:MM:SS] timestamp
+    chunks, current, current_tokens = [], [], 0
+    for line in text.splitlines(keepends=True):
+        tokens = count_tokens(line, model)
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append("".join(current))
+            current, current_tokens = [], 0
+        current.append(line)
+        current_tokens += tokens
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+class RateLimiter:
+    def __init__(self, requests_per_minute):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+class PostProcessor:
+    def __init__(self, api_key, model="gpt-4o-mini", base_url=None, cache_dir=None, chunk_tokens=3000,
+                 summary_tokens=12000, concurrency=4, requests_per_minute=60, retries=4):
+        if retries < 1:
+            raise ValueError(f"retries is the number of attempts and must be at least 1, not {retries}")
+        self.api_key = api_key
+        self.base_url = base_url
+        self._client = None
+        self.model = model
+        self.cache_dir = cache_dir
+        self.chunk_tokens = chunk_tokens
+        self.summary_tokens = summary_tokens
+        self.retries = retries
+        self.cache_hits = 0
+        self.requests = 0
+        self._slots = asyncio.Semaphore(concurrency)
+        self._rate_limiter = RateLimiter(requests_per_minute)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @property
+    def client(self):
+        # openai takes a good part of a second to import; the app should not wait for it to open
+        if self._client is None:
+            from openai import AsyncOpenAI
+            # Retries happen in complete(), where they go through the rate limiter
+            self._client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0)
+        return self._client
+
+    def _cache_path(self, messages):
+        # Same model and same prompt text means the same answer, so the content hash is the key
+        key = hashlib.sha256(json.dumps([self.model, messages], sort_keys=True).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    async def complete(self, system_prompt, user_prompt):
+        messages = [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}]
+        cache_path = self._cache_path(messages) if self.cache_dir else None
+        if cache_path and os.path.exists(cache_path):
+            self.cache_hits += 1
+            with open(cache_path, "r", encoding="utf-8") as f:
+                return json.load(f)["content"]
+
+        retryable = retryable_errors()
+        async with self._slots:
+            for attempt in range(1, self.retries + 1):
+                await self._rate_limiter.wait()
+                try:
+                    self.requests += 1
+                    response = await self.client.chat.completions.create(model=self.model, messages=messages)
+                    break
+                except retryable as e:
+                    if attempt == self.retries:
+                        raise
+                    delay = random.uniform(0, 2 ** attempt)
+                    logging.warning(f"OpenAI request failed ({e}), retrying in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+        content = response.choices[0].message.content
+
+        if cache_path:
+            with open(cache_path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump({"content": content}, f)
+            os.replace(cache_path + ".tmp", cache_path)
+        return content
+
+    async def _gather_with_progress(self, coroutines, on_progress, stage):
+        done = 0
+        total = len(coroutines)
+
+        async def track(coroutine):
+            nonlocal done
+            result = await coroutine
+            done += 1
+            if on_progress:
+                on_progress(stage, done, total)
+            return result
+
+        return await asyncio.gather(*(track(coroutine) for coroutine in coroutines))
+
+    async def clean(self, transcription, on_progress=None):
+        chunks = chunk_transcript(transcription, self.chunk_tokens, self.model)
+        cleaned = await self._gather_with_progress(
+            [self.complete(CLEANUP_SYSTEM_PROMPT, CLEANUP_USER_PROMPT.format(transcription=chunk)) for chunk in chunks],
+            on_progress, "cleanup")
+        return "\n".join(part.strip() for part in cleaned)
+
+    async def summarize(self, text, on_progress=None):
+        if count_tokens(text, self.model) <= self.summary_tokens:
+            summary = await self.complete(SUMMARY_SYSTEM_PROMPT, SUMMARY_USER_PROMPT.format(transcription=text))
+            if on_progress:
+                on_progress("summary", 1, 1)
+            return summary
+
+        # Map: summarize each part in parallel. Reduce: merge the part summaries, again if still too long.
+        parts = chunk_transcript(text, self.summary_tokens, self.model)
+        summaries = await self._gather_with_progress(
+            [self.complete(SUMMARY_SYSTEM_PROMPT, SUMMARY_USER_PROMPT.format(transcription=part)) for part in parts],
+            on_progress, "summary")
+        combined = "\n\n".join(summaries)
+        while count_tokens(combined, self.model) > self.summary_tokens:
+            groups = chunk_transcript(combined, self.summary_tokens, self.model)
+            combined = "\n\n".join(await asyncio.gather(
+                *(self.complete(SUMMARY_SYSTEM_PROMPT, REDUCE_USER_PROMPT.format(summaries=group)) for group in groups)))
+        return await self.complete(SUMMARY_SYSTEM_PROMPT, REDUCE_USER_PROMPT.format(summaries=combined))
+
+    async def process_file(self, output_file, on_progress=None, summary=None):
+        with open(output_file, "r", encoding="utf-8") as f:
+            transcription = f.read()
+
+        cleaned_transcription = await self.clean(transcription, on_progress)
+        if not summary:
+            # No rolling summary from the live session, so summarize the whole thing now
+            summary = await self.summarize(cleaned_transcription, on_progress)
+
+        # Save cleaned transcription and summary
+        output_dir = os.path.dirname(output_file)
+        base_name = os.path.splitext(os.path.basename(output_file))[0]
+        cleaned_file = os.path.join(output_dir, f"{base_name}_cleaned.txt")
+        summary_file = os.path.join(output_dir, f"{base_name}_summary.txt")
+
+        # Ensure filenames are unique
+        counter = 1
+        while os.path.exists(cleaned_file) or os.path.exists(summary_file):
+            cleaned_file = os.path.join(output_dir, f"{base_name}_cleaned_{counter}.txt")
+            summary_file = os.path.join(output_dir, f"{base_name}_summary_{counter}.txt")
+            counter += 1
+
+        with open(cleaned_file, "w", encoding="utf-8") as f:
+            f.write(cleaned_transcription)
+
+        with open(summary_file, "w", encoding="utf-8") as f:
+            f.write(summary)
+
+        logging.info(f"Processing complete. Files saved: {output_file}, {cleaned_file}, {summary_file} "
+                     f"({self.requests} requests, {self.cache_hits} cache hits)")
+        return cleaned_file, summary_file
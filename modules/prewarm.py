@@ -0,0 +1,246 @@
+import asyncio
+import logging
+import math
+import queue
+import threading
+import time
+from collections import deque
+import numpy as np
+from modules.audio_capture import CAPTURE_SOURCES, find_device, native_rate
+from modules.deepgram_client import DEEPGRAM_LISTEN_URL
+from modules.gateway import SessionPool
+from modules.metrics import REGISTRY
+
+POOL_CHECK_SECONDS = 15
+
+# Everything Start used to wait for, done ahead of time on background threads:
+#   DeviceCache    default devices, resolved once per change instead of once per session
+#   WarmRecorder   a device stream kept open and read; Start only redirects its blocks
+#   SessionPool    a Deepgram connection that already finished its handshake
+# The watcher thread polls the default devices, so plugging in a headset moves the
+# recorders over, mid-session included, without restarting the app.
+
+class DeviceCache:
+    def __init__(self):
+        self.devices = {}  # source name -> soundcard device
+        self.ids = {}
+
+    def refresh(self):
+        import soundcard as sc
+        ids = {"mic": sc.default_microphone().id, "speaker": sc.default_speaker().id}
+        changed = [name for name, device_id in ids.items() if self.ids.get(name) != device_id]
+        for name in changed:
+            # Looking a device up enumerates all of them, so only do it when the default moved
+            self.devices[name] = find_device(name)
+        self.ids = ids
+        return changed
+
+class WarmRecorder:
+    # Between sessions the blocks go into a short pre-roll, so a session also gets the
+    # moment before Start was pressed. Used as AudioCapture's recorder through lease().
+    def __init__(self, name, devices, device_rate, block_seconds, preroll_seconds=0.5, max_failures=3):
+        self.name = name
+        self.devices = devices
+        self.device_rate = device_rate  # None follows each device's native rate
+        self.block_seconds = block_seconds
+        self.preroll_seconds = preroll_seconds
+        self.max_failures = max_failures
+        self.error = None  # Set while the device keeps failing; cleared by the next good block
+        self.samplerate = None  # Rate of the block record() last returned
+        self._rate = None  # Rate the current device is open at
+        self._preroll = deque(maxlen=1)
+        self._queue = None
+        self._lock = threading.Lock()
+        self._reopen = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def leased(self):
+        return self._queue is not None
+
+    @property
+    def healthy(self):
+        return self.error is None and self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"warm-{self.name}", daemon=True)
+        self._thread.start()
+
+    def reopen(self):
+        # Finish the block in flight, then continue on whatever device is now the default
+        self._reopen.set()
+
+    def close(self, timeout=1.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        failures = 0
+        while not self._stop.is_set():
+            self._reopen.clear()
+            try:
+                device = self.devices.devices[self.name]
+                rate = self.device_rate or native_rate(device)
+                # The same block size AudioCapture would ask a cold recorder for
+                numframes = round(self.block_seconds * rate)
+                with device.recorder(samplerate=rate) as recorder:
+                    with self._lock:
+                        # The new device may have another channel count or rate
+                        self._preroll = deque(maxlen=max(1, math.ceil(self.preroll_seconds / self.block_seconds)))
+                        self._rate = rate
+                    while not self._stop.is_set() and not self._reopen.is_set():
+                        self._deliver(recorder.record(numframes=numframes))
+                        failures = 0
+                        self.error = None
+            except Exception as e:
+                failures += 1
+                if failures == 1:
+                    logging.warning(f"Warm {self.name} recorder failed ({e}), reopening")
+                if failures >= self.max_failures:
+                    if self.error is None:
+                        logging.error(f"Warm {self.name} recorder keeps failing: {e}")
+                    # Sessions now open this source cold, and one already holding it stops
+                    self.error = e
+                    self._deliver(e)
+                self._stop.wait(min(5.0, 0.25 * 2 ** failures))
+
+    def _deliver(self, item):
+        with self._lock:
+            if self._queue is not None:
+                # Blocks travel with their rate, since a device swap can change it mid-session
+                self._queue.put(item if isinstance(item, Exception) else (self._rate, item))
+            elif not isinstance(item, Exception):
+                self._preroll.append(item)
+
+    def lease(self):
+        if self.leased:
+            raise RuntimeError(f"The warm {self.name} recorder is already in use")
+        return self
+
+    def __enter__(self):
+        with self._lock:
+            self._queue = queue.SimpleQueue()
+            self.samplerate = self._rate
+            if self._preroll:
+                self._queue.put((self._rate, np.concatenate(self._preroll)))
+                self._preroll.clear()
+        return self
+
+    def record(self, numframes=None):
+        # Blocks come in the warm recorder's own size, which the Prewarmer matched to the pipeline's
+        while True:
+            try:
+                item = self._queue.get(timeout=1.0)
+            except queue.Empty:
+                if not self._thread.is_alive():
+                    raise RuntimeError(f"The warm {self.name} recorder stopped")
+                if self.error is not None:
+                    raise self.error
+                continue
+            if isinstance(item, Exception):
+                raise item
+            self.samplerate, block = item
+            return block
+
+    def __exit__(self, exc_type, exc, tb):
+        with self._lock:
+            self._queue = None
+
+class Prewarmer:
+    def __init__(self, api_key, base_url=DEEPGRAM_LISTEN_URL, encoding="linear16", sample_rate=16000, chunk_size=1024,
+                 device_rate=None, poll_seconds=2.0, preroll_seconds=0.5, metrics=None):
+        self.sample_rate = sample_rate
+        self.device_rate = device_rate
+        self.poll_seconds = poll_seconds
+        self.preroll_seconds = preroll_seconds
+        self.block_seconds = chunk_size / sample_rate
+        self.devices = DeviceCache()
+        self.recorders = {}
+        self.pool = SessionPool(api_key, size=1, base_url=base_url, formats=(), encoding=encoding, metrics=metrics)
+        self.mode = "computer audio"
+        self.hot_swaps = 0
+        self._loop = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        metrics = metrics or REGISTRY.scope()
+        metrics.counter("prewarm_device_swaps_total", "Warm recorders moved to a new default device", fn=lambda: self.hot_swaps)
+        metrics.counter("prewarm_pool_hits_total", "Sessions that started on a warm upstream connection", fn=lambda: self.pool.hits)
+        metrics.counter("prewarm_pool_misses_total", "Sessions that had to open a fresh upstream connection", fn=lambda: self.pool.misses)
+
+    def start(self, loop, mode=None):
+        self._loop = loop
+        self.prepare(mode or self.mode)
+        self._thread = threading.Thread(target=self._watch, name="prewarm", daemon=True)
+        self._thread.start()
+
+    def prepare(self, mode):
+        # Warm exactly what the next Start will use; call again whenever the capture mode changes
+        self.mode = mode.lower()
+        self._prepare_pool()
+        self._wake.set()
+
+    def _prepare_pool(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self.pool.prepare, self.sample_rate, len(CAPTURE_SOURCES[self.mode]))
+
+    def recorders_for(self, mode):
+        # name -> open_recorder for AudioCapture.sources; whatever is not warm yet, or whose
+        # device keeps failing, is left out and opened cold
+        warm = {}
+        for name in CAPTURE_SOURCES[mode.lower()]:
+            recorder = self.recorders.get(name)
+            if recorder is not None and recorder.healthy and not recorder.leased:
+                warm[name] = recorder.lease
+        return warm
+
+    def _watch(self):
+        last_pool_check = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                changed = self.devices.refresh()
+            except Exception as e:
+                logging.warning(f"Could not list audio devices: {e}")
+                changed = []
+            wanted = CAPTURE_SOURCES[self.mode]
+            for name in wanted:
+                recorder = self.recorders.get(name)
+                if recorder is None:
+                    recorder = WarmRecorder(name, self.devices, self.device_rate, self.block_seconds, self.preroll_seconds)
+                    recorder.start()
+                    self.recorders[name] = recorder
+                elif name in changed:
+                    logging.info(f"Default {name} device changed, moving the recorder over")
+                    self.hot_swaps += 1
+                    recorder.reopen()
+            for name in [name for name, recorder in self.recorders.items() if name not in wanted and not recorder.leased]:
+                # Do not hold a microphone open that the selected mode will not record
+                self.recorders.pop(name).close()
+            if time.monotonic() - last_pool_check >= POOL_CHECK_SECONDS:
+                # Replaces a warm connection that dropped or could not be opened earlier
+                self._prepare_pool()
+                last_pool_check = time.monotonic()
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+
+    def close(self, timeout=5.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        for recorder in self.recorders.values():
+            recorder.close()
+        if self._loop is not None and self._loop.is_running():
+            try:
+                asyncio.run_coroutine_threadsafe(self.pool.close(), self._loop).result(timeout)
+            except Exception as e:
+                logging.warning(f"Could not close warm upstream connections: {e}")
+
+    def stats(self):
+        return {
+            "warm_recorders": sorted(self.recorders),
+            "hot_swaps": self.hot_swaps,
+            **self.pool.stats(),
+        }
@@ -0,0 +1,69 @@
+import threading
+import numpy as np
+
+class RingBuffer:
+    def __init__(self, capacity, channels=1, dtype=np.int16):
+        self.capacity = capacity
+        self.channels = channels
+        self._data = np.zeros((capacity, channels), dtype=dtype)
+        self._lock = threading.Lock()
+        # Absolute frame counters; the difference is the number of buffered frames
+        self._read_pos = 0
+        self._write_pos = 0
+        self.overruns = 0
+        self.frames_dropped = 0
+        self.frames_written = 0
+
+    def available(self):
+        with self._lock:
+            return self._write_pos - self._read_pos
+
+    def write(self, frames):
+        frames = frames.reshape(len(frames), -1)
+        with self._lock:
+            n = len(frames)
+            if n > self.capacity:
+                self.frames_dropped += n - self.capacity
+                frames = frames[-self.capacity:]
+                n = self.capacity
+
+            free = self.capacity - (self._write_pos - self._read_pos)
+            if n > free:
+                # Reader fell behind: drop the oldest audio instead of blocking the capture thread
+                self.overruns += 1
+                self.frames_dropped += n - free
+                self._read_pos += n - free
+
+            start = self._write_pos % self.capacity
+            first = min(n, self.capacity - start)
+            np.copyto(self._data[start:start + first], frames[:first], casting="unsafe")
+            if first < n:
+                np.copyto(self._data[:n - first], frames[first:], casting="unsafe")
+            self._write_pos += n
+            self.frames_written += n
+
+    def read(self, max_frames, out=None):
+        with self._lock:
+            n = min(max_frames, self._write_pos - self._read_pos)
+            if out is None:
+                out = np.empty((n, self.channels), dtype=self._data.dtype)
+            else:
+                out = out[:n]
+
+            start = self._read_pos % self.capacity
+            first = min(n, self.capacity - start)
+            out[:first] = self._data[start:start + first]
+            if first < n:
+                out[first:] = self._data[:n - first]
+            self._read_pos += n
+            return out
+
+    def discard(self, frames):
+        with self._lock:
+            n = min(frames, self._write_pos - self._read_pos)
+            self._read_pos += n
+            return n
+
+    def clear(self):
+        with self._lock:
+            self._read_pos = self._write_pos
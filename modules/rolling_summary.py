@@ -0,0 +1,54 @@
+import asyncio
+import logging
+from modules.postprocess import SUMMARY_SYSTEM_PROMPT
+
+ROLLING_USER_PROMPT = (
+    "Here is the summary of a conversation so far:\n{summary}\n\n"
+    "Here are the new lines of the conversation since that summary:\n{lines}\n\n"
+    "Update the summary so it covers the whole conversation. Keep it brief and only provide the updated summary."
+)
+
+class RollingSummarizer:
+    def __init__(self, postprocessor, every=10, on_update=None):
+        self.postprocessor = postprocessor
+        self.every = every
+        self.on_update = on_update
+        self.summary = ""
+        self.updates = 0
+        self._pending = []
+        self._task = None
+
+    def __call__(self, sentence, line):
+        # Pipeline sink on the asyncio thread; at most one update is in flight at a time
+        self._pending.append(line)
+        if len(self._pending) >= self.every and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._update())
+
+    async def _update(self):
+        lines, self._pending = self._pending, []
+        # Only the new lines and the previous summary are sent, so every update costs about the same
+        prompt = ROLLING_USER_PROMPT.format(summary=self.summary or "(nothing yet)", lines="\n".join(lines))
+        try:
+            self.summary = await self.postprocessor.complete(SUMMARY_SYSTEM_PROMPT, prompt)
+        except Exception as e:
+            logging.error(f"Rolling summary update failed: {e}")
+            self._pending = lines + self._pending  # Fold them into the next update
+            return
+        self.updates += 1
+        if self.on_update:
+            self.on_update(self.summary)
+
+    @property
+    def lines_behind(self):
+        # Committed lines the summary does not cover yet
+        return len(self._pending)
+
+    async def finalize(self):
+        if self._task is not None:
+            await self._task
+        if self._pending:
+            await self._update()
+        if self._pending:
+            # The last update failed too; callers check lines_behind before trusting the summary
+            logging.warning(f"Final rolling summary leaves out the last {len(self._pending)} lines")
+        return self.summary
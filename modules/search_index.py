@@ -0,0 +1,265 @@
+import argparse
+import glob
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from modules.transcription_processor import format_timestamp, parse_timestamp
+
+INDEX_NAME = ".index.sqlite3"
+SCHEMA_VERSION = 1
+TIMESTAMP = re.compile(r'^\[(\d+):(\d\d):(\d\d)\]')
+QUERY_TOKEN = re.compile(r'(\w+):("[^"]*"|\S+)|"([^"]*)"|(\S+)')
+FILTER_KEYS = ("title", "after", "before", "kind")
+KINDS = ("transcript", "cleaned", "summary")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    title TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    indexed_bytes INTEGER NOT NULL,
+    lines INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS segments (
+    id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL,
+    line_no INTEGER NOT NULL,
+    seconds REAL
+);
+CREATE INDEX IF NOT EXISTS segments_file ON segments(file_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS segments_fts USING fts5(text, tokenize='unicode61 remove_diacritics 2', prefix='2 3');
+"""
+
+def describe(path):
+    # (title, kind) from the names the app writes: Title.txt, Title_cleaned[_N].txt, Title_summary[_N].txt
+    name = os.path.splitext(os.path.basename(path))[0]
+    for kind in ("cleaned", "summary"):
+        match = re.match(rf'^(.*)_{kind}(?:_\d+)?$', name)
+        if match:
+            return match.group(1), kind
+    if name.startswith("temp_"):
+        return "Recording in progress", "transcript"
+    return name, "transcript"
+
+def parse_query(query):
+    # Words and "quoted phrases" go to FTS5; title:, after:, before: and kind: become filters
+    terms, filters = [], {}
+    for key, value, phrase, word in QUERY_TOKEN.findall(query):
+        if key and key.lower() in FILTER_KEYS:
+            filters[key.lower()] = value.strip('"')
+        elif phrase or key:
+            text = phrase if phrase else f"{key}:{value}"
+            terms.append('"' + text.replace('"', '""') + '"')
+        elif word in ("AND", "OR", "NOT"):
+            terms.append(word)
+        elif word.endswith("*") and len(word) > 1:
+            terms.append('"' + word[:-1].replace('"', '""') + '"*')
+        else:
+            terms.append('"' + word.replace('"', '""') + '"')
+    for key in ("after", "before"):
+        if key in filters:
+            filters[key] = parse_timestamp(filters[key])
+    return " ".join(terms), filters
+
+class SearchIndex:
+    def __init__(self, output_dir, db_path=None):
+        self.output_dir = output_dir
+        self.db_path = db_path or os.path.join(output_dir, INDEX_NAME)
+        # Shared by the writer thread, the asyncio thread and the GUI; sqlite calls are short
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        if self._db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            self._db.executescript("DROP TABLE IF EXISTS files; DROP TABLE IF EXISTS segments; DROP TABLE IF EXISTS segments_fts;")
+            self._db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def update_file(self, path):
+        # Transcripts only ever grow while recording, so normally only the new tail is read
+        path = os.path.abspath(path)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self.remove(path)
+            return 0
+        with self._lock, self._db:
+            row = self._db.execute("SELECT id, size, mtime, indexed_bytes, lines FROM files WHERE path = ?", (path,)).fetchone()
+            if row and row[1] == stat.st_size and row[2] == stat.st_mtime:
+                return 0
+            title, kind = describe(path)
+            if row and stat.st_size >= row[3]:
+                file_id, start, line_no = row[0], row[3], row[4]
+            else:
+                if row:
+                    self._delete_segments(row[0])
+                file_id = row[0] if row else None
+                start, line_no = 0, 0
+            with open(path, "rb") as f:
+                f.seek(start)
+                data = f.read()
+            # Leave a half-written last line for the next flush
+            complete = data[:data.rfind(b"\n") + 1] if kind == "transcript" else data
+            if file_id is None:
+                file_id = self._db.execute(
+                    "INSERT INTO files (path, title, kind, size, mtime, indexed_bytes, lines) VALUES (?, ?, ?, 0, 0, 0, 0)",
+                    (path, title, kind)).lastrowid
+            segments, texts = [], []
+            next_id = self._db.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM segments").fetchone()[0]
+            for raw_line in complete.decode("utf-8", errors="replace").splitlines():
+                line_no += 1
+                text = raw_line.strip()
+                if not text:
+                    continue
+                match = TIMESTAMP.match(text)
+                seconds = int(match.group(1)) * 3600 + int(match.group(2)) * 60 + int(match.group(3)) if match else None
+                segments.append((next_id, file_id, line_no, seconds))
+                texts.append((next_id, text))
+                next_id += 1
+            self._db.executemany("INSERT INTO segments (id, file_id, line_no, seconds) VALUES (?, ?, ?, ?)", segments)
+            self._db.executemany("INSERT INTO segments_fts (rowid, text) VALUES (?, ?)", texts)
+            added = len(segments)
+            self._db.execute("UPDATE files SET title = ?, kind = ?, size = ?, mtime = ?, indexed_bytes = ?, lines = ? WHERE id = ?",
+                             (title, kind, stat.st_size, stat.st_mtime, start + len(complete), line_no, file_id))
+            return added
+
+    def update_files(self, paths):
+        return sum(self.update_file(path) for path in paths if path)
+
+    def rename(self, old_path, new_path):
+        # finalize() renames temp_*.txt to the titled name; the indexed lines stay valid
+        old_path, new_path = os.path.abspath(old_path), os.path.abspath(new_path)
+        title, kind = describe(new_path)
+        with self._lock, self._db:
+            existing = self._db.execute("SELECT id FROM files WHERE path = ?", (new_path,)).fetchone()
+            if existing:
+                self._delete_segments(existing[0])
+                self._db.execute("DELETE FROM files WHERE id = ?", (existing[0],))
+            self._db.execute("UPDATE files SET path = ?, title = ?, kind = ? WHERE path = ?", (new_path, title, kind, old_path))
+        self.update_file(new_path)
+
+    def remove(self, path):
+        with self._lock, self._db:
+            row = self._db.execute("SELECT id FROM files WHERE path = ?", (os.path.abspath(path),)).fetchone()
+            if row:
+                self._delete_segments(row[0])
+                self._db.execute("DELETE FROM files WHERE id = ?", (row[0],))
+
+    def _delete_segments(self, file_id):
+        self._db.execute("DELETE FROM segments_fts WHERE rowid IN (SELECT id FROM segments WHERE file_id = ?)", (file_id,))
+        self._db.execute("DELETE FROM segments WHERE file_id = ?", (file_id,))
+
+    def sync(self):
+        # Catch up with files written while nothing was watching; unchanged files cost one stat
+        paths = {os.path.abspath(path) for path in glob.glob(os.path.join(self.output_dir, "*.txt"))}
+        with self._lock:
+            known = {row[0] for row in self._db.execute("SELECT path FROM files")}
+        for path in known - paths:
+            self.remove(path)
+        added = self.update_files(sorted(paths))
+        if added:
+            logging.info(f"Indexed {added} new lines from {self.output_dir}")
+        return added
+
+    def search(self, query, limit=20, title=None, after=None, before=None, kind=None):
+        match, filters = parse_query(query)
+        title = filters.get("title", title)
+        after = filters.get("after", after)
+        before = filters.get("before", before)
+        kind = filters.get("kind", kind)
+
+        conditions, params = [], []
+        if title:
+            conditions.append("f.title LIKE ?")
+            params.append(f"%{title}%")
+        if after is not None:
+            conditions.append("s.seconds >= ?")
+            params.append(after)
+        if before is not None:
+            conditions.append("s.seconds <= ?")
+            params.append(before)
+        if kind:
+            conditions.append("f.kind = ?")
+            params.append(kind)
+
+        if match:
+            sql = ("SELECT f.path, f.title, f.kind, s.line_no, s.seconds, "
+                   "snippet(segments_fts, 0, '[', ']', '...', 16), bm25(segments_fts) AS score "
+                   "FROM segments_fts JOIN segments s ON s.id = segments_fts.rowid JOIN files f ON f.id = s.file_id "
+                   "WHERE segments_fts MATCH ?" + "".join(f" AND {condition}" for condition in conditions) +
+                   " ORDER BY score LIMIT ?")
+            params = [match] + params + [limit]
+        else:
+            # Filters only: newest files first, in reading order
+            sql = ("SELECT f.path, f.title, f.kind, s.line_no, s.seconds, t.text, 0.0 "
+                   "FROM segments s JOIN files f ON f.id = s.file_id JOIN segments_fts t ON t.rowid = s.id"
+                   + (" WHERE " + " AND ".join(conditions) if conditions else "") +
+                   " ORDER BY f.mtime DESC, s.line_no LIMIT ?")
+            params = params + [limit]
+        with self._lock:
+            try:
+                rows = self._db.execute(sql, params).fetchall()
+            except sqlite3.OperationalError as e:
+                raise ValueError(f"Invalid search query: {e}") from e
+        return [
+            {"path": path, "title": title, "kind": kind, "line": line_no, "seconds": seconds, "text": text, "score": score}
+            for path, title, kind, line_no, seconds, text, score in rows
+        ]
+
+    def stats(self):
+        with self._lock:
+            files, lines = self._db.execute("SELECT COUNT(*), COALESCE(SUM(lines), 0) FROM files").fetchone()
+        return {"files": files, "lines": lines}
+
+def format_result(result):
+    stamp = f"[{format_timestamp(result['seconds'])}] " if result["seconds"] is not None else ""
+    return f"{result['title']} ({result['kind']}, line {result['line']}): {stamp}{TIMESTAMP.sub('', result['text']).strip()}"
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Search the transcript library",
+                                     epilog='Query syntax: words, "exact phrases", OR, NOT, prefix*, '
+                                            'title:standup, kind:cleaned, after:00:10:00, before:1:30:00')
+    parser.add_argument("query", nargs="*", help="Search terms and filters")
+    parser.add_argument("--out", default="output", help="Transcript directory to search")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--title", help="Only sessions whose title contains this")
+    parser.add_argument("--kind", choices=KINDS)
+    parser.add_argument("--after", type=parse_timestamp, help="Only lines stamped [HH:MM:SS] at or after this")
+    parser.add_argument("--before", type=parse_timestamp, help="Only lines stamped [HH:MM:SS] at or before this")
+    parser.add_argument("--reindex", action="store_true", help="Rebuild the index from scratch first")
+    args = parser.parse_args(argv)
+
+    if args.reindex and os.path.exists(os.path.join(args.out, INDEX_NAME)):
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(os.path.join(args.out, INDEX_NAME + suffix)):
+                os.remove(os.path.join(args.out, INDEX_NAME + suffix))
+    index = SearchIndex(args.out)
+    index.sync()
+    started = time.perf_counter()
+    try:
+        results = index.search(" ".join(args.query), limit=args.limit, title=args.title,
+                               after=args.after, before=args.before, kind=args.kind)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    elapsed = (time.perf_counter() - started) * 1000
+    for result in results:
+        print(format_result(result))
+    print(f"{len(results)} results in {elapsed:.1f} ms ({index.stats()['lines']} lines indexed)", file=sys.stderr)
+    index.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,207 @@
+import glob
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+FSYNC_POLICIES = ("always", "interval", "never")
+_CLOSE = object()
+
+def safe_filename(title):
+    return re.sub(r'[^\w\-_\. ]', '_', title.strip() or "Untitled")  # Replace invalid filename characters
+
+def unique_path(output_dir, base_name, extensions=(".txt", ".jsonl", "_audio")):
+    # Every extension has to be free so the transcript and its sidecar keep the same name
+    candidate, counter = base_name, 1
+    while any(os.path.exists(os.path.join(output_dir, candidate + ext)) for ext in extensions):
+        candidate = f"{base_name}_{counter}"
+        counter += 1
+    return os.path.join(output_dir, candidate)
+
+class SessionLock:
+    # An OS lock on temp_<stamp>.lock, held while a process writes that session's temp files.
+    # The OS drops it when the process dies, which is exactly when recovery should step in.
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def acquire(self):
+        lock_file = open(self.path, "a+")
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            lock_file.close()
+            return False
+        self._file = lock_file
+        return True
+
+    def release(self):
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+class TranscriptWriter:
+    def __init__(self, output_dir, timestamp, flush_interval=1.0, fsync="interval", fsync_interval=10.0, on_flush=None):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Invalid fsync policy: {fsync}")
+        self.output_dir = output_dir
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.on_flush = on_flush
+        self.temp_path = os.path.join(output_dir, f"temp_{timestamp}.txt")
+        self.temp_jsonl_path = os.path.join(output_dir, f"temp_{timestamp}.jsonl")
+        # Keeps recover_orphans in another app or CLI on the same directory away from our files
+        self.session_lock = SessionLock(os.path.join(output_dir, f"temp_{timestamp}.lock"))
+        if not self.session_lock.acquire():
+            raise RuntimeError(f"Session temp_{timestamp} is already being recorded by another process")
+        self.lines_received = 0
+        self.lines_written = 0
+        self.flushes = 0
+        self.error = None  # Why the writer thread died, if it did; raised by the next write or close
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="transcript-writer", daemon=True)
+        self._thread.start()
+
+    def __call__(self, sentence, line):
+        # Pipeline sink: only enqueue, the file work happens on the writer thread
+        if self.error is not None:
+            self._raise_error()
+        self.lines_received += 1
+        self._queue.put((sentence, line))
+
+    def _raise_error(self):
+        lost = self.lines_received - self.lines_written
+        raise RuntimeError(f"Writing {self.temp_path} failed ({self.error}); {lost} lines were not saved") from self.error
+
+    def _run(self):
+        try:
+            self._write_lines()
+        except Exception as e:
+            # Nothing drains the queue any more, so do not let the session carry on as if it were saved
+            logging.error(f"Transcript writer for {self.temp_path} stopped: {e}")
+            self.error = e
+
+    def _write_lines(self):
+        with open(self.temp_path, "a", encoding="utf-8") as text, open(self.temp_jsonl_path, "a", encoding="utf-8") as sidecar:
+            last_flush = last_fsync = time.monotonic()
+            pending = False
+            closing = False
+            while not closing:
+                try:
+                    batch = [self._queue.get(timeout=self.flush_interval)]
+                except queue.Empty:
+                    batch = []
+                while True:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+                for item in batch:
+                    if item is _CLOSE:
+                        closing = True
+                        continue
+                    sentence, line = item
+                    # Encoded first, so a line that cannot be written lands in neither file
+                    record = json.dumps(dict(sentence, line=line))
+                    text.write(line + "\n")
+                    sidecar.write(record + "\n")
+                    self.lines_written += 1
+                    pending = True
+
+                now = time.monotonic()
+                if pending and (closing or now - last_flush >= self.flush_interval):
+                    text.flush()
+                    sidecar.flush()
+                    last_flush = now
+                    pending = False
+                    self.flushes += 1
+                    if closing or self.fsync == "always" or (self.fsync == "interval" and now - last_fsync >= self.fsync_interval):
+                        os.fsync(text.fileno())
+                        os.fsync(sidecar.fileno())
+                        last_fsync = now
+                    if self.on_flush:
+                        try:
+                            self.on_flush(self.temp_path)
+                        except Exception as e:
+                            # The hook (e.g. the search index) must never cost us transcript lines
+                            logging.error(f"on_flush failed for {self.temp_path}: {e}")
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(_CLOSE)
+            self._thread.join()
+        if self.error is not None:
+            # The temp files keep what reached them and the lock is released, so recover_orphans picks them up
+            self._raise_error()
+
+    def finalize(self, title):
+        try:
+            self.close()
+            if not self.lines_written:
+                for path in (self.temp_path, self.temp_jsonl_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+                return None
+            base_path = unique_path(self.output_dir, safe_filename(title))
+            os.replace(self.temp_jsonl_path, base_path + ".jsonl")
+            os.replace(self.temp_path, base_path + ".txt")
+            return base_path + ".txt"
+        finally:
+            self.session_lock.release()
+
+def recover_orphans(output_dir):
+    # temp_ files left behind by a crash: keep everything that made it to disk under a real name
+    recovered = []
+    for temp_path in sorted(glob.glob(os.path.join(output_dir, "temp_*.txt"))):
+        stamp = os.path.basename(temp_path)[len("temp_"):-len(".txt")]
+        temp_jsonl_path = temp_path[:-len(".txt")] + ".jsonl"
+        temp_audio_dir = temp_path[:-len(".txt")] + "_audio"
+        lock = SessionLock(temp_path[:-len(".txt")] + ".lock")
+        if not lock.acquire():
+            continue  # Still being recorded by another app or CLI on this directory
+        try:
+            if os.path.getsize(temp_path) == 0 and not os.path.isdir(temp_audio_dir):
+                os.remove(temp_path)
+                if os.path.exists(temp_jsonl_path):
+                    os.remove(temp_jsonl_path)
+                continue
+
+            base_path = unique_path(output_dir, f"Recovered_{stamp}")
+            if os.path.exists(temp_jsonl_path):
+                _truncate_partial_line(temp_jsonl_path)
+                os.replace(temp_jsonl_path, base_path + ".jsonl")
+            if os.path.isdir(temp_audio_dir):
+                os.replace(temp_audio_dir, base_path + "_audio")
+            os.replace(temp_path, base_path + ".txt")
+            logging.info(f"Recovered orphaned transcript {temp_path} -> {base_path}.txt")
+            recovered.append(base_path + ".txt")
+        finally:
+            lock.release()
+    return recovered
+
+def _truncate_partial_line(path):
+    with open(path, "rb+") as f:
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            f.truncate(end)
@@ -1,36 +1,192 @@
+import difflib
 import json
 import re
-from datetime import datetime
+import time
+from collections import deque
+from modules.metrics import REGISTRY
+
+SENTENCE_END = re.compile(r'[.!?]["\')\]]*$')
+WORD = re.compile(r"[\w']+")
+
+def format_timestamp(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+def parse_timestamp(value):
+    # Seconds, MM:SS or HH:MM:SS, as in the [HH:MM:SS] stamps of transcript lines
+    seconds = 0.0
+    for part in value.split(":"):
+        seconds = seconds * 60 + float(part)
+    return seconds
 
 class TranscriptionProcessor:
-    def __init__(self):
-        self.current_sentence = ""
-        self.last_written_sentence = ""
+    def __init__(self, channel_labels=None, dedupe_window=8, metrics=None, echo_seconds=2.0, echo_similarity=0.8, echo_min_words=3,
+                 echo_channel=None):
+        self.channel_labels = channel_labels or []
+        # The channel that hears the others played back (the mic next to a loopback); only its
+        # copy of a sentence is ever dropped as echo
+        self.echo_channel = echo_channel
+        self.dedupe_window = dedupe_window
+        self.echo_seconds = echo_seconds
+        self.echo_similarity = echo_similarity
+        self.echo_min_words = echo_min_words
+        self.partials = {}
+        self.sentences_committed = 0
+        self._pending_words = {}
+        self._recent = {}
+        self._first_interim = {}
+        self._finalized = {}  # channel -> end of its last final result
+        self._channels = 1
+        self._held = deque()  # (sentence, tokens) from the echo channel, not yet checked
+        metrics = metrics or REGISTRY.scope()
+        self._process_seconds = metrics.histogram("processor_message_seconds", "Time spent segmenting each upstream message")
+        self._final_lag = metrics.histogram("processor_interim_to_final_seconds", "Wall time from the first interim of an utterance to its final")
+        self._sentences_counter = metrics.counter("processor_sentences_total", "Sentences committed")
+        self._duplicates_counter = metrics.counter("processor_duplicates_dropped_total", "Sentences dropped as repeats of recent ones")
+        self._echoes_counter = metrics.counter("processor_echoes_dropped_total", "Sentences dropped as another channel's words heard again")
 
     def process_message(self, message):
-        data = json.loads(message)
-        if 'channel' in data:
-            transcript = data['channel']['alternatives'][0]['transcript']
-            if transcript:
-                return self.process_transcript(transcript)
-        return ""
+        return "\n".join(self.format_sentence(sentence) for sentence in self.process(message))
+
+    def process(self, message):
+        started = time.monotonic()
+        sentences = self._process(message, started)
+        self._process_seconds.observe(time.monotonic() - started)
+        return sentences
+
+    def _process(self, message, received):
+        # DeepgramSession hands over already-decoded messages
+        data = json.loads(message) if isinstance(message, (str, bytes)) else message
+        if 'channel' not in data:
+            return []
+        alternative = data['channel']['alternatives'][0]
+        # Multichannel responses carry [channel, total_channels]
+        channel_index = data.get('channel_index', [0, 1])
+        channel = channel_index[0]
+        if len(channel_index) > 1:
+            self._channels = channel_index[1]
+
+        if not data.get('is_final'):
+            # Interim hypotheses are revised until the final arrives; replace, never append
+            self.partials[channel] = alternative['transcript']
+            self._first_interim.setdefault(channel, received)
+            return []
+
+        self.partials[channel] = ""
+        if channel in self._first_interim:
+            self._final_lag.observe(received - self._first_interim.pop(channel))
+        sentences = self._segment(channel, alternative.get('words', []))
+        if data.get('speech_final') and self._pending_words.get(channel):
+            # End of utterance: commit the trailing words even without punctuation
+            sentences.append(self._commit(channel, self._pending_words.pop(channel)))
+        self._finalized[channel] = data.get('start', 0.0) + data.get('duration', 0.0)
+        return [sentence for sentence in sentences if sentence is not None] + self._release()
+
+    def _segment(self, channel, words):
+        # Only the words of this final result are scanned; committed text is never revisited
+        pending = self._pending_words.get(channel, [])
+        sentences = []
+        for word in words:
+            pending.append(word)
+            if SENTENCE_END.search(word.get('punctuated_word', word['word'])):
+                sentences.append(self._commit(channel, pending))
+                pending = []
+        self._pending_words[channel] = pending
+        return sentences
 
-    def process_transcript(self, transcript):
-        combined = self.current_sentence + " " + transcript
-        sentences = re.split(r'(?<=[.!?])\s+', combined)
-        
-        if len(sentences) > 1:
-            completed_sentences = sentences[:-1]
-            self.current_sentence = sentences[-1]
-            
-            new_content = ""
-            for sentence in completed_sentences:
-                if sentence and sentence != self.last_written_sentence:
-                    current_time = datetime.now().strftime("%H:%M:%S")
-                    new_content += f"[{current_time}] {sentence}\n"
-                    self.last_written_sentence = sentence
-            
-            return new_content.strip()
-        else:
-            self.current_sentence = combined
-            return ""
\ No newline at end of file
+    def _commit(self, channel, words):
+        text = " ".join(word.get('punctuated_word', word['word']) for word in words)
+        start, end = words[0]['start'], words[-1]['end']
+
+        recent = self._recent.setdefault(channel, deque(maxlen=self.dedupe_window))
+        key = text.lower()
+        for previous_key, _, _, previous_end in recent:
+            if key == previous_key and start < previous_end:
+                self._duplicates_counter.inc()
+                return None  # Same words over the same stretch of audio
+        tokens = WORD.findall(key)
+        recent.append((key, tokens, start, end))
+        sentence = {
+            "channel": channel,
+            "start": start,
+            "end": end,
+            "text": text,
+            "confidence": sum(word.get('confidence', 0.0) for word in words) / len(words),
+            "words": words,
+        }
+        if channel == self.echo_channel and self._channels > 1:
+            # The loopback's copy of the same words may still be on its way; wait for it
+            self._held.append((sentence, tokens))
+            return None
+        return self._count(sentence)
+
+    def _count(self, sentence):
+        self.sentences_committed += 1
+        self._sentences_counter.inc()
+        return sentence
+
+    def _release(self, flush=False):
+        # Held sentences go out in order once every other channel is final past their end
+        sentences = []
+        while self._held:
+            sentence, tokens = self._held[0]
+            others = [channel for channel in range(self._channels) if channel != self.echo_channel]
+            if not flush and any(self._finalized.get(other, 0.0) < sentence["end"] for other in others):
+                break
+            self._held.popleft()
+            if self._is_echo(sentence["channel"], tokens, sentence["start"], sentence["end"]):
+                self._echoes_counter.inc()
+                continue
+            sentences.append(self._count(sentence))
+        return sentences
+
+    def flush(self):
+        # End of stream: words still waiting for punctuation will not get any, and nothing
+        # more will arrive to check the held sentences against
+        sentences = [self._commit(channel, words) for channel, words in sorted(self._pending_words.items()) if words]
+        self._pending_words = {}
+        return [sentence for sentence in sentences if sentence is not None] + self._release(flush=True)
+
+    def _is_echo(self, channel, tokens, start, end):
+        # Backstop for echo the canceller left in: the same sentence on another channel at
+        # nearly the same time, including words there that do not make a sentence yet. Short
+        # replies ("Yes.") are left alone, since two people really do say them at once.
+        if len(tokens) < self.echo_min_words:
+            return False
+        candidates = [(other_tokens, other_start, other_end)
+                      for other, recent in self._recent.items() if other != channel
+                      for _, other_tokens, other_start, other_end in recent]
+        for other, pending in self._pending_words.items():
+            if other == channel:
+                continue
+            nearby = [word for word in pending if start - self.echo_seconds <= word['start'] <= end + self.echo_seconds]
+            if nearby:
+                text = " ".join(word.get('punctuated_word', word['word']) for word in nearby).lower()
+                candidates.append((WORD.findall(text), nearby[0]['start'], nearby[-1]['end']))
+        for other_tokens, other_start, other_end in candidates:
+            if start > other_end + self.echo_seconds or other_start > end + self.echo_seconds:
+                continue
+            if difflib.SequenceMatcher(None, tokens, other_tokens).ratio() >= self.echo_similarity:
+                return True
+        return False
+
+    def format_sentence(self, sentence):
+        return f"[{format_timestamp(sentence['start'])}] {self.label(sentence['channel'])}{sentence['text']}"
+
+    def partial_text(self):
+        lines = []
+        held = {}
+        for sentence, _ in self._held:
+            held.setdefault(sentence["channel"], []).append(sentence["text"])
+        for channel in sorted(set(self._pending_words) | set(self.partials) | set(held)):
+            pending = " ".join(word.get('punctuated_word', word['word']) for word in self._pending_words.get(channel, []))
+            text = " ".join(part for part in (*held.get(channel, []), pending, self.partials.get(channel, "")) if part)
+            if text:
+                lines.append(f"{self.label(channel)}{text}")
+        return "\n".join(lines)
+
+    def label(self, channel):
+        if channel < len(self.channel_labels):
+            return f"[{self.channel_labels[channel]}] "
+        return ""
@@ -0,0 +1,52 @@
+import threading
+import time
+from modules.metrics import REGISTRY
+
+class UpdateQueue:
+    def __init__(self, metrics=None):
+        self._lock = threading.Lock()
+        self._lines = []
+        self._first_line_at = None
+        self._partial = None
+        self._events = []
+        self.word_count = 0
+        metrics = metrics or REGISTRY.scope()
+        metrics.gauge("gui_pending_lines", "Committed lines waiting for the next frame", fn=lambda: len(self._lines))
+        self._wait = metrics.histogram("gui_queue_wait_seconds", "How long the oldest line in a frame waited to be drawn")
+
+    def __call__(self, sentence, line):
+        # Pipeline sink, called from the asyncio thread; the GUI picks lines up once per frame
+        words = len(sentence["text"].split())
+        with self._lock:
+            if not self._lines:
+                self._first_line_at = time.monotonic()
+            self._lines.append(line)
+            self.word_count += words
+
+    def set_partial(self, text):
+        with self._lock:
+            self._partial = text  # Only the newest partial line is worth drawing
+
+    def post(self, event, payload=None):
+        with self._lock:
+            self._events.append((event, payload))
+
+    def drain(self):
+        with self._lock:
+            lines, self._lines = self._lines, []
+            partial, self._partial = self._partial, None
+            events, self._events = self._events, []
+            first_line_at = self._first_line_at
+        if lines:
+            self._wait.observe(time.monotonic() - first_line_at)
+        return lines, partial, events
+
+    def reset_word_count(self):
+        with self._lock:
+            self.word_count = 0
+
+    def reset(self):
+        # A new session's view; events (e.g. the last session's post-processing) still get delivered
+        with self._lock:
+            self._lines, self._partial = [], None
+            self.word_count = 0
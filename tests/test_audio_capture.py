@@ -0,0 +1,111 @@
+import asyncio
+import time
+import numpy as np
+import pytest
+from modules.audio_capture import DEFAULT_DEVICE_RATE, AudioCapture, Resampler, VoiceActivityDetector, native_rate
+from modules.deepgram_client import DeepgramClient
+from modules.metrics import MetricsRegistry
+
+FRAME = 1024
+RATE = 16000
+
+class ListRecorder:
+    # Hands over the whole signal at once, like a warm recorder's pre-roll, then silence
+    def __init__(self, signal):
+        self.signal = signal
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def record(self, numframes):
+        if self.signal is not None:
+            signal, self.signal = self.signal, None
+            return signal
+        time.sleep(0.02)
+        return np.zeros((numframes, 1), dtype=np.float32)
+
+class NullWebsocket:
+    async def send(self, data):
+        pass
+
+def test_vad_gaps_map_stream_time_back_to_capture_time():
+    rng = np.random.default_rng(0)
+    speech = lambda frames: rng.uniform(-0.3, 0.3, (frames * FRAME, 1)).astype(np.float32)
+    silence = lambda frames: np.zeros((frames * FRAME, 1), dtype=np.float32)
+    # Speech in frames 0-15 and 64-79; the VAD keeps 10 frames of hangover and 5 of pre-roll
+    signal = np.concatenate([speech(16), silence(48), speech(16), silence(16)])
+
+    metrics = MetricsRegistry().scope()
+    vad = VoiceActivityDetector(RATE, FRAME, hangover_ms=600, preroll_ms=300)
+    capture = AudioCapture(RATE, FRAME, vad=vad, metrics=metrics, device_rate=RATE)
+    capture.sources = [("mic", lambda: ListRecorder(signal))]
+    client = DeepgramClient("key", metrics=metrics)
+
+    async def main():
+        task = asyncio.create_task(capture.capture_and_send_audio(NullWebsocket(), client))
+        sent_frames = 26 + 5 + 16 + 10
+        while client.bytes_sent < sent_frames * FRAME * 2:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(asyncio.wait_for(main(), 10))
+    seconds = lambda frames: frames * FRAME / RATE
+    # Stream frame -> capture frame: the first speech and its hangover are untouched,
+    # the 33 frames of silence before the second pre-roll are added back after them
+    for stream_frame, capture_frame in [(0, 0), (25.5, 25.5), (31.5, 64.5), (46.5, 79.5)]:
+        assert abs(client.capture_time(seconds(stream_frame)) - seconds(capture_frame)) < 1e-6
+
+class SlowRecorder(ListRecorder):
+    # A device that takes its time over every block
+    def record(self, numframes):
+        time.sleep(0.5)
+        return np.zeros((numframes, 1), dtype=np.float32)
+
+def test_stopping_capture_does_not_block_the_event_loop():
+    metrics = MetricsRegistry().scope()
+    capture = AudioCapture(RATE, FRAME, metrics=metrics, device_rate=RATE)
+    capture.sources = [("mic", lambda: SlowRecorder(None))]
+    client = DeepgramClient("key", metrics=metrics)
+
+    async def main():
+        task = asyncio.create_task(capture.capture_and_send_audio(NullWebsocket(), client))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        # While the capture thread finishes its block, the loop keeps running other work
+        ticks = 0
+        while not task.done():
+            await asyncio.sleep(0.01)
+            ticks += 1
+        await asyncio.gather(task, return_exceptions=True)
+        return ticks
+
+    assert asyncio.run(asyncio.wait_for(main(), 10)) >= 10
+    assert capture._threads == []
+
+def resample_tone(in_rate, frequency, seconds=1.0, block=3001):
+    # Fed in odd-sized blocks so the filter state has to carry across block edges
+    resampler = Resampler(in_rate, RATE)
+    tone = 0.5 * np.sin(2 * np.pi * frequency * np.arange(int(in_rate * seconds)) / in_rate)[:, None]
+    return np.concatenate([resampler.process(tone[i:i + block]) for i in range(0, len(tone), block)])
+
+@pytest.mark.parametrize("in_rate", [48000, 44100])
+def test_resampler_keeps_speech_band_in_place(in_rate):
+    out = resample_tone(in_rate, 1000)
+    expected = 0.5 * np.sin(2 * np.pi * 1000 * np.arange(len(out)) / RATE)
+    # Past the filter's start-up, the tone comes out at full level and on the original time grid
+    assert np.max(np.abs(out[1000:] - expected[1000:])) < 0.01
+
+@pytest.mark.parametrize("in_rate", [48000, 44100])
+@pytest.mark.parametrize("frequency", [10000, 12000, 20000])
+def test_resampler_does_not_fold_high_frequencies_back(in_rate, frequency):
+    out = resample_tone(in_rate, frequency)
+    level = np.sqrt(np.mean(np.square(out[1000:]))) / (0.5 / np.sqrt(2))
+    assert 20 * np.log10(level) < -50
+
+def test_native_rate_falls_back_for_unknown_devices():
+    assert native_rate(object()) == DEFAULT_DEVICE_RATE
+    assert native_rate(object(), default=44100) == 44100
@@ -0,0 +1,34 @@
+import wave
+import numpy as np
+import pytest
+from benchmarks.fake_deepgram import start_prerecorded_server
+from modules import batch
+
+@pytest.fixture
+def server():
+    server = start_prerecorded_server(port=0)
+    yield f"http://127.0.0.1:{server.server_address[1]}/v1/listen"
+    server.shutdown()
+    server.server_close()
+
+def stereo_wav(path, seconds=4, rate=16000):
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(2)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(np.zeros((seconds * rate, 2), dtype=np.int16).tobytes())
+    return str(path)
+
+def transcribe(server, tmp_path, monkeypatch, *flags):
+    monkeypatch.setenv("DEEPGRAM_API_KEY", "key")
+    path = stereo_wav(tmp_path / "call.wav")
+    assert batch.main([path, "--out", str(tmp_path / "out"), "--base-url", server, *flags]) == 0
+    return (tmp_path / "out" / "call.txt").read_text(encoding="utf-8").splitlines()
+
+def test_multichannel_files_are_mixed_unless_asked(server, tmp_path, monkeypatch):
+    lines = transcribe(server, tmp_path, monkeypatch)
+    assert lines and not any("[Ch" in line for line in lines)
+
+def test_multichannel_flag_labels_each_channel(server, tmp_path, monkeypatch):
+    lines = transcribe(server, tmp_path, monkeypatch, "--multichannel")
+    assert any("[Ch1]" in line for line in lines) and any("[Ch2]" in line for line in lines)
@@ -0,0 +1,9 @@
+from modules import cli
+
+def test_summary_needs_openai_key(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)  # No .env to load from
+    monkeypatch.setenv("DEEPGRAM_API_KEY", "key")
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    assert cli.main(["--summary-every", "5", "--out", str(tmp_path / "out")]) == 1
+    assert "OPENAI_API_KEY" in capsys.readouterr().err
+    assert not (tmp_path / "out").exists()
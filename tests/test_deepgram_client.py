@@ -0,0 +1,114 @@
+import asyncio
+import http
+import websockets
+from benchmarks.fake_deepgram import FakeDeepgramServer
+from modules.deepgram_client import DeepgramClient
+from modules.metrics import MetricsRegistry
+
+CHUNK = 3200  # 100 ms of 16 kHz mono linear16
+
+async def stream(session, seconds):
+    finals = []
+
+    async def receive():
+        async for data in session:
+            if data.get("type") == "Results" and data.get("is_final"):
+                finals.append((data["start"], data["start"] + data["duration"]))
+
+    receiver = asyncio.create_task(receive())
+    for _ in range(int(seconds * 10)):
+        await session.send(b"\x00" * CHUNK)
+        await asyncio.sleep(0.01)
+    await session.close()
+    await receiver
+    return finals
+
+def run_with_server(handler, test):
+    async def main():
+        async with websockets.serve(handler, "127.0.0.1", 0, max_size=None) as server:
+            port = server.sockets[0].getsockname()[1]
+            client = DeepgramClient("key", base_url=f"ws://127.0.0.1:{port}/v1/listen", metrics=MetricsRegistry().scope())
+            return await asyncio.wait_for(test(client), 20)
+    return asyncio.run(main())
+
+def test_reconnect_replays_without_losing_or_repeating_audio():
+    fake = FakeDeepgramServer(delay=0.01, final_every=1.0)
+
+    async def flaky(websocket, path=None):
+        if fake.connections:
+            return await fake.handle(websocket, path)
+        handler = asyncio.create_task(fake.handle(websocket, path))
+        while fake.bytes_received < 2.5 * 32000:
+            await asyncio.sleep(0.005)
+        websocket.transport.abort()  # Drop mid-stream, as a network outage would
+        await asyncio.gather(handler, return_exceptions=True)
+
+    async def test(client):
+        session = await client.session(min_backoff=0.01, max_backoff=0.05).open()
+        return session, await stream(session, 6.0)
+
+    session, finals = run_with_server(flaky, test)
+    assert session.reconnects == 1
+    assert session.bytes_replayed > 0
+    assert finals[0][0] == 0.0
+    for (_, end), (start, _) in zip(finals, finals[1:]):
+        assert abs(start - end) < 0.02  # Back to back: nothing dropped, nothing said twice
+    assert finals[-1][1] == 6.0
+
+def test_permanent_rejection_fails_fast():
+    fake = FakeDeepgramServer(delay=0.01)
+    attempts = []
+
+    async def reject_after_first(path, headers):
+        if fake.connections:
+            attempts.append(path)
+            return http.HTTPStatus.UNAUTHORIZED, [], b"invalid credentials"
+
+    async def drop(websocket, path=None):
+        fake.connections += 1
+        websocket.transport.abort()
+
+    async def test(client):
+        session = await client.session(min_backoff=0.01, max_backoff=0.05).open()
+        try:
+            async for _ in session:
+                pass
+        except websockets.InvalidStatusCode as e:
+            assert e.status_code == 401
+        else:
+            raise AssertionError("iteration ended without the rejection")
+        try:
+            await session.send(b"\x00" * CHUNK)
+        except websockets.InvalidStatusCode:
+            pass
+        else:
+            raise AssertionError("send() kept going after the rejection")
+        await session.close()
+
+    async def main():
+        async with websockets.serve(drop, "127.0.0.1", 0, process_request=reject_after_first) as server:
+            port = server.sockets[0].getsockname()[1]
+            client = DeepgramClient("key", base_url=f"ws://127.0.0.1:{port}/v1/listen", metrics=MetricsRegistry().scope())
+            await asyncio.wait_for(test(client), 10)
+
+    asyncio.run(main())
+    assert len(attempts) == 1
+
+def test_quiet_session_sends_keepalives_on_its_own():
+    received = []
+
+    async def record_messages(websocket, path=None):
+        async for message in websocket:
+            received.append(message)
+
+    async def test(client):
+        session = await client.session(keepalive_seconds=0.2).open()
+        await session.send(b"\x00" * CHUNK)
+        await asyncio.sleep(0.75)  # Silence, e.g. the VAD holding everything back
+        await session.close()
+        return session
+
+    run_with_server(record_messages, test)
+    keepalives = [message for message in received if isinstance(message, str) and "KeepAlive" in message]
+    # One per quiet interval, from the session alone
+    assert 2 <= len(keepalives) <= 4
@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+from benchmarks.synthetic_audio import SyntheticMicrophone
+from modules.audio_capture import EchoCanceller
+
+RATE = 16000
+CHUNK = 1024
+
+def room(far, delay_seconds=0.12, gain=0.3):
+    # A direct path and a few decaying reflections behind a bulk delay
+    delay = int(delay_seconds * RATE)
+    response = np.zeros(delay + 400)
+    response[delay] = gain
+    for tap, scale in ((delay + 37, 0.5), (delay + 150, 0.25), (delay + 390, 0.1)):
+        response[tap] = gain * scale
+    return np.convolve(far, response)[:len(far)]
+
+def run(canceller, mic, far):
+    mic = np.rint(mic).astype(np.int16).reshape(-1, 1)
+    far = np.rint(far).astype(np.int16).reshape(-1, 1)
+    out = mic.copy()
+    for start in range(0, len(mic) - CHUNK + 1, CHUNK):
+        canceller.process(out[start:start + CHUNK, 0], far[start:start + CHUNK, 0])
+    return mic[:, 0].astype(np.float64), out[:, 0].astype(np.float64)
+
+def energy(x):
+    return float(x @ x)
+
+def removed_db(mic, out, seconds=2):
+    last = slice(-seconds * RATE, None)
+    return 10 * np.log10(energy(mic[last]) / energy(out[last]))
+
+def tones(seconds=8):
+    t = np.arange(seconds * RATE) / RATE
+    return 8000 * (np.sin(2 * np.pi * 440 * t) + np.sin(2 * np.pi * 660 * t))
+
+def voice(seconds=8):
+    return SyntheticMicrophone(channels=1).generate(0, seconds * RATE, RATE)[:, 0] * 32767
+
+def music(seconds=8):
+    # A chord with harmonics that changes every half second
+    rng = np.random.default_rng(3)
+    t = np.arange(seconds * RATE) / RATE
+    out = np.zeros(len(t))
+    for start in range(0, len(t), RATE // 2):
+        part = slice(start, start + RATE // 2)
+        root = rng.choice([196, 220, 247, 262, 294, 330])
+        for note in (root, root * 1.25, root * 1.5):
+            for harmonic in range(1, 5):
+                out[part] += 2000 / harmonic * np.sin(2 * np.pi * note * harmonic * t[part] + rng.uniform(0, 6))
+    return out
+
+@pytest.mark.parametrize("far, delay, gain, expected_db", [
+    (tones(), 0.0, 0.3, 30),
+    (tones(), 0.12, 0.3, 30),
+    (voice(), 0.12, 0.6, 10),
+    (voice(), 0.12, 1.0, 10),
+    (music(12), 0.12, 0.6, 15),
+    (music(12), 0.0, 0.6, 15),
+])
+def test_cancels_narrowband_and_correlated_echo(far, delay, gain, expected_db):
+    canceller = EchoCanceller(RATE)
+    mic, out = run(canceller, room(far, delay, gain), far)
+    assert removed_db(mic, out) > expected_db
+    assert np.abs(out).max() < 32767  # No runaway filter clipping the channel
+    assert canceller.echo_return_loss_enhancement > 0
+    assert canceller.blocks_held < 0.2 * len(far) / canceller.block_size
+
+def test_never_louder_than_the_mic():
+    rng = np.random.default_rng(4)
+    far = tones()
+    canceller = EchoCanceller(RATE)
+    # Echo of the reference through a path that keeps changing, which no filter can follow
+    mic = room(far, 0.05, 0.3) * (1 + np.sin(2 * np.pi * 3 * np.arange(len(far)) / RATE)) + rng.normal(0, 100, len(far))
+    mic, out = run(canceller, mic, far)
+    for start in range(0, len(mic), canceller.block_size):
+        block = slice(start, start + canceller.block_size)
+        assert energy(out[block]) <= energy(mic[block]) * 1.01 + canceller.block_size
+
+def test_cancels_a_delayed_echo():
+    rng = np.random.default_rng(1)
+    far = rng.normal(0, 3000, 8 * RATE)
+    canceller = EchoCanceller(RATE)
+    mic, out = run(canceller, room(far) + rng.normal(0, 3, len(far)), far)
+    assert abs(canceller.delay - int(0.12 * RATE)) <= 2
+    assert removed_db(mic, out) > 30
+    assert canceller.echo_return_loss_enhancement > 15  # Decayed sums still remember convergence
+
+def test_keeps_the_near_talker_during_double_talk():
+    rng = np.random.default_rng(2)
+    far = rng.normal(0, 3000, 8 * RATE)
+    near = np.zeros(len(far))
+    near[6 * RATE:7 * RATE] = rng.normal(0, 3000, RATE)  # Someone speaks over the playback
+    canceller = EchoCanceller(RATE)
+    _, out = run(canceller, room(far) + near, far)
+    talk = slice(6 * RATE, 7 * RATE)
+    residual = out[talk] - near[talk]
+    assert 10 * np.log10(energy(near[talk]) / energy(residual)) > 15
+    assert canceller.blocks_held > 0
@@ -0,0 +1,92 @@
+import asyncio
+import json
+import websockets
+from benchmarks.fake_deepgram import FakeDeepgramServer
+from modules.gateway import SessionPool, TranscriptionGateway
+from modules.metrics import MetricsRegistry
+
+CHUNK = 3200  # 100 ms of 16 kHz mono linear16
+
+async def record(url, seconds, config=None):
+    # One recorder session through the gateway -> (sentences, close code)
+    sentences = []
+    async with websockets.connect(url) as websocket:
+        try:
+            await websocket.send(json.dumps(config or {"sample_rate": 16000, "channels": 1}))
+            for _ in range(int(seconds * 10)):
+                await websocket.send(b"\x00" * CHUNK)
+                await asyncio.sleep(0.005)
+            await websocket.send(json.dumps({"type": "CloseStream"}))
+            async for message in websocket:
+                data = json.loads(message)
+                if data["type"] == "sentence":
+                    sentences.append(data)
+        except websockets.ConnectionClosed:
+            pass  # The gateway hung up first, e.g. to refuse the format
+    return sentences, websocket.close_code
+
+async def wait_for_warm(pool, count=1):
+    while pool.stats()["warm"] < count:
+        await asyncio.sleep(0.01)
+
+def run_gateway(test, size=1):
+    fake = FakeDeepgramServer(delay=0.01, final_every=1.0)
+
+    async def main():
+        async with websockets.serve(fake.handle, "127.0.0.1", 0, max_size=None) as upstream:
+            upstream_port = upstream.sockets[0].getsockname()[1]
+            pool = SessionPool("key", size=size, base_url=f"ws://127.0.0.1:{upstream_port}/v1/listen",
+                               metrics=MetricsRegistry().scope())
+            gateway = TranscriptionGateway(pool, max_sessions=2)
+            try:
+                async with websockets.serve(gateway.handle, "127.0.0.1", 0) as server:
+                    port = server.sockets[0].getsockname()[1]
+                    await asyncio.wait_for(test(pool, f"ws://127.0.0.1:{port}"), 20)
+            finally:
+                await pool.close()
+
+    asyncio.run(main())
+    return fake
+
+def test_first_session_misses_and_the_next_one_gets_the_warm_connection():
+    async def test(pool, url):
+        # Nothing was warmed up front, so the first recorder pays for the handshake
+        sentences, code = await record(url, 3.0)
+        assert (pool.hits, pool.misses) == (0, 1)
+        assert code == 1000
+        # The last words have no full stop; ending the stream still commits them
+        assert [sentence["text"] for sentence in sentences] == ["So the quarterly numbers look good"]
+
+        # ...and the miss left a connection ready for the format it used
+        await wait_for_warm(pool)
+        sentences, code = await record(url, 3.0)
+        assert (pool.hits, pool.misses) == (1, 1)
+        assert code == 1000
+        assert sentences and sentences[0]["start"] == 0.0
+
+    fake = run_gateway(test)
+    assert fake.connections == 3  # Two sessions plus the refill after the hit
+
+def test_warm_connection_dropped_while_idle_is_not_handed_out():
+    async def test(pool, url):
+        await pool.start()
+        await wait_for_warm(pool)
+        pool._warm[(16000, 1)][0]._websocket.transport.abort()
+        while pool._warm[(16000, 1)][0].is_open:
+            await asyncio.sleep(0.01)
+
+        sentences, code = await record(url, 2.0)
+        assert (pool.hits, pool.misses) == (0, 1)
+        assert code == 1000 and sentences
+        assert pool.stats()["warm"] <= 1
+
+    run_gateway(test)
+
+def test_unsupported_format_is_refused_without_spending_a_connection():
+    async def test(pool, url):
+        sentences, code = await record(url, 0.5, {"sample_rate": 48000, "channels": 2})
+        assert code == 1003 and not sentences
+        assert (pool.hits, pool.misses) == (0, 0)
+
+    fake = run_gateway(test)
+    assert fake.connections == 0
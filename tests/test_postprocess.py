@@ -0,0 +1,101 @@
+import asyncio
+import time
+import pytest
+from benchmarks.fake_openai import start_completion_server
+from modules import postprocess
+from modules.postprocess import PostProcessor, chunk_transcript
+
+pytest.importorskip("openai")
+
+TRANSCRIPT = "".join(f"[00:{i // 60:02d}:{i % 60:02d}] This is line number {i} of a long meeting.\n" for i in range(60))
+
+@pytest.fixture
+def server():
+    server = start_completion_server(port=0)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(postprocess.random, "uniform", lambda low, high: 0.0)
+
+def processor(server, **kwargs):
+    kwargs.setdefault("requests_per_minute", None)
+    return PostProcessor("key", base_url=server.base_url, **kwargs)
+
+def test_summary_is_mapped_over_parts_and_reduced(server):
+    progress = []
+
+    async def main():
+        p = processor(server, summary_tokens=100)
+        return await p.summarize(TRANSCRIPT, on_progress=lambda *args: progress.append(args))
+
+    summary = asyncio.run(main())
+    parts = chunk_transcript(TRANSCRIPT, 100)
+    assert len(parts) > 1
+    assert summary == f"Combined {len(parts)} summaries."
+    assert len(server.requests) == len(parts) + 1
+    assert progress[-1] == ("summary", len(parts), len(parts))
+
+def test_process_file_writes_cleaned_text_and_caches_answers(server, tmp_path):
+    transcript = tmp_path / "Meeting.txt"
+    transcript.write_text(TRANSCRIPT, encoding="utf-8")
+
+    async def run():
+        p = processor(server, cache_dir=str(tmp_path / ".cache"), chunk_tokens=100, summary_tokens=100)
+        written = await p.process_file(str(transcript))
+        return p, written
+
+    first, (cleaned_file, summary_file) = asyncio.run(run())
+    with open(cleaned_file, encoding="utf-8") as f:
+        assert f.read().splitlines() == TRANSCRIPT.splitlines()
+    with open(summary_file, encoding="utf-8") as f:
+        assert f.read().startswith("Combined ")
+    requests = len(server.requests)
+    assert first.cache_hits == 0 and first.requests == requests
+
+    second, _ = asyncio.run(run())
+    assert len(server.requests) == requests  # Everything came from the cache
+    assert second.cache_hits == requests and second.requests == 0
+
+def test_requests_are_spaced_by_the_rate_limit(server):
+    sent = []
+
+    async def main():
+        p = processor(server, requests_per_minute=600, concurrency=4, chunk_tokens=100)
+        wait = p._rate_limiter.wait
+
+        async def timed_wait():
+            await wait()
+            sent.append(time.monotonic())
+
+        p._rate_limiter.wait = timed_wait
+        await p.clean(TRANSCRIPT)
+
+    asyncio.run(main())
+    assert len(sent) == len(server.requests) > 3
+    for index, started in enumerate(sent):
+        # 600/min is one every 0.1 s, even with four requests allowed in flight
+        assert started - sent[0] > 0.1 * index - 0.01
+    # Connection setup shifts single arrivals, but the server still never sees a burst
+    arrivals = sorted(arrived for arrived, _ in server.requests)
+    assert arrivals[-1] - arrivals[0] > 0.1 * (len(arrivals) - 1) - 0.15
+
+def test_rate_limited_requests_are_retried(server):
+    import openai
+    server.fail_first = 2
+
+    async def complete(retries):
+        return await processor(server, retries=retries).complete("system", "Please say hi")
+
+    with pytest.raises(openai.RateLimitError):
+        asyncio.run(complete(2))
+    assert len(server.requests) == 2  # No hidden retries inside the client
+    server.fail_first = len(server.requests) + 2
+    assert asyncio.run(complete(3)) == "Summary of 0 lines."
+    assert len(server.requests) == 5
+
+def test_retries_must_allow_one_attempt():
+    with pytest.raises(ValueError):
+        PostProcessor("key", retries=0)
@@ -0,0 +1,23 @@
+import numpy as np
+from modules.ring_buffer import RingBuffer
+
+def test_reads_back_in_order_across_the_wrap():
+    ring = RingBuffer(10)
+    ring.write(np.arange(7, dtype=np.int16))
+    assert ring.read(5)[:, 0].tolist() == [0, 1, 2, 3, 4]
+    ring.write(np.arange(7, 14, dtype=np.int16))  # Runs past the end of the storage
+    out = np.empty((16, 1), dtype=np.int16)
+    assert ring.read(16, out=out)[:, 0].tolist() == list(range(5, 14))
+    assert ring.available() == 0
+    assert ring.overruns == 0
+
+def test_overrun_drops_the_oldest_frames():
+    ring = RingBuffer(10)
+    ring.write(np.arange(8, dtype=np.int16))
+    ring.write(np.arange(8, 13, dtype=np.int16))
+    assert ring.overruns == 1
+    assert ring.frames_dropped == 3
+    assert ring.read(10)[:, 0].tolist() == list(range(3, 13))
+    ring.write(np.arange(25, dtype=np.int16))  # Longer than the whole buffer
+    assert ring.read(10)[:, 0].tolist() == list(range(15, 25))
+    assert ring.frames_dropped == 3 + 15
@@ -0,0 +1,49 @@
+import asyncio
+from modules.rolling_summary import RollingSummarizer
+
+class ScriptedPostProcessor:
+    # Answers complete() from a list; an exception in the list is raised instead
+    def __init__(self, answers):
+        self.answers = list(answers)
+        self.prompts = []
+
+    async def complete(self, system_prompt, user_prompt):
+        self.prompts.append(user_prompt)
+        answer = self.answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+def feed(summarizer, count, first=0):
+    for i in range(first, first + count):
+        summarizer({"text": f"line {i}"}, f"line {i}")
+
+def test_finalize_folds_in_the_last_lines():
+    postprocessor = ScriptedPostProcessor(["first two", "all three"])
+    updates = []
+
+    async def main():
+        summarizer = RollingSummarizer(postprocessor, every=2, on_update=updates.append)
+        feed(summarizer, 2)
+        await asyncio.sleep(0)  # Let the first update run
+        feed(summarizer, 1, first=2)
+        return summarizer, await summarizer.finalize()
+
+    summarizer, summary = asyncio.run(main())
+    assert summary == "all three" and updates == ["first two", "all three"]
+    assert summarizer.lines_behind == 0
+    assert "first two" in postprocessor.prompts[1] and "line 2" in postprocessor.prompts[1]
+
+def test_failed_final_update_is_reported_not_passed_off_as_complete():
+    postprocessor = ScriptedPostProcessor(["first two", RuntimeError("rate limited")])
+
+    async def main():
+        summarizer = RollingSummarizer(postprocessor, every=2)
+        feed(summarizer, 2)
+        await asyncio.sleep(0)  # Let the first update run
+        feed(summarizer, 1, first=2)
+        return summarizer, await summarizer.finalize()
+
+    summarizer, summary = asyncio.run(main())
+    assert summary == "first two"
+    assert summarizer.lines_behind == 1
@@ -0,0 +1,41 @@
+import os
+import subprocess
+import sys
+import pytest
+from modules.transcript_writer import TranscriptWriter, recover_orphans
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_recover_orphans_skips_live_sessions(tmp_path):
+    writer = TranscriptWriter(str(tmp_path), "live")
+    writer({"start": 0.0, "text": "hello"}, "hello")
+    (tmp_path / "temp_crashed.txt").write_text("left behind\n")
+
+    # Another app or CLI starting on the same directory
+    recovered = subprocess.run(
+        [sys.executable, "-c", f"from modules.transcript_writer import recover_orphans; print(recover_orphans({str(tmp_path)!r}))"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    ).stdout
+    assert "Recovered_crashed.txt" in recovered
+    assert "live" not in recovered
+
+    assert writer.finalize("Title") == str(tmp_path / "Title.txt")
+    assert sorted(os.listdir(tmp_path)) == ["Recovered_crashed.txt", "Title.jsonl", "Title.txt"]
+    assert recover_orphans(str(tmp_path)) == []
+
+def test_writer_failure_is_raised_instead_of_dropping_lines(tmp_path):
+    writer = TranscriptWriter(str(tmp_path), "failing")
+    writer({"start": 0.0, "text": "saved"}, "saved")
+    # Anything the writer thread cannot write (a full disk, here a sentence it cannot encode) stops it
+    writer({"start": 1.0, "text": object()}, "lost")
+    writer._thread.join(5)
+    assert isinstance(writer.error, TypeError)
+
+    with pytest.raises(RuntimeError, match="lines were not saved"):
+        writer({"start": 2.0, "text": "after"}, "after")
+    with pytest.raises(RuntimeError) as failure:
+        writer.finalize("Title")
+    assert failure.value.__cause__ is writer.error
+    # What did reach the disk is left for recovery, and the lock no longer guards it
+    assert recover_orphans(str(tmp_path)) == [str(tmp_path / "Recovered_failing.txt")]
+    assert (tmp_path / "Recovered_failing.txt").read_text() == "saved\n"
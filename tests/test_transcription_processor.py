@@ -0,0 +1,77 @@
+from modules.metrics import MetricsRegistry
+from modules.transcription_processor import TranscriptionProcessor
+
+def words(text, start, step=0.4):
+    return [
+        {"word": word.strip(".,?!").lower(), "punctuated_word": word, "start": start + i * step, "end": start + (i + 0.8) * step, "confidence": 0.9}
+        for i, word in enumerate(text.split())
+    ]
+
+def message(text, start, channel=0, is_final=True, speech_final=False, duration=None):
+    return {
+        "channel_index": [channel, 2],
+        "start": start,
+        "duration": duration if duration is not None else max(0.4 * len(text.split()), 0.1),
+        "is_final": is_final,
+        "speech_final": speech_final,
+        "channel": {"alternatives": [{"transcript": text, "words": words(text, start) if text else []}]},
+    }
+
+def processor(**kwargs):
+    return TranscriptionProcessor(metrics=MetricsRegistry().scope(), **kwargs)
+
+def test_sentences_span_finals_and_interims_never_commit():
+    p = processor()
+    assert p.process(message("The numbers look", 0.0, is_final=False)) == []
+    assert p.process(message("The numbers look good", 0.0)) == []
+    assert p.partial_text() == "The numbers look good"
+    sentences = p.process(message("today. We ship on", 1.6))
+    assert [s["text"] for s in sentences] == ["The numbers look good today."]
+    assert sentences[0]["start"] == 0.0
+    # speech_final commits the unpunctuated tail
+    sentences = p.process(message("Friday", 3.2, speech_final=True))
+    assert [s["text"] for s in sentences] == ["We ship on Friday"]
+    assert p.partial_text() == ""
+
+def test_flush_commits_words_the_stream_ended_on():
+    p = processor()
+    assert p.process(message("Done. Thanks everyone", 0.0)) != []
+    assert [s["text"] for s in p.flush()] == ["Thanks everyone"]
+    assert p.flush() == []
+
+def test_replayed_final_is_not_committed_twice():
+    p = processor()
+    assert len(p.process(message("The release is ready.", 0.0))) == 1
+    assert p.process(message("The release is ready.", 0.0)) == []
+
+def test_echo_on_the_mic_is_dropped_whichever_copy_is_final_first():
+    p = processor(channel_labels=["Mic", "Speaker"], echo_channel=0)
+    # The mic's copy of the speaker's line (one word misheard) is final before the loopback's
+    assert p.process(message("Can everyone see my green now?", 10.15, channel=0)) == []
+    assert "[Mic] Can everyone see my green now?" in p.partial_text()
+    sentences = p.process(message("Can everyone see my screen now?", 10.0, channel=1, duration=3.0))
+    assert [(s["channel"], s["text"]) for s in sentences] == [(1, "Can everyone see my screen now?")]
+    assert p.partial_text() == ""
+
+    # Echo the other way round is dropped too
+    assert len(p.process(message("Let us move on to the roadmap.", 20.0, channel=1))) == 1
+    assert p.process(message("Let us move on to the roadmap.", 20.1, channel=0)) == []
+
+def test_mic_sentences_wait_for_the_loopback_channel():
+    p = processor(channel_labels=["Mic", "Speaker"], echo_channel=0)
+    assert p.process(message("I can see it fine from here.", 12.0, channel=0)) == []
+    # Short replies are never treated as echo, but keep their place in line
+    assert p.process(message("Yes.", 15.0, channel=0)) == []
+    # Nothing said on the loopback channel: its (empty) final releases the mic lines
+    sentences = p.process(message("", 12.0, channel=1, duration=3.0))
+    assert [s["text"] for s in sentences] == ["I can see it fine from here."]
+    sentences = p.process(message("Can you hear me now?", 16.0, channel=1))
+    assert [(s["channel"], s["text"]) for s in sentences] == [(1, "Can you hear me now?"), (0, "Yes.")]
+    # End of stream releases whatever is still held
+    assert p.process(message("Sounds good to me.", 30.0, channel=0)) == []
+    assert [s["text"] for s in p.flush()] == ["Sounds good to me."]
+
+def test_without_an_echo_channel_similar_lines_all_stay():
+    p = processor(channel_labels=["Ch1", "Ch2"])
+    assert len(p.process(message("The release is ready.", 0.0, channel=0))) == 1
+    assert len(p.process(message("The release is ready.", 0.1, channel=1))) == 1
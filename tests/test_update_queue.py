@@ -0,0 +1,11 @@
+from modules.metrics import MetricsRegistry
+from modules.update_queue import UpdateQueue
+
+def test_reset_keeps_events_of_the_previous_session():
+    updates = UpdateQueue(metrics=MetricsRegistry().scope())
+    updates({"text": "two words"}, "[00:00:01] two words")
+    updates.set_partial("and")
+    updates.post("finished")
+    updates.reset()
+    assert updates.drain() == ([], None, [("finished", None)])
+    assert updates.word_count == 0